@@ -18,39 +18,148 @@ import smbus2
 import paho.mqtt.client as mqtt
 
 # VL53L5CX libraries
-from lib.vl53l5cx_lib.vl53l5cx import VL53L5CX
+from lib.vl53l5cx_lib.vl53l5cx import VL53L5CX, VL53L5CXMotionConfiguration
 from lib.vl53l5cx_lib.api import (
     VL53L5CX_RESOLUTION_4X4,
     VL53L5CX_RESOLUTION_8X8
 )
+from lib.tof_projection import ToFProjector
+from lib.tof_filter import ToFZoneFilter
+from lib.tof_profile import RangingProfile, AdaptiveRangingController
+from lib.tof_motion import StaticSceneGate
+from lib.occupancy import mark_obstacles, inflate_obstacles, transform_points
+from lib.tiled_map import TiledLogOddsMap
+from lib.map_codec import MapEncoder
+from lib.tof_acquisition import ToFAcquisition
+from lib.pose_history import PoseHistory, relative_pose
 
 # -----------------------------------------------------------------------------
 # MQTT Setup
 # -----------------------------------------------------------------------------
 MQTT_BROKER = "localhost"    # Change if your broker is on a different machine
 MQTT_PORT = 1883
-MQTT_TOPIC = "robot/tof_map"  # Publish the map data here
+MQTT_TOPIC = "robot/tof_map"  # Combined grid + points (legacy, off unless requested)
+MQTT_TOPIC_POINTS = "robot/tof_points"    # Per-sensor point clouds
+MQTT_TOPIC_GRID = "robot/tof_grid"        # Occupancy grid only
+MQTT_TOPIC_SUMMARY = "robot/tof_summary"  # Low-rate JSON status
+MQTT_TOPIC_RATES = "robot/tof_rates/+"    # Retained per-subscriber rate requests
+MQTT_TOPIC_ODOMETRY = "robot/odometry"
+MQTT_TOPIC_RESET_ODOMETRY = "robot/reset_odometry"
+
+# Output streams and their default rates. A subscriber can ask for a different rate
+# by publishing {"points": 2.0, "grid": 5.0} (retained) to robot/tof_rates/<name>;
+# each stream then runs at the highest rate any subscriber asked for, and a stream
+# everybody sets to 0 is not published at all. Requests are retained and never
+# expire: a subscriber that goes away for good must clear its request by publishing
+# an empty retained message to the same topic. Malformed requests are ignored.
+STREAM_TOPICS = {
+    "points": MQTT_TOPIC_POINTS,
+    "grid": MQTT_TOPIC_GRID,
+    "summary": MQTT_TOPIC_SUMMARY,
+    "map": MQTT_TOPIC,
+}
+DEFAULT_PUBLISH_RATES_HZ = {
+    "points": 5.0,
+    "grid": 10.0,
+    "summary": 1.0,
+    "map": 0.0,
+}
+requested_rates = {}  # subscriber name -> {stream: rate_hz}
+last_publish_time = {stream: 0.0 for stream in STREAM_TOPICS}
+
+def publish_rate(stream: str) -> float:
+    requests = [rates[stream] for rates in requested_rates.values() if stream in rates]
+    return max(requests) if requests else DEFAULT_PUBLISH_RATES_HZ[stream]
+
+def publish_due(stream: str, now: float) -> bool:
+    rate = publish_rate(stream)
+    if rate <= 0 or now - last_publish_time[stream] < 1.0 / rate:
+        return False
+    last_publish_time[stream] = now
+    return True
+
+# Recent robot poses stamped on arrival, used to place each sensor frame at the
+# pose the robot had when the frame was read
+pose_history = PoseHistory(max_age=5.0)
+map_reset_requested = False
+
+def on_message(client, userdata, msg):
+    global map_reset_requested
+    if msg.topic == MQTT_TOPIC_ODOMETRY:
+        odom = json.loads(msg.payload)
+        pose_history.add(time.monotonic(), odom.get('x', 0.0), odom.get('y', 0.0), odom.get('theta', 0.0))
+    elif msg.topic == MQTT_TOPIC_RESET_ODOMETRY:
+        # The world frame restarts at the robot, so the map built so far no longer fits it
+        if json.loads(msg.payload).get('reset', False):
+            pose_history.clear()
+            map_reset_requested = True
+    elif msg.topic.startswith(MQTT_TOPIC_RATES[:-1]):
+        name = msg.topic[len(MQTT_TOPIC_RATES) - 1:]
+        if msg.payload:
+            try:
+                rates = json.loads(msg.payload)
+                requested_rates[name] = {k: float(v) for k, v in rates.items() if k in STREAM_TOPICS}
+            except (ValueError, TypeError, AttributeError) as e:
+                # Raising here would stop the MQTT thread, on every restart for a retained message
+                print(f"Ignoring malformed rate request on {msg.topic}: {e}")
+        else:
+            requested_rates.pop(name, None)  # Retained request cleared
 
 client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)  # Update to use VERSION2 callbacks
+client.on_message = on_message
 client.connect(MQTT_BROKER, MQTT_PORT, keepalive=60)
+client.subscribe(MQTT_TOPIC_ODOMETRY)
+client.subscribe(MQTT_TOPIC_RESET_ODOMETRY)
+client.subscribe(MQTT_TOPIC_RATES)
 client.loop_start()
 
+# Binary map messages (lib/map_codec.py), one encoder per stream since grids go
+# out as deltas between keyframes
+grid_encoder = MapEncoder(keyframe_interval=10)
+points_encoder = MapEncoder()
+map_encoder = MapEncoder(keyframe_interval=10)
+
 # -----------------------------------------------------------------------------
 # Sensor Data Cache
 # -----------------------------------------------------------------------------
+# Each entry keeps its capture "timestamp" and robot "pose"; entries are moved into
+# the current robot frame before use and evicted once older than MAX_CACHE_AGE
 sensor_data_cache = {
     0: None,  # Most recent valid data from sensor 0
     1: None,  # Most recent valid data from sensor 1
     2: None,  # Most recent valid data from sensor 2
 }
+MAX_CACHE_AGE = 0.5  # seconds
+
+def evict_stale_cache_entries(now: float) -> None:
+    for s_idx, cached in sensor_data_cache.items():
+        if cached is not None and now - cached["timestamp"] > MAX_CACHE_AGE:
+            sensor_data_cache[s_idx] = None
+
+def compensate_sensor_data(sensor_data: Dict, pose_now: Dict) -> Dict:
+    """Move a frame's points from the robot frame at capture into the current robot frame."""
+    dx, dy, dtheta = relative_pose(sensor_data["pose"], pose_now)
+    if dx == 0.0 and dy == 0.0 and dtheta == 0.0:
+        return sensor_data
+    return {
+        **sensor_data,
+        "valid_points": transform_points(sensor_data["valid_points"], dx, dy, dtheta),
+        "invalid_points": transform_points(sensor_data["invalid_points"], dx, dy, dtheta),
+    }
 
 # -----------------------------------------------------------------------------
 # ToF Sensor Setup
 # -----------------------------------------------------------------------------
 GPIO.setmode(GPIO.BCM)
 sensor_pins = [17, 22, 27]  # LPn pins for the three sensors
+sensor_bus_ids = [1, 1, 1]  # I2C bus of each sensor; one reader thread per bus
+sensor_int_pins = None      # e.g. [5, 6, 13] to wake on each sensor's INT line instead of polling
+READER_PER_SENSOR = False   # One reader thread per sensor instead of per bus
+FRAME_QUEUE_SIZE = 12       # Frames waiting for the mapping stage; the oldest is dropped when full
+BATCH_I2C_READS = True      # Poll and read all sensors of a bus in combined I2C transactions
 for pin in sensor_pins:
-    GPIO.setup(pin, GPIO.OUT)
+    # Keep LPn high so sensors left ranging by a previous run stay reachable
+    GPIO.setup(pin, GPIO.OUT, initial=GPIO.HIGH)
 
 def scan_i2c_bus(bus_number=1):
     bus = smbus2.SMBus(bus_number)
@@ -76,125 +185,180 @@ def set_sensor_address(sensor, pin, new_address):
     for p in sensor_pins:
         GPIO.output(p, GPIO.HIGH)
 
-print("Scanning I2C bus...")
-existing_addresses = scan_i2c_bus()
-print(f"Found devices at: {[hex(a) for a in existing_addresses]}")
-
 # Example addresses for the three sensors
 addresses = [0x52, 0x54, 0x56]
-sensors = []
-
-for i, pin in enumerate(sensor_pins):
-    if addresses[i] not in existing_addresses:
-        sensor = VL53L5CX()
-        set_sensor_address(sensor, pin, addresses[i])
-    else:
-        sensor = VL53L5CX(i2c_address=addresses[i])
-    sensors.append(sensor)
-
-# Verify that all sensors are alive
-for sensor in sensors:
-    if not sensor.is_alive():
-        raise IOError(f"VL53L5CX at address {hex(sensor.i2c_address)} is not alive.")
-
-print("Initialising sensors...")
-USE_8X8_MODE = True  # Change to False for 4x4
-
-# Initialize sensors
-for sensor in sensors:
-    sensor.init()
-    if USE_8X8_MODE:
-        sensor.set_resolution(VL53L5CX_RESOLUTION_8X8)
-    else:
-        sensor.set_resolution(VL53L5CX_RESOLUTION_4X4)
-    sensor.start_ranging()
-
-print("Sensors initialized.")
+
+# Ranging profiles: 8x8 for detail while slow or stopped, 4x4 at a higher rate while
+# driving, when obstacle latency matters more than angular density. With
+# ADAPTIVE_RANGING the robot/odometry speed picks the profile (lib/tof_profile.py);
+# otherwise the sensors stay on DENSE_PROFILE.
+DENSE_PROFILE = RangingProfile("dense", VL53L5CX_RESOLUTION_8X8, 15)
+FAST_PROFILE = RangingProfile("fast", VL53L5CX_RESOLUTION_4X4, 30)
+RANGING_PROFILES = {profile.name: profile for profile in (DENSE_PROFILE, FAST_PROFILE)}
+ADAPTIVE_RANGING = True
+FAST_SPEED = 0.25          # m/s above which the fast profile is used
+DENSE_SPEED = 0.15         # m/s below which the dense profile comes back ...
+DENSE_SETTLE_TIME = 1.0    # ... once the robot stayed that slow for this many seconds
+SPEED_WINDOW = 0.5         # seconds of odometry the speed is measured over
+
+# Change detection: while the robot stands still, frames whose on-chip motion
+# indicator sees no motion are dropped before projection, so a parked robot stops
+# recomputing and republishing an unchanged map (lib/tof_motion.py)
+USE_MOTION_GATING = True
+MOTION_DISTANCE_MM = (400, 1900)  # Range the motion indicator watches (at most 1500 mm wide)
+
+# Result blocks read from the sensors each frame (OUTPUT_PROFILES in
+# lib/vl53l5cx_lib/vl53l5cx.py): "quality" keeps the sigma and signal the zone
+# filter weighs samples with, "quality-motion" adds the motion indicator for
+# USE_MOTION_GATING, "mapping-minimal" only distance and target status (set it
+# when USE_ZONE_FILTER is off), "full" reads every block.
+TOF_OUTPUT_PROFILE = "quality-motion" if USE_MOTION_GATING else "quality"
+
+# Warm start: when this node restarts while the sensors keep power, a sensor still
+# ranging at its address with the configuration hash saved at its last cold start is
+# taken over as is, skipping the bus scan, firmware upload and reconfiguration. The
+# state lives in /tmp, which is cleared on reboot, like the sensors themselves.
+WARM_START = True
+TOF_STATE_FILE = "/tmp/tof_sensor_state.json"
+
+def load_sensor_state() -> Dict:
+    try:
+        with open(TOF_STATE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def profile_hash(sensor: VL53L5CX, profile: RangingProfile) -> str:
+    return sensor.config_hash(profile.resolution, frequency_hz=profile.frequency_hz,
+                              motion_distance_mm=MOTION_DISTANCE_MM if USE_MOTION_GATING else None)
+
+def save_sensor_state(sensors: List[VL53L5CX], profile: RangingProfile) -> None:
+    state = {
+        "profile": profile.name,
+        "sensors": {
+            hex(sensor.i2c_address): {
+                "config_hash": profile_hash(sensor, profile),
+                "offset_data": bytes(sensor.offset_data).hex(),
+                "xtalk_data": bytes(sensor.xtalk_data).hex(),
+            }
+            for sensor in sensors
+        },
+    }
+    with open(TOF_STATE_FILE, "w") as f:
+        json.dump(state, f)
+
+def warm_start(sensor: VL53L5CX, state: Dict, profile: RangingProfile) -> bool:
+    """Resume `sensor` if it is ranging with the configuration recorded in `state`."""
+    saved = state.get("sensors", {}).get(hex(sensor.i2c_address))
+    # State files written before the hash was recorded lack it, and cold-start
+    if saved is None or saved.get("config_hash") != profile_hash(sensor, profile):
+        return False
+    if not sensor.is_ranging():
+        return False
+    sensor.offset_data = list(bytes.fromhex(saved["offset_data"]))
+    sensor.xtalk_data = list(bytes.fromhex(saved["xtalk_data"]))
+    sensor.resume_ranging(profile.resolution)
+    if USE_MOTION_GATING:
+        # Already configured on the sensor; keep the host copy for resolution switches
+        sensor.motion_config = VL53L5CXMotionConfiguration(profile.resolution)
+        sensor.motion_config.set_distance(*MOTION_DISTANCE_MM)
+    return True
+
+bring_up_start = time.monotonic()
+
+# Frames are decoded into numpy arrays; every frame gets its own arrays since the
+# readers hand them across threads
+sensors = [VL53L5CX(bus_id=sensor_bus_ids[i], i2c_address=addresses[i], use_numpy_results=True,
+                    output_profile=TOF_OUTPUT_PROFILE)
+           for i in range(len(sensor_pins))]
+state = load_sensor_state() if WARM_START else {}
+# Sensors left ranging by the previous run are picked up in the profile they were in
+ranging_profile = RANGING_PROFILES.get(state.get("profile"), DENSE_PROFILE)
+warm = [warm_start(sensor, state, ranging_profile) for sensor in sensors]
+
+if all(warm):
+    print("Sensors already ranging, resumed without reconfiguration.")
+else:
+    print("Scanning I2C bus...")
+    existing_addresses = scan_i2c_bus()
+    print(f"Found devices at: {[hex(a) for a in existing_addresses]}")
+
+    for i, pin in enumerate(sensor_pins):
+        if not warm[i] and addresses[i] not in existing_addresses:
+            sensors[i] = VL53L5CX(bus_id=sensor_bus_ids[i], use_numpy_results=True,
+                                  output_profile=TOF_OUTPUT_PROFILE)
+            set_sensor_address(sensors[i], pin, addresses[i])
+
+    # Verify that all sensors are alive
+    for sensor in sensors:
+        if not sensor.is_alive():
+            raise IOError(f"VL53L5CX at address {hex(sensor.i2c_address)} is not alive.")
+
+    print("Initialising sensors...")
+    for i, sensor in enumerate(sensors):
+        if warm[i]:
+            continue
+        sensor.init()
+        sensor.set_resolution(ranging_profile.resolution)
+        sensor.set_ranging_frequency_hz(ranging_profile.frequency_hz)
+        if USE_MOTION_GATING:
+            sensor.motion_indicator_init(ranging_profile.resolution)
+            sensor.motion_indicator_set_distance_motion(*MOTION_DISTANCE_MM)
+        sensor.start_ranging()
+    save_sensor_state(sensors, ranging_profile)
+
+print(f"Sensors initialized in {time.monotonic() - bring_up_start:.2f} s "
+      f"({sum(warm)} of {len(sensors)} warm, profile '{ranging_profile.name}').")
+print(f"Output profile '{TOF_OUTPUT_PROFILE}': {sensors[0].data_read_size} bytes per frame.")
+
+# Frames are read by background threads and handed over through a bounded queue
+acquisition = ToFAcquisition(sensors, bus_ids=sensor_bus_ids, int_pins=sensor_int_pins,
+                             reader_per_sensor=READER_PER_SENSOR, queue_size=FRAME_QUEUE_SIZE,
+                             batch_reads=BATCH_I2C_READS)
 
 # -----------------------------------------------------------------------------
 # Helper Functions for 3D Points
 # -----------------------------------------------------------------------------
-# Field of View
-FOV_DEG = 60
-OFFSET_8X8 = 3.75
-OFFSET_4X4 = 7.5
-
-if USE_8X8_MODE:
-    rows_deg = np.linspace(-FOV_DEG/2 + OFFSET_8X8, FOV_DEG/2 - OFFSET_8X8, 8)
-    cols_deg = np.linspace(-FOV_DEG/2 + OFFSET_8X8, FOV_DEG/2 - OFFSET_8X8, 8)
-    NUM_ZONES = 64
-else:
-    rows_deg = np.linspace(-FOV_DEG/2 + OFFSET_4X4, FOV_DEG/2 - OFFSET_4X4, 4)
-    cols_deg = np.linspace(-FOV_DEG/2 + OFFSET_4X4, FOV_DEG/2 - OFFSET_4X4, 4)
-    NUM_ZONES = 16
+NUM_ZONES = ranging_profile.resolution
 
-def deg2rad(deg: float) -> float:
-    return deg * math.pi / 180.0
+# Ray tables for all sensors are built once per resolution; each frame is a
+# broadcast multiply
+projectors = {profile.resolution: ToFProjector(profile.resolution) for profile in RANGING_PROFILES.values()}
+projector = projectors[NUM_ZONES]
 
 def get_3d_points(distances_mm: list[int], sensor_index: int) -> np.ndarray:
     """
     Convert the distance readings into (x, y, z) points in world coordinates.
     Applies a fixed offset towards the center of the robot to correct Z-axis discrepancies.
     """
-    sensor_height_m = 0.75
-    OFFSET_TOWARDS_CENTER = -0.5  # Adjust this value as needed (in meters)
-
-    points = []
-    grid_size = int(math.sqrt(NUM_ZONES))  # 8 or 4
-    for i, dist_mm in enumerate(distances_mm):
-        dist_m = dist_mm * 0.001
-        row_idx = i // grid_size
-        col_idx = i % grid_size
-
-        # Angles for this zone
-        vert_rad  = deg2rad(rows_deg[row_idx])
-        horiz_rad = deg2rad(cols_deg[col_idx])
-
-        # Spherical → Cartesian
-        x = dist_m * math.cos(vert_rad) * math.cos(horiz_rad)
-        y = dist_m * math.cos(vert_rad) * math.sin(horiz_rad)
-        z = dist_m * math.sin(vert_rad)
-
-        # Apply fixed offset towards the center of the robot
-        x += OFFSET_TOWARDS_CENTER * math.cos(deg2rad(sensor_index * 60))
-        y += OFFSET_TOWARDS_CENTER * math.sin(deg2rad(sensor_index * 60))
-
-        # Shift for sensor height
-        z += sensor_height_m
-
-        points.append([x, y, z])
-        
-    points_np = np.array(points)
-
-    if points_np.size > 0:
-        # Determine the sensor orientation
-        if sensor_index == 0:
-            z_angle = -60.0   # Left sensor
-        elif sensor_index == 2:
-            z_angle = 60.0    # Right sensor
-        else:
-            z_angle = 0.0     # Forward sensor
-
-        # Tilt angle for sensors
-        tilt_angle = -30.0
-
-        # Rotation matrices
-        rot_y = np.array([
-            [ math.cos(deg2rad(tilt_angle)), 0, math.sin(deg2rad(tilt_angle))],
-            [ 0,                             1, 0                            ],
-            [-math.sin(deg2rad(tilt_angle)), 0, math.cos(deg2rad(tilt_angle))],
-        ])
-
-        rot_z = np.array([
-            [math.cos(deg2rad(z_angle)), -math.sin(deg2rad(z_angle)), 0],
-            [math.sin(deg2rad(z_angle)),  math.cos(deg2rad(z_angle)), 0],
-            [0,                          0,                           1],
-        ])
-
-        # Apply rotations
-        points_np = points_np @ rot_y @ rot_z
-
-    return points_np
+    return projector.project_sensor(distances_mm, sensor_index)
+
+# Per-zone temporal filter: weighs the last few frames of each zone by signal and
+# sigma so single-frame noise does not flip grid cells. Call zone_filter.resize()
+# whenever the sensor resolution changes.
+USE_ZONE_FILTER = True
+zone_filter = ToFZoneFilter(len(sensors), NUM_ZONES, history=4, min_valid=2)
+
+ranging_controller = AdaptiveRangingController(DENSE_PROFILE, FAST_PROFILE,
+                                               fast_speed=FAST_SPEED, dense_speed=DENSE_SPEED,
+                                               settle_time=DENSE_SETTLE_TIME, initial=ranging_profile)
+
+motion_gate = StaticSceneGate(len(sensors))
+
+def apply_ranging_profile(profile: RangingProfile) -> None:
+    """Switch every sensor to `profile`, with the readers held off the bus meanwhile."""
+    global ranging_profile, NUM_ZONES, projector
+    with acquisition.paused():
+        for sensor in sensors:
+            sensor.switch_resolution(profile.resolution, profile.frequency_hz)
+    ranging_profile = profile
+    NUM_ZONES = profile.resolution
+    projector = projectors[NUM_ZONES]
+    zone_filter.resize(NUM_ZONES)
+    motion_gate.reset()
+    save_sensor_state(sensors, profile)
+    switch_ms = max(sensor.last_switch_time for sensor in sensors) * 1000.0
+    print(f"Switched to ranging profile '{profile.name}' in {switch_ms:.0f} ms per sensor.")
 
 # -----------------------------------------------------------------------------
 # Occupancy Grid Parameters
@@ -206,6 +370,29 @@ GRID_MAX_Y = 2.0
 GRID_RESOLUTION = 0.05  # 5cm per cell
 OBSTACLE_HEIGHT_THRESHOLD = 0.1  # meters above ground
 ROBOT_RADIUS = 0.2  # 200mm radius
+INFLATION_BACKEND = "disk"  # "disk", "edt" or "loop" (reference), see lib/occupancy.py
+
+# Persistent world-frame map: frames are ray-cast into a log-odds grid placed with
+# robot/odometry instead of rebuilding a robot-relative grid every loop
+USE_PERSISTENT_MAP = True
+LOG_ODDS_HIT = 0.85
+LOG_ODDS_MISS = -0.4
+LOG_ODDS_MIN = -2.0
+LOG_ODDS_MAX = 3.5
+LOG_ODDS_OCCUPIED = 0.5
+
+# The persistent map is stored as memory-mapped tiles allocated around where the
+# robot has been; only a window around the robot (the GRID_* extent) is published.
+# Set TILED_MAP_DIR to None to keep it in memory only (tiles beyond MAP_TILE_CACHE
+# are then spilled to a temporary directory). node_odometry restarts at x=y=theta=0,
+# so the stored map only fits the new world frame if the robot restarts exactly where
+# the last run started; it is cleared at startup unless KEEP_MAP_ON_START is set.
+TILED_MAP_DIR = os.path.join(os.path.dirname(__file__), '..', 'maps', 'tof')
+KEEP_MAP_ON_START = False
+TILE_SIZE = 64                 # cells per tile side
+MAP_TILE_CACHE = 64            # tiles kept open, least recently used ones are flushed and closed
+WINDOW_STEP = 16               # cells the published window moves by at a time
+TILE_FLUSH_INTERVAL = 10.0     # seconds between writing tiles back to disk
 
 def create_empty_grid() -> np.ndarray:
     """Create an empty occupancy grid."""
@@ -222,141 +409,222 @@ def world_to_grid(x: float, y: float) -> tuple[int, int]:
 def update_occupancy_grid(sensor_data: List[Dict]) -> np.ndarray:
     """Create occupancy grid from sensor data with robot size consideration."""
     grid = create_empty_grid()
-    
+
     # First pass: Mark direct obstacle detections
     for sensor in sensor_data:
-        for point in sensor["valid_points"]:
-            x, y, z = point
-            # Skip points outside our grid bounds
-            if (GRID_MIN_X <= x <= GRID_MAX_X and 
-                GRID_MIN_Y <= y <= GRID_MAX_Y):
-                # If point is above our height threshold, mark as occupied
-                if z > OBSTACLE_HEIGHT_THRESHOLD:
-                    grid_x, grid_y = world_to_grid(x, y)
-                    try:
-                        grid[grid_y, grid_x] = 0  # 0 is occupied space
-                    except IndexError:
-                        continue
-    
+        mark_obstacles(grid, sensor["valid_points"], GRID_MIN_X, GRID_MIN_Y,
+                       GRID_RESOLUTION, OBSTACLE_HEIGHT_THRESHOLD)
+
     # Second pass: Dilate obstacles by robot radius
-    dilated_grid = grid.copy()
-    robot_cells = int(ROBOT_RADIUS / GRID_RESOLUTION)  # Number of cells for robot radius
-    
-    # Find all obstacle cells
-    obstacle_ys, obstacle_xs = np.where(grid == 0)
-    
-    # For each obstacle cell, mark surrounding cells within robot radius as occupied
-    for obs_y, obs_x in zip(obstacle_ys, obstacle_xs):
-        # Calculate bounds for the square region to check
-        y_min = max(0, obs_y - robot_cells)
-        y_max = min(grid.shape[0], obs_y + robot_cells + 1)
-        x_min = max(0, obs_x - robot_cells)
-        x_max = min(grid.shape[1], obs_x + robot_cells + 1)
-        
-        # Check each cell in the square region
-        for y in range(y_min, y_max):
-            for x in range(x_min, x_max):
-                # Calculate distance to obstacle cell
-                dist = np.sqrt((y - obs_y)**2 + (x - obs_x)**2) * GRID_RESOLUTION
-                # If within robot radius, mark as occupied
-                if dist <= ROBOT_RADIUS:
-                    dilated_grid[y, x] = 0
-
-    return dilated_grid
+    return inflate_obstacles(grid, ROBOT_RADIUS, GRID_RESOLUTION, backend=INFLATION_BACKEND)
+
+world_map = TiledLogOddsMap(GRID_RESOLUTION, tile_size=TILE_SIZE, directory=TILED_MAP_DIR,
+                            max_tiles=MAP_TILE_CACHE, hit=LOG_ODDS_HIT, miss=LOG_ODDS_MISS,
+                            clamp_min=LOG_ODDS_MIN, clamp_max=LOG_ODDS_MAX,
+                            occupied_threshold=LOG_ODDS_OCCUPIED)
+if not KEEP_MAP_ON_START:
+    world_map.clear()  # The stored obstacles are in the previous run's world frame
+
+def world_map_window(pose: Dict):
+    """
+    Inflated occupancy grid of the window around the robot, the mask of its cells
+    the map has observed, and its world-frame min_x/min_y. The window is read with
+    a margin of one robot radius so obstacles just outside it still inflate into it.
+    """
+    height, width = create_empty_grid().shape
+    col0, row0 = world_map.window_origin(pose['x'], pose['y'], height, width, step=WINDOW_STEP)
+    margin = int(math.ceil(ROBOT_RADIUS / GRID_RESOLUTION))
+    padded = world_map.occupancy(col0 - margin, row0 - margin, height + 2 * margin, width + 2 * margin)
+    inflated = inflate_obstacles(padded, ROBOT_RADIUS, GRID_RESOLUTION, backend=INFLATION_BACKEND)
+    known = world_map.known(col0, row0, height, width)
+    min_x, min_y = world_map.cell_to_world(col0, row0)
+    return inflated[margin:margin + height, margin:margin + width], known, min_x, min_y
+
+def integrate_sensor_frame(sensor_data: Dict, pose: Dict) -> np.ndarray:
+    """
+    Ray-cast one sensor frame into the persistent world map at the given robot pose.
+    Cells along each valid beam are carved free; the endpoint is marked occupied when
+    it lies above the obstacle height threshold. Returns the updated cell indices.
+    """
+    points = transform_points(sensor_data["valid_points"], pose['x'], pose['y'], pose['theta'])
+    origin = transform_points(projector.bias[sensor_data["sensor_index"]][np.newaxis, :2],
+                              pose['x'], pose['y'], pose['theta'])
+    origins = np.repeat(origin, len(points), axis=0)
+    return world_map.integrate(origins, points[:, :2], points[:, 2] > OBSTACLE_HEIGHT_THRESHOLD)
 
 # -----------------------------------------------------------------------------
 # Main Loop
 # -----------------------------------------------------------------------------
+grid_info = {
+    "resolution": GRID_RESOLUTION,
+    "min_x": GRID_MIN_X,
+    "min_y": GRID_MIN_Y,
+    "frame": "world" if USE_PERSISTENT_MAP else "robot"
+}
+occupancy_grid = None
+known_mask = None  # Observed cells of the grid window; only the persistent map knows them
+streams_outdated = set()  # Streams that have new frames since they were last published
+loop_time = 0.0
+frame_counts = {s_idx: 0 for s_idx in range(len(sensors))}
+last_summary_time = time.monotonic()
+last_flush_time = time.monotonic()
+
 print("Starting ToF read + MQTT publish loop...")
+acquisition.start()
 try:
     while True:
         all_sensor_data = []
-
-        for s_idx, sensor in enumerate(sensors):
-            try:
-                if sensor.check_data_ready():
-                    data = sensor.get_ranging_data()
-
-                    # Ensure we have enough data before slicing
-                    if len(data.distance_mm) >= NUM_ZONES and len(data.target_status) >= NUM_ZONES:
-                        distances_mm = data.distance_mm[:NUM_ZONES]
-                        target_status = data.target_status[:NUM_ZONES]
-
-                        # Convert to 3D points in world coordinates
-                        points_3d = get_3d_points(distances_mm, s_idx)
-
-                        # Build a data structure for this sensor
-                        # We'll also separate valid vs invalid points if you want
-                        valid_points = []
-                        invalid_points = []
-                        for i, (dist_mm, status) in enumerate(zip(distances_mm, target_status)):
-                            # Status code 5 typically means "valid" measurement on VL53L5CX
-                            if status == 5 and dist_mm != 0:
-                                valid_points.append(points_3d[i].tolist())
-                            else:
-                                invalid_points.append(points_3d[i].tolist())
-
-                        sensor_data = {
-                            "sensor_address": hex(sensor.i2c_address),
-                            "sensor_index": s_idx,
-                            "valid_points": valid_points,
-                            "invalid_points": invalid_points,
-                        }
-                        all_sensor_data.append(sensor_data)
-                    else:
-                        print(f"Warning: Sensor {s_idx} returned incomplete data")
-                        continue
-
-            except IndexError as e:
-                print(f"Error reading sensor {s_idx}: {e}")
-                continue
-            except Exception as e:
-                print(f"Unexpected error with sensor {s_idx}: {e}")
+        frame_distances = np.zeros((len(sensors), NUM_ZONES))
+        frame_valid = np.zeros((len(sensors), NUM_ZONES), dtype=bool)
+        frame_sensors = []
+
+        frame_times = {}
+        speed, turn_rate = pose_history.velocity(SPEED_WINDOW)
+        robot_static = motion_gate.robot_static(speed, turn_rate)
+
+        # Wait for the readers, then take the newest frame of each sensor
+        for frame in acquisition.get_frames(timeout=0.5):
+            s_idx = frame.sensor_index
+            data = frame.data
+            if frame.num_zones != NUM_ZONES:
+                continue  # Read just before a resolution switch
+            if USE_MOTION_GATING and not motion_gate.changed(s_idx, data, robot_static, frame.timestamp):
+                # Same scene as the sensor's last processed frame: keep its cached points alive
+                if sensor_data_cache[s_idx] is not None:
+                    sensor_data_cache[s_idx]["timestamp"] = frame.timestamp
+                frame_counts[s_idx] += 1
                 continue
 
-        # Publish all sensor data to MQTT as one JSON structure
+            # Ensure we have enough data before slicing
+            if len(data.distance_mm) >= NUM_ZONES and len(data.target_status) >= NUM_ZONES:
+                if USE_ZONE_FILTER:
+                    frame_distances[s_idx], frame_valid[s_idx] = zone_filter.update(
+                        s_idx, data.distance_mm, data.target_status,
+                        data.range_sigma_mm, data.signal_per_spad)
+                else:
+                    distances_mm = np.asarray(data.distance_mm[:NUM_ZONES])
+                    target_status = np.asarray(data.target_status[:NUM_ZONES])
+
+                    frame_distances[s_idx] = distances_mm
+                    # Status code 5 typically means "valid" measurement on VL53L5CX
+                    frame_valid[s_idx] = (target_status == 5) & (distances_mm != 0)
+                frame_times[s_idx] = frame.timestamp
+                if s_idx not in frame_sensors:
+                    frame_sensors.append(s_idx)
+            else:
+                print(f"Warning: Sensor {s_idx} returned incomplete data")
+
+        if frame_sensors:
+            # Convert every sensor's frame to 3D points in one broadcast
+            points_3d = projector.project(frame_distances)
+
+            # Build a data structure for each sensor that produced a frame,
+            # separating valid vs invalid points
+            for s_idx in frame_sensors:
+                all_sensor_data.append({
+                    "sensor_address": hex(sensors[s_idx].i2c_address),
+                    "sensor_index": s_idx,
+                    "timestamp": frame_times[s_idx],
+                    "pose": pose_history.pose_at(frame_times[s_idx]),
+                    "valid_points": points_3d[s_idx][frame_valid[s_idx]],
+                    "invalid_points": points_3d[s_idx][~frame_valid[s_idx]],
+                })
+
+        now = time.monotonic()
+        if ADAPTIVE_RANGING:
+            profile = ranging_controller.update(speed, turn_rate, now)
+            if profile is not None:
+                apply_ranging_profile(profile)
+
         if all_sensor_data:
+            if map_reset_requested:
+                # Frames captured before an odometry reset are in the old world frame
+                world_map.clear()
+                for s_idx in sensor_data_cache:
+                    sensor_data_cache[s_idx] = None
+                map_reset_requested = False
+
             # Update cache with new sensor data
             for sensor_data in all_sensor_data:
                 s_idx = sensor_data["sensor_index"]
-                if sensor_data["valid_points"]:  # Only cache if we have valid points
+                frame_counts[s_idx] += 1
+                if len(sensor_data["valid_points"]):  # Only cache if we have valid points
                     sensor_data_cache[s_idx] = sensor_data
 
-            # Combine all cached sensor data
+            # Only this loop's frames touch the persistent map; older ones are already
+            # in it. Each frame is placed at the pose the robot had when it was read.
+            if USE_PERSISTENT_MAP:
+                for sensor_data in all_sensor_data:
+                    integrate_sensor_frame(sensor_data, sensor_data["pose"])
+            streams_outdated.update(("points", "grid", "map"))
+
+        # Streams only go out when they are due and new frames came in since they last did
+        publish_points = "points" in streams_outdated and publish_due("points", now)
+        publish_grid = "grid" in streams_outdated and publish_due("grid", now)
+        publish_map = "map" in streams_outdated and publish_due("map", now)
+
+        if publish_points or publish_grid or publish_map:
+            # Drop stale frames, then bring the rest into the current robot frame
+            evict_stale_cache_entries(now)
+            pose_now = pose_history.latest()
             combined_sensor_data = [
-                data for data in sensor_data_cache.values() 
+                compensate_sensor_data(data, pose_now) for data in sensor_data_cache.values()
                 if data is not None
             ]
 
-            # Create occupancy grid from combined data
-            occupancy_grid = update_occupancy_grid(combined_sensor_data)
-            
-            # Convert numpy array to list for JSON serialization
-            grid_list = occupancy_grid.tolist()
-            
-            # Add grid to payload
-            payload = json.dumps({
-                "sensors": combined_sensor_data,  # Send all cached sensor data
-                "occupancy_grid": {
-                    "data": grid_list,
-                    "height": len(grid_list),      # Add height
-                    "width": len(grid_list[0]),    # Add width
-                    "resolution": GRID_RESOLUTION,
-                    "min_x": GRID_MIN_X,
-                    "max_x": GRID_MAX_X,
-                    "min_y": GRID_MIN_Y,
-                    "max_y": GRID_MAX_Y
-                }
-            })
-            client.publish(MQTT_TOPIC, payload)
-
-        time.sleep(0.05)
+            if publish_grid or publish_map:
+                if USE_PERSISTENT_MAP:
+                    occupancy_grid, known_mask, grid_info["min_x"], grid_info["min_y"] = world_map_window(pose_now)
+                else:
+                    # Create occupancy grid from combined data
+                    occupancy_grid = update_occupancy_grid(combined_sensor_data)
+
+            if publish_grid:
+                # The known mask lets node_pathplanning find frontiers to explore
+                client.publish(MQTT_TOPIC_GRID, grid_encoder.encode(occupancy_grid, grid_info, known=known_mask))
+                streams_outdated.discard("grid")
+            if publish_points:
+                client.publish(MQTT_TOPIC_POINTS, points_encoder.encode(sensors=combined_sensor_data))
+                streams_outdated.discard("points")
+            if publish_map:
+                client.publish(MQTT_TOPIC, map_encoder.encode(occupancy_grid, grid_info,
+                                                              sensors=combined_sensor_data))
+                streams_outdated.discard("map")
+            loop_time = time.monotonic() - now
+
+        if publish_due("summary", now):
+            elapsed = now - last_summary_time
+            summary = {
+                "frame_rate_hz": {s_idx: count / elapsed for s_idx, count in frame_counts.items()},
+                "frames_dropped": acquisition.frames_dropped,
+                "occupied_cells": int(np.count_nonzero(occupancy_grid == 0)) if occupancy_grid is not None else None,
+                "publish_rates_hz": {stream: publish_rate(stream) for stream in STREAM_TOPICS},
+                "publish_time_ms": loop_time * 1000.0,
+                "persistent_map": USE_PERSISTENT_MAP,
+                "map_tiles": len(world_map.tiles),
+                "tof_output_profile": TOF_OUTPUT_PROFILE,
+                "frame_bytes": {s_idx: sensor.data_read_size for s_idx, sensor in enumerate(sensors)},
+                "frame_read_ms": {s_idx: sensor.frame_read_time * 1000.0 for s_idx, sensor in enumerate(sensors)},
+                "i2c_batches": acquisition.batch_timing,
+                "ranging_profile": ranging_profile.name,
+                "profile_switches": ranging_controller.switches,
+                "frames_skipped_static": motion_gate.frames_skipped,
+            }
+            client.publish(MQTT_TOPIC_SUMMARY, json.dumps(summary))
+            frame_counts = {s_idx: 0 for s_idx in range(len(sensors))}
+            last_summary_time = now
+
+        if USE_PERSISTENT_MAP and now - last_flush_time > TILE_FLUSH_INTERVAL:
+            world_map.flush()
+            last_flush_time = now
 
 except KeyboardInterrupt:
     print("\nInterrupted by user.")
 
 finally:
     # Clean up
+    acquisition.stop()
+    world_map.flush()
     GPIO.cleanup()
     client.loop_stop()
     client.disconnect()
@@ -1,12 +1,22 @@
 #!/usr/bin/env python3
 
+# Adds the lib directory to the Python path
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
 import json
 import time
 import math
 import random
+import threading
 import numpy as np
 import paho.mqtt.client as mqtt
-from heapq import heappush, heappop
+
+from lib.map_codec import MapDecoder
+from lib.grid_planner import GridPlanner, DStarLite, PathCorridor, shorten_path
+from lib.occupancy import clearance_cost
+from lib.frontier import FrontierIndex
 
 # -----------------------------------------------------------------------------
 # MQTT Setup
@@ -15,23 +25,69 @@ MQTT_BROKER = "localhost"
 MQTT_PORT   = 1883
 
 # Topics
-MQTT_TOPIC_OCC_GRID       = "robot/tof_map"
+MQTT_TOPIC_OCC_GRID       = "robot/tof_grid"
+MQTT_TOPIC_TOF_RATES      = "robot/tof_rates/pathplanning"
 MQTT_TOPIC_PATH_PLAN      = "robot/local_path"
 MQTT_TOPIC_PATH_COMPLETED = "robot/path_completed"
 MQTT_TOPIC_ODOMETRY       = "robot/odometry"
+MQTT_TOPIC_RESET_ODOMETRY = "robot/reset_odometry"
+
+# When the grid blocks the current path, a new path to the same goal is planned
+# instead of dropping the goal. INCREMENTAL_REPLANNING repairs it with a D* Lite
+# search kept between grids (started on the first obstruction of a goal) rather
+# than a fresh A*. D* Lite expands far fewer cells per repair, but on this grid
+# size its per-grid diff and vertex updates in Python cost more wall time than the
+# flat A* (about 0.4 vs 0.3 ms per repair, 1.1 vs 0.3 ms after a window move, see
+# tests/test_grid_planner.py), so it only pays off on much larger grids
+INCREMENTAL_REPLANNING = False
+
+# Published paths are shortened to waypoints with clear line of sight between them,
+# and cut after MAX_WAYPOINTS; when the robot completes a cut path, the next one is
+# planned to the same goal before a new goal is picked
+MAX_WAYPOINTS = 6
+
+# Exploration goals: "frontier" drives to the frontier cluster (known free cells
+# next to unknown ones) with the best gain for its path cost, "random" to a random
+# free cell ~1 m ahead. Frontiers need the known mask of node_map's persistent map;
+# without one, or when no frontier is reachable, the random goal is used
+EXPLORATION_MODE     = "frontier"
+FRONTIER_MIN_SIZE    = 4     # cells
+FRONTIER_GAIN_RADIUS = 0.5   # m, unknown cells this close to a target count as its gain
+FRONTIER_COST_WEIGHT = 2.0   # unknown cells one cell of path cost is worth
+VISITED_RADIUS       = 0.3   # m, frontiers this close to where a path ended are skipped
+
+# Soft cost that keeps paths off the inflated obstacle edge where there is room:
+# entering a cell costs up to CLEARANCE_WEIGHT times extra right next to inflated
+# space, falling to nothing CLEARANCE_DISTANCE away from it
+USE_CLEARANCE_COST = True
+CLEARANCE_DISTANCE = 0.15  # m
+CLEARANCE_WEIGHT   = 2.0
 
 client = mqtt.Client()
 client.connect(MQTT_BROKER, MQTT_PORT, keepalive=60)
 client.loop_start()
 
 # Global
+# Grids are decoded on the MQTT thread and handed to main() as one snapshot; the
+# grid, its cost, its parameters and the frontier index are only touched by main()
+grid_lock      = threading.Lock()
+pending_grid   = None  # Latest (grid, known mask, params) main() has not taken yet
 occupancy_grid = None
+cell_cost      = None  # Clearance cost of occupancy_grid, computed once per grid
 grid_params    = {}
-current_path   = None
+current_path   = None  # PathCorridor of the last published path
+path_cut       = False # The last published path stops short of current_goal_xy
 need_new_path  = True
+path_completed = False # Set by robot/path_completed, handled by main()
+odometry_reset = False # Set by robot/reset_odometry, handled by main()
 robot_x        = 0.0
 robot_y        = 0.0
 robot_th_deg   = 0.0
+map_decoder    = MapDecoder()
+planner        = GridPlanner()  # Reachability flood from the robot, redone per replan
+repair_planner = DStarLite()    # Search towards current_goal_xy, kept between grids (INCREMENTAL_REPLANNING)
+current_goal_xy = None
+frontiers      = FrontierIndex(visited_radius=VISITED_RADIUS)
 
 # -----------------------------------------------------------------------------
 # MQTT Callbacks
@@ -43,19 +99,20 @@ def on_message(client, userdata, message):
         on_path_completed(message)
     elif message.topic == MQTT_TOPIC_ODOMETRY:
         on_odometry(message)
+    elif message.topic == MQTT_TOPIC_RESET_ODOMETRY:
+        on_reset_odometry(message)
 
 def on_occupancy_grid(message):
-    global occupancy_grid, grid_params
-    payload = json.loads(message.payload)
+    global pending_grid
+    # Every message is decoded, since grids arrive as deltas to the previous one
+    payload = map_decoder.decode(message.payload)
     if "occupancy_grid" not in payload:
         return
     grid_info = payload["occupancy_grid"]
-    data_flat = grid_info["data"]
     h = grid_info["height"]
     w = grid_info["width"]
-    occupancy_grid = np.array(data_flat, dtype=np.uint8).reshape((h, w))
-
-    grid_params = {
+    grid = np.asarray(grid_info["data"], dtype=np.uint8).reshape((h, w))
+    params = {
         "height":     h,
         "width":      w,
         "resolution": grid_info["resolution"],
@@ -64,10 +121,13 @@ def on_occupancy_grid(message):
         "min_y":      grid_info["min_y"],
         "max_y":      grid_info["max_y"]
     }
+    with grid_lock:
+        pending_grid = (grid, grid_info.get("known"), params)
 
 def on_path_completed(message):
-    global need_new_path
+    global need_new_path, path_completed
     print("[node_pathplanning.py] Path completed => need_new_path = True")
+    path_completed = True
     need_new_path = True
 
 def on_odometry(message):
@@ -78,67 +138,30 @@ def on_odometry(message):
     robot_th = payload.get('theta', 0.0)  # radians
     robot_th_deg = math.degrees(robot_th)
 
+def on_reset_odometry(message):
+    global odometry_reset
+    # The world frame restarts at the robot; goals and visited places no longer fit it
+    if json.loads(message.payload).get('reset', False):
+        odometry_reset = True
+
 # -----------------------------------------------------------------------------
 # Subscribe
 # -----------------------------------------------------------------------------
 client.subscribe(MQTT_TOPIC_OCC_GRID)
 client.subscribe(MQTT_TOPIC_PATH_COMPLETED)
 client.subscribe(MQTT_TOPIC_ODOMETRY)
+client.subscribe(MQTT_TOPIC_RESET_ODOMETRY)
 client.on_message = on_message
 
+# Only the grid is needed, and the planner replans at a few Hz at most
+client.publish(MQTT_TOPIC_TOF_RATES, json.dumps({"grid": 5.0}), retain=True)
+
 # -----------------------------------------------------------------------------
-# A* Implementation
+# Grid Helpers
 # -----------------------------------------------------------------------------
 def in_bounds(grid, r, c):
     return (0 <= r < grid.shape[0]) and (0 <= c < grid.shape[1])
 
-def is_free(grid, r, c):
-    return in_bounds(grid, r, c) and grid[r, c] == 1
-
-def heuristic(a, b):
-    return math.hypot(a[0] - b[0], a[1] - b[1])
-
-def neighbors_8(grid, r, c):
-    for dr, dc in [(-1,0),(1,0),(0,-1),(0,1),(-1,-1),(-1,1),(1,-1),(1,1)]:
-        nr = r + dr
-        nc = c + dc
-        if in_bounds(grid, nr, nc) and grid[nr, nc] == 1:
-            yield nr, nc
-
-def a_star(grid, start_rc, goal_rc):
-    if not is_free(grid, start_rc[0], start_rc[1]):
-        return None
-    if not is_free(grid, goal_rc[0], goal_rc[1]):
-        return None
-
-    frontier = []
-    heappush(frontier, (0, start_rc))
-    came_from = {start_rc: None}
-    cost_so_far = {start_rc: 0}
-
-    while frontier:
-        _, current = heappop(frontier)
-        if current == goal_rc:
-            return reconstruct_path(came_from, start_rc, goal_rc)
-
-        for nxt in neighbors_8(grid, current[0], current[1]):
-            cost = cost_so_far[current] + (math.sqrt(2) if (nxt[0]-current[0]) and (nxt[1]-current[1]) else 1)
-            if nxt not in cost_so_far or cost < cost_so_far[nxt]:
-                cost_so_far[nxt] = cost
-                priority = cost + heuristic(nxt, goal_rc)
-                came_from[nxt] = current
-                heappush(frontier, (priority, nxt))
-    return None
-
-def reconstruct_path(came_from, start, goal):
-    path = []
-    current = goal
-    while current is not None:
-        path.append(current)
-        current = came_from[current]
-    path.reverse()
-    return path
-
 # -----------------------------------------------------------------------------
 # Conversions
 # -----------------------------------------------------------------------------
@@ -152,6 +175,11 @@ def world_to_grid(x, y, params):
     r = int((y - params["min_y"]) / params["resolution"])
     return (r, c)
 
+def grid_origin(params):
+    """Global (row, col) cell of the grid's corner; it changes when node_map moves its window."""
+    return (int(round(params["min_y"] / params["resolution"])),
+            int(round(params["min_x"] / params["resolution"])))
+
 def wrap_angle_180(a_deg):
     return (a_deg + 180) % 360 - 180
 
@@ -159,7 +187,15 @@ def wrap_angle_180(a_deg):
 # Random Target
 # -----------------------------------------------------------------------------
 def pick_random_free_cell_in_front(grid, params, robot_r, robot_c, robot_x, robot_y, robot_th_deg,
-                                   distance_m=1.0, fov_half_deg=90.0, side_margin_deg=5.0, max_tries=30):
+                                   distance_m=1.0, fov_half_deg=90.0, side_margin_deg=5.0, max_tries=30,
+                                   cell_cost=None):
+    # One flood from the robot answers every try: a sampled cell is a valid goal
+    # exactly when the flood reached it, and its path follows the parent field
+    planner.set_grid(grid, cell_cost)
+    if not planner.flood((robot_r, robot_c)):
+        return None
+    reachable = planner.reachable()
+
     # We'll pick angles around robot_th_deg
     min_angle = -(fov_half_deg - side_margin_deg)
     max_angle = +(fov_half_deg - side_margin_deg)
@@ -172,28 +208,66 @@ def pick_random_free_cell_in_front(grid, params, robot_r, robot_c, robot_x, robo
         ty = robot_y + distance_m * math.sin(theta_rad)
 
         tr, tc = world_to_grid(tx, ty, params)
-        if is_free(grid, tr, tc):
-            path = a_star(grid, (robot_r, robot_c), (tr, tc))
-            if path is not None:
-                return path
+        if in_bounds(grid, tr, tc) and reachable[tr, tc]:
+            return planner.path_to((tr, tc))
     return None
 
-def simplify_path(path_rc, max_waypoints=4):
-    if len(path_rc) <= max_waypoints:
-        return path_rc
-    # Always keep first, last, and 2 mid points
-    start = path_rc[0]
-    end   = path_rc[-1]
-    idx1  = len(path_rc) // 3
-    idx2  = (2 * len(path_rc)) // 3
-    return [start, path_rc[idx1], path_rc[idx2], end]
+# -----------------------------------------------------------------------------
+# Frontier Target
+# -----------------------------------------------------------------------------
+def pick_frontier_target(grid, robot_r, robot_c, cell_cost=None):
+    """Path to the frontier worth the most for its path cost, or None if there is none."""
+    if frontiers.frontier is None or frontiers.shape != grid.shape:
+        return None
+    planner.set_grid(grid, cell_cost)
+    if not planner.flood((robot_r, robot_c)):
+        return None
+    target = frontiers.best_target(planner.cost_field(), FRONTIER_GAIN_RADIUS,
+                                   FRONTIER_COST_WEIGHT, FRONTIER_MIN_SIZE)
+    if target is None:
+        return None
+    print(f"[node_pathplanning.py] Exploring frontier of {target.size} cells at {target.cell} "
+          f"(gain {target.gain}, cost {target.cost:.1f}).")
+    return planner.path_to(target.cell)
+
+# -----------------------------------------------------------------------------
+# Grid Snapshot
+# -----------------------------------------------------------------------------
+def take_pending_grid():
+    """Make the latest received grid the one main() plans on, with its cost and frontiers."""
+    global pending_grid, occupancy_grid, cell_cost, grid_params
+    with grid_lock:
+        snapshot, pending_grid = pending_grid, None
+    if snapshot is None:
+        return
+    grid, known, params = snapshot
+    cell_cost = (clearance_cost(grid, params["resolution"], CLEARANCE_DISTANCE, CLEARANCE_WEIGHT)
+                 if USE_CLEARANCE_COST else None)
+    if EXPLORATION_MODE == "frontier" and known is not None:
+        frontiers.update(grid, known, params["min_x"], params["min_y"], params["resolution"])
+    occupancy_grid, grid_params = grid, params
+
+# -----------------------------------------------------------------------------
+# Current Goal
+# -----------------------------------------------------------------------------
+def plan_to_current_goal(robot_r, robot_c):
+    """Path from the robot to current_goal_xy, or None if it is off the grid or unreachable."""
+    goal_rc = world_to_grid(current_goal_xy[0], current_goal_xy[1], grid_params)
+    if not in_bounds(occupancy_grid, *goal_rc):
+        return None
+    if INCREMENTAL_REPLANNING:
+        repair_planner.set_grid(occupancy_grid, cell_cost, grid_origin(grid_params))
+        return repair_planner.plan((robot_r, robot_c), goal_rc)
+    planner.set_grid(occupancy_grid, cell_cost)
+    return planner.plan((robot_r, robot_c), goal_rc)
 
 # -----------------------------------------------------------------------------
 # Main Loop
 # -----------------------------------------------------------------------------
 def main():
     global occupancy_grid, grid_params
-    global need_new_path, current_path
+    global need_new_path, current_path, current_goal_xy, path_cut
+    global path_completed, odometry_reset
     global robot_x, robot_y, robot_th_deg
 
     plan_rate = 0.2  # 5Hz
@@ -201,6 +275,19 @@ def main():
     while True:
         time.sleep(plan_rate)
 
+        if odometry_reset:
+            odometry_reset = False
+            frontiers.reset()
+            current_goal_xy = None
+            current_path = None
+            path_cut = False
+            need_new_path = True
+        take_pending_grid()
+        if path_completed:
+            path_completed = False
+            if not path_cut:
+                frontiers.mark_visited(robot_x, robot_y)
+
         if occupancy_grid is None:
             continue
 
@@ -210,43 +297,77 @@ def main():
             print("[node_pathplanning.py] Robot out of bounds in grid!")
             continue
 
-        # Check if path is obstructed
+        # Check if the corridor of the remaining path is obstructed
         if current_path is not None:
-            for i, (r, c) in enumerate(current_path):
-                if not is_free(occupancy_grid, r, c):
-                    print(f"[node_pathplanning.py] Path obstructed at idx={i}, re-planning...")
-                    need_new_path = True
-                    current_path = None
-                    break
+            progress = current_path.nearest_sample(robot_x, robot_y)
+            blocked = current_path.first_blocked(occupancy_grid, grid_params["min_x"], grid_params["min_y"],
+                                                 grid_params["resolution"], from_sample=progress)
+            if blocked is not None:
+                print(f"[node_pathplanning.py] Path obstructed at idx={blocked}/{len(current_path)}, re-planning...")
+                need_new_path = True
+                current_path = None
+
+            if current_path is None and current_goal_xy is not None:
+                path_rc = plan_to_current_goal(rr, cc)
+                if path_rc is not None:
+                    publish_path(path_rc)
+                    expanded = repair_planner.expanded if INCREMENTAL_REPLANNING else planner.expanded
+                    print(f"[node_pathplanning.py] Repaired path to the same goal ({expanded} cells expanded).")
+                else:
+                    print("[node_pathplanning.py] Goal no longer reachable, picking a new one.")
+
+        if need_new_path and path_cut and current_goal_xy is not None:
+            # The robot reached the end of a path cut after MAX_WAYPOINTS, carry on to its goal
+            path_cut = False
+            path_rc = plan_to_current_goal(rr, cc)
+            if path_rc is not None:
+                publish_path(path_rc)
+                print("[node_pathplanning.py] Continuing to the same goal.")
+            else:
+                print("[node_pathplanning.py] Goal of the cut path no longer reachable, picking a new one.")
 
         if need_new_path or current_path is None:
             print("[node_pathplanning.py] Planning a new path...")
 
+            path_rc = None
+            if EXPLORATION_MODE == "frontier":
+                path_rc = pick_frontier_target(occupancy_grid, rr, cc, cell_cost)
+
             # Try a random heading or just use robot heading
-            path_rc = pick_random_free_cell_in_front(
-                occupancy_grid, grid_params,
-                rr, cc,
-                robot_x, robot_y, robot_th_deg,
-                distance_m=1.0,
-                fov_half_deg=90.0,
-                side_margin_deg=5.0,
-                max_tries=30
-            )
+            if path_rc is None:
+                path_rc = pick_random_free_cell_in_front(
+                    occupancy_grid, grid_params,
+                    rr, cc,
+                    robot_x, robot_y, robot_th_deg,
+                    distance_m=1.0,
+                    fov_half_deg=90.0,
+                    side_margin_deg=5.0,
+                    max_tries=30,
+                    cell_cost=cell_cost
+                )
 
             if path_rc is not None:
-                path_rc = simplify_path(path_rc, 4)
-                path_xy = [grid_to_world(r, c, grid_params) for r, c in path_rc]
-
-                msg = {
-                    "path_rc": path_rc,
-                    "path_xy": path_xy
-                }
-                client.publish(MQTT_TOPIC_PATH_PLAN, json.dumps(msg))
-                current_path = path_rc
-                need_new_path = False
-                print(f"[node_pathplanning.py] Published path with {len(path_rc)} waypoints.")
+                current_goal_xy = grid_to_world(path_rc[-1][0], path_rc[-1][1], grid_params)
+                publish_path(path_rc)
             else:
-                print("[node_pathplanning.py] No valid path found in front. Will try again...")
+                print("[node_pathplanning.py] No valid goal found. Will try again...")
+
+def publish_path(path_rc):
+    global current_path, need_new_path, path_cut
+    goal_rc = path_rc[-1]
+    path_rc = shorten_path(occupancy_grid, path_rc, MAX_WAYPOINTS, cell_cost)
+    path_cut = path_rc[-1] != goal_rc
+    path_xy = [grid_to_world(r, c, grid_params) for r, c in path_rc]
+
+    msg = {
+        "path_rc": path_rc,
+        "path_xy": path_xy
+    }
+    client.publish(MQTT_TOPIC_PATH_PLAN, json.dumps(msg))
+    # The straight segments the robot drives, kept in world coordinates for the obstruction check
+    current_path = PathCorridor(path_xy, spacing=grid_params["resolution"] / 2.0)
+    need_new_path = False
+    print(f"[node_pathplanning.py] Published path with {len(path_rc)} waypoints.")
 
 try:
     main()
@@ -12,6 +12,8 @@ import paho.mqtt.client as mqtt
 import matplotlib
 import rerun as rr
 
+from lib.map_codec import MapDecoder
+
 # Import math for trigonometric functions
 import math
 
@@ -26,7 +28,10 @@ rr.connect_tcp("192.168.2.24:9876")       # Connect to Rerun Viewer over TCP
 # -----------------------------------------------------------------------------
 MQTT_BROKER = "localhost"
 MQTT_PORT = 1883
-MQTT_TOPIC = "robot/tof_map"         # Subscribe to the map data topic
+POINTS_TOPIC = "robot/tof_points"     # Subscribe to the ToF point clouds
+GRID_TOPIC = "robot/tof_grid"         # Subscribe to the occupancy grid
+TOF_RATES_TOPIC = "robot/tof_rates/rerun"  # Publish the rates we want them at
+TOF_RATES = {"points": 5.0, "grid": 2.0}
 PATH_PLAN_TOPIC = "robot/local_path"  # Subscribe to the path plan topic
 ODOMETRY_TOPIC = "robot/odometry"     # Subscribe to the odometry data
 
@@ -47,31 +52,35 @@ robot_color     = np.array([[1.0, 0.0, 0.0, 0.4]])# RGBA: red, semi-transparent
 # -----------------------------------------------------------------------------
 robot_path = []  # List to store robot positions over time
 robot_pose = {'x': 0.0, 'y': 0.0, 'theta': 0.0}  # Robot's current pose
+# Decoders for the binary map messages, one per topic since grids arrive as deltas
+map_decoders = {POINTS_TOPIC: MapDecoder(), GRID_TOPIC: MapDecoder()}
 
 # -----------------------------------------------------------------------------
 # MQTT Callbacks
 # -----------------------------------------------------------------------------
 def on_connect(client, userdata, flags, reason_code, properties=None):
     print(f"Connected with reason code: {reason_code}")
+    client.publish(TOF_RATES_TOPIC, json.dumps(TOF_RATES), retain=True)
     client.subscribe([
-        (MQTT_TOPIC, 0),
+        (POINTS_TOPIC, 0),
+        (GRID_TOPIC, 0),
         (PATH_PLAN_TOPIC, 0),
         (ODOMETRY_TOPIC, 0),  # Subscribe to the odometry topic
     ])
 
 def on_message(client, userdata, msg):
     try:
-        if msg.topic == MQTT_TOPIC:
-            data = json.loads(msg.payload)
+        if msg.topic in map_decoders:
+            data = map_decoders[msg.topic].decode(msg.payload)
             
             # Process each sensor's data
-            for sensor_data in data["sensors"]:
+            for sensor_data in data.get("sensors", []):
                 sensor_addr = sensor_data["sensor_address"]
                 
                 # Process valid points
                 valid_points = sensor_data["valid_points"]
-                if valid_points:
-                    points_np = np.array(valid_points)
+                if len(valid_points):
+                    points_np = np.asarray(valid_points)
                     d_m = np.linalg.norm(points_np, axis=1)  # distances in meters
                     colors = cmap(norm(d_m))
                     radii = np.full(points_np.shape[0], 0.05)
@@ -85,8 +94,8 @@ def on_message(client, userdata, msg):
                 
                 # Process invalid points
                 invalid_points = sensor_data["invalid_points"]
-                if invalid_points:
-                    points_np = np.array(invalid_points)
+                if len(invalid_points):
+                    points_np = np.asarray(invalid_points)
                     colors = np.full((points_np.shape[0], 4), [1.0, 1.0, 0.0, 0.5])  # Yellow, semi-transparent
                     radii = np.full(points_np.shape[0], 0.05)
                     
@@ -118,8 +127,11 @@ def on_message(client, userdata, msg):
                     # Stack into Nx3 array
                     local_points = np.column_stack((local_x, local_y, local_z))
                     
-                    # Transform points to world coordinates
-                    world_points = transform_robot_to_world(local_points, robot_pose)
+                    # Transform points to world coordinates (persistent maps already are)
+                    if grid_info.get("frame", "robot") == "world":
+                        world_points = local_points
+                    else:
+                        world_points = transform_robot_to_world(local_points, robot_pose)
                     
                     colors = np.full((len(world_points), 4), [0.2, 0.2, 0.2, 1.0])  # Dark gray, fully opaque
                     radii = np.full(len(world_points), resolution / 2)  # Half the cell size
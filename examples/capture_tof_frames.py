@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Record raw VL53L5CX frames from the robot's sensors for ReplayI2CBus.
+
+Brings the sensors up like core/node_map.py (stop node_map first, the sensors are
+re-initialised), reads CAPTURE_SECONDS of frames through a RecordingI2CBus and saves
+them with the NVM block to OUTPUT_FILE. Replay them on any machine with
+
+    frames, nvm = load_recording("tof_frames.npz")
+    bus = ReplayI2CBus(frames, nvm=nvm)
+
+or run tests/test_vl53l5cx_replay.py with TOF_RECORDING=tof_frames.npz.
+"""
+# Adds the lib directory to the Python path
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import time
+from RPi import GPIO
+import smbus2
+
+from lib.vl53l5cx_lib.vl53l5cx import VL53L5CX
+from lib.vl53l5cx_lib.api import VL53L5CX_RESOLUTION_8X8
+from lib.vl53l5cx_lib.replay import RecordingI2CBus
+
+OUTPUT_FILE = "tof_frames.npz"
+CAPTURE_SECONDS = 10.0
+SENSOR_PINS = [17, 22, 27]        # LPn pins, as in core/node_map.py
+ADDRESSES = [0x52, 0x54, 0x56]
+BUS_ID = 1
+RESOLUTION = VL53L5CX_RESOLUTION_8X8
+RANGING_FREQUENCY_HZ = 15
+OUTPUT_PROFILE = "quality"        # Must match the profile the replay will decode with
+
+def is_present(sensor: VL53L5CX) -> bool:
+    """Whether `sensor` answers at its address; an absent device NACKs, which raises."""
+    try:
+        return sensor.is_alive()
+    except OSError:
+        return False
+
+def main():
+    GPIO.setmode(GPIO.BCM)
+    for pin in SENSOR_PINS:
+        GPIO.setup(pin, GPIO.OUT, initial=GPIO.HIGH)
+
+    bus = RecordingI2CBus(smbus2.SMBus(BUS_ID))
+    sensors = []
+    for pin, address in zip(SENSOR_PINS, ADDRESSES):
+        sensor = VL53L5CX(i2c_bus=bus, i2c_address=address, use_numpy_results=True,
+                          output_profile=OUTPUT_PROFILE)
+        if not is_present(sensor):
+            # Not addressed yet: only this sensor listens on the default address
+            for p in SENSOR_PINS:
+                GPIO.output(p, GPIO.LOW)
+            GPIO.output(pin, GPIO.HIGH)
+            time.sleep(0.1)
+            sensor = VL53L5CX(i2c_bus=bus, use_numpy_results=True, output_profile=OUTPUT_PROFILE)
+            sensor.set_i2c_address(address)
+            for p in SENSOR_PINS:
+                GPIO.output(p, GPIO.HIGH)
+        sensors.append(sensor)
+
+    print("Initialising sensors...")
+    for sensor in sensors:
+        sensor.init()
+        sensor.set_resolution(RESOLUTION)
+        sensor.set_ranging_frequency_hz(RANGING_FREQUENCY_HZ)
+        sensor.start_ranging()
+
+    print(f"Recording {CAPTURE_SECONDS:.0f} s of frames...")
+    end = time.monotonic() + CAPTURE_SECONDS
+    try:
+        while time.monotonic() < end:
+            for sensor in sensors:
+                if sensor.check_data_ready():
+                    sensor.get_ranging_data()
+            time.sleep(0.005)
+    finally:
+        for sensor in sensors:
+            sensor.stop_ranging()
+        GPIO.cleanup()
+
+    bus.save(OUTPUT_FILE)
+    counts = {hex(address): len(frames) for address, frames in bus.frames.items()}
+    print(f"Saved {counts} frames to {OUTPUT_FILE}")
+
+if __name__ == "__main__":
+    main()
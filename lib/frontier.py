@@ -0,0 +1,202 @@
+from collections import deque
+
+import numpy as np
+
+try:
+    from scipy import ndimage
+except ImportError:  # scipy is optional, clusters fall back to a Python flood fill
+    ndimage = None
+
+from lib.occupancy import FREE, shift_grid
+
+_NEIGHBOURS_4 = ((-1, 0), (1, 0), (0, -1), (0, 1))
+_NEIGHBOURS_8 = _NEIGHBOURS_4 + ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+def _dilate_4(mask: np.ndarray) -> np.ndarray:
+    """`mask` grown by one cell towards its 4-neighbours."""
+    grown = mask.copy()
+    grown[1:] |= mask[:-1]
+    grown[:-1] |= mask[1:]
+    grown[:, 1:] |= mask[:, :-1]
+    grown[:, :-1] |= mask[:, 1:]
+    return grown
+
+
+def _label_8(mask: np.ndarray):
+    """8-connected components of `mask` as (labels, count), like ndimage.label."""
+    if ndimage is not None:
+        return ndimage.label(mask, structure=np.ones((3, 3), dtype=bool))
+    h, w = mask.shape
+    labels = np.zeros(mask.shape, dtype=np.int32)
+    count = 0
+    for r, c in np.argwhere(mask).tolist():
+        if labels[r, c]:
+            continue
+        count += 1
+        labels[r, c] = count
+        stack = [(r, c)]
+        while stack:
+            cr, cc = stack.pop()
+            for dr, dc in _NEIGHBOURS_8:
+                nr, nc = cr + dr, cc + dc
+                if 0 <= nr < h and 0 <= nc < w and mask[nr, nc] and not labels[nr, nc]:
+                    labels[nr, nc] = count
+                    stack.append((nr, nc))
+    return labels, count
+
+
+class FrontierTarget:
+    """The chosen cell of one frontier cluster, with what it is worth and costs."""
+
+    __slots__ = ("cell", "size", "gain", "cost", "score")
+
+    def __init__(self, cell, size: int, gain: int, cost: float, score: float) -> None:
+        self.cell = cell
+        self.size = size
+        self.gain = gain
+        self.cost = cost
+        self.score = score
+
+
+class FrontierIndex:
+    """
+    Frontier cells - known free cells next to an unknown cell - of the grid window
+    handed to the planner, kept up to date incrementally.
+
+    update() takes every new grid with its known mask and re-evaluates only the
+    cells whose free/known state changed and their 4-neighbours. When the window
+    has moved, the previous state is shifted along with it first, so a window step
+    only costs a re-evaluation of the newly exposed strip and the border. Cells at
+    the window edge never count as frontier for what lies beyond it.
+
+    best_target() clusters the frontier cells and picks the cluster worth the most:
+    the unknown cells within `gain_radius` of its target cell (information gain)
+    minus `cost_weight` times the path cost to reach it. The last `max_visited`
+    places the robot stopped at (mark_visited()) are not picked again.
+
+    Not thread-safe: update() and best_target() must be called from the same thread.
+    """
+
+    def __init__(self, visited_radius: float = 0.3, max_visited: int = 100) -> None:
+        self.visited_radius = visited_radius
+        self.visited = deque(maxlen=max_visited)  # World x/y where the robot finished a path
+        self.shape = None
+        self.origin = None       # Global (row, col) cell of the window's corner
+        self.resolution = None
+        self.known = None
+        self.open = None         # Known and free
+        self.frontier = None
+        self.updated_cells = 0   # Cells re-evaluated by the last update()
+
+    def reset(self) -> None:
+        """Forget the frontier and the visited places, e.g. when the world frame was reset."""
+        self.visited.clear()
+        self.shape = self.origin = self.resolution = None
+        self.known = self.open = self.frontier = None
+        self.updated_cells = 0
+
+    def update(self, grid: np.ndarray, known: np.ndarray, min_x: float, min_y: float,
+               resolution: float) -> None:
+        known = np.array(known, dtype=bool)  # Kept for the next diff, so never a view of the caller's mask
+        open_cells = (grid == FREE) & known
+        origin = (int(round(min_y / resolution)), int(round(min_x / resolution)))
+
+        if (self.frontier is None or grid.shape != self.shape or resolution != self.resolution
+                or abs(origin[0] - self.origin[0]) >= grid.shape[0]
+                or abs(origin[1] - self.origin[1]) >= grid.shape[1]):
+            self.shape, self.resolution = grid.shape, resolution
+            self.origin, self.known, self.open = origin, known, open_cells
+            self.frontier = np.zeros(grid.shape, dtype=bool)
+            self.updated_cells = grid.size
+            self._evaluate(np.arange(grid.size))
+            return
+
+        dr, dc = origin[0] - self.origin[0], origin[1] - self.origin[1]
+        if dr or dc:
+            # Bring the previous state into the new window; exposed cells are re-evaluated,
+            # and so is the border, whose neighbours beyond the window no longer count
+            exposed = ~shift_grid(np.ones(grid.shape, dtype=bool), dr, dc, False)
+            exposed[0, :] = exposed[-1, :] = exposed[:, 0] = exposed[:, -1] = True
+            old_known = shift_grid(self.known, dr, dc, False)
+            old_open = shift_grid(self.open, dr, dc, False)
+            self.frontier = shift_grid(self.frontier, dr, dc, False)
+        else:
+            exposed = np.zeros(grid.shape, dtype=bool)
+            old_known, old_open = self.known, self.open
+
+        changed = exposed | (known != old_known) | (open_cells != old_open)
+        self.origin, self.known, self.open = origin, known, open_cells
+        affected = np.flatnonzero(_dilate_4(changed))
+        self.updated_cells = len(affected)
+        self._evaluate(affected)
+
+    def _evaluate(self, cells: np.ndarray) -> None:
+        """Recompute the frontier flag of the given flat cell indices."""
+        h, w = self.shape
+        rows, cols = np.divmod(cells, w)
+        unknown_neighbour = np.zeros(len(cells), dtype=bool)
+        for dr, dc in _NEIGHBOURS_4:
+            r, c = rows + dr, cols + dc
+            inside = (r >= 0) & (r < h) & (c >= 0) & (c < w)
+            unknown_neighbour[inside] |= ~self.known[r[inside], c[inside]]
+        self.frontier.ravel()[cells] = self.open.ravel()[cells] & unknown_neighbour
+
+    def cell_to_world(self, r: int, c: int):
+        """World x/y of the centre of window cell (r, c)."""
+        return ((self.origin[1] + c + 0.5) * self.resolution,
+                (self.origin[0] + r + 0.5) * self.resolution)
+
+    def mark_visited(self, x: float, y: float) -> None:
+        self.visited.append((x, y))
+
+    def clusters(self, min_size: int = 1) -> list:
+        """8-connected groups of frontier cells with at least `min_size` cells, as (N, 2) row/col arrays."""
+        labels, count = _label_8(self.frontier)
+        if count == 0:
+            return []
+        cells = np.argwhere(labels)
+        groups = np.split(cells[np.argsort(labels[cells[:, 0], cells[:, 1]], kind="stable")],
+                          np.cumsum(np.bincount(labels[labels > 0])[1:])[:-1])
+        return [group for group in groups if len(group) >= min_size]
+
+    def best_target(self, cost_field: np.ndarray, gain_radius: float, cost_weight: float,
+                    min_size: int = 1):
+        """
+        Best frontier cluster to explore as a FrontierTarget, or None.
+
+        :param cost_field: (rows, cols) path cost from the robot to every cell, inf
+                           where unreachable (GridPlanner.flood())
+        :param gain_radius: radius in metres around a target whose unknown cells count as its gain
+        :param cost_weight: unknown cells one unit of path cost is worth
+        """
+        if self.frontier is None:
+            return None
+        h, w = self.shape
+        radius = max(int(round(gain_radius / self.resolution)), 1)
+        # Summed-area table of the unknown cells: the gain of any cell is four lookups
+        unknown = np.zeros((h + 1, w + 1), dtype=np.int64)
+        unknown[1:, 1:] = np.cumsum(np.cumsum(~self.known, axis=0), axis=1)
+        visited = np.array(self.visited, dtype=np.float64).reshape(-1, 2)
+
+        best = None
+        for cells in self.clusters(min_size):
+            cost = cost_field[cells[:, 0], cells[:, 1]]
+            reachable = cells[np.isfinite(cost)]
+            if len(reachable) == 0:
+                continue
+            # The reachable cell nearest the cluster's centroid stands for the cluster
+            centroid = cells.mean(axis=0)
+            r, c = (int(v) for v in reachable[np.argmin(np.sum((reachable - centroid) ** 2, axis=1))])
+            if len(visited):
+                x, y = self.cell_to_world(r, c)
+                if np.min(np.hypot(visited[:, 0] - x, visited[:, 1] - y)) < self.visited_radius:
+                    continue
+
+            r0, r1 = max(r - radius, 0), min(r + radius + 1, h)
+            c0, c1 = max(c - radius, 0), min(c + radius + 1, w)
+            gain = int(unknown[r1, c1] - unknown[r0, c1] - unknown[r1, c0] + unknown[r0, c0])
+            score = gain - cost_weight * float(cost_field[r, c])
+            if best is None or score > best.score:
+                best = FrontierTarget((r, c), len(cells), gain, float(cost_field[r, c]), score)
+        return best
@@ -0,0 +1,577 @@
+import math
+from heapq import heappush, heappop
+import numpy as np
+
+from lib.occupancy import FREE, OCCUPIED, shift_grid
+
+SQRT2 = math.sqrt(2.0)
+# D* Lite keys are rounded so that cells whose k1 ties with another's in exact
+# arithmetic also tie in floating point and get ordered by k2, as they must be
+KEY_DIGITS = 9
+
+
+class GridPlanner:
+    """
+    8-connected A* over an occupancy grid, working on flat cell indices.
+
+    set_grid() copies the grid into a FREE mask padded with a one-cell occupied
+    border, so a neighbour is just the cell index plus one of eight precomputed
+    offsets and never needs a bounds check. g-costs, parents and the closed-set
+    bitmap live in preallocated numpy arrays that are reused by every search on
+    grids of the same shape; the search loop reads and writes them through
+    memoryviews, which is much faster than indexing numpy arrays item by item.
+
+    An optional per-cell cost (e.g. occupancy.clearance_cost()) makes a step into
+    a cell cost its length times (1 + cost), so paths keep away from obstacles
+    where there is room; the octile heuristic stays admissible.
+
+    Paths go in and come out as (row, col) cells of the unpadded grid, like the
+    dict-based planner node_pathplanning used before.
+    """
+
+    def __init__(self) -> None:
+        self.grid = None
+        self.shape = (0, 0)
+        self.width = 0           # Padded width, the row stride of flat indices
+        self.free = b""          # Padded FREE mask, one byte per cell
+        self.cell_cost = None
+        self.weight = np.empty(0)  # Padded 1 + cell cost, the step length multiplier
+        self.neighbours = ()     # (offset, step cost) per direction
+        self.g = np.empty(0)
+        self.parent = np.empty(0, dtype=np.int64)
+        self.closed = np.empty(0, dtype=np.uint8)
+        self.expanded = 0        # Cells expanded by the last search
+
+    def set_grid(self, grid: np.ndarray, cell_cost: np.ndarray = None) -> None:
+        """
+        Plan on `grid`, with the extra cost `cell_cost` of entering each cell, from
+        now on; a no-op when they are the arrays already set.
+        """
+        if grid is self.grid and cell_cost is self.cell_cost:
+            return
+        h, w = grid.shape
+        padded = np.zeros((h + 2, w + 2), dtype=np.uint8)
+        padded[1:-1, 1:-1] = grid == FREE
+        self.grid = grid
+        self.free = padded.tobytes()
+        self.cell_cost = cell_cost
+        self.weight = np.ones(padded.shape)
+        if cell_cost is not None:
+            self.weight[1:-1, 1:-1] += cell_cost
+        self.weight = self.weight.ravel()
+        self._weight = memoryview(self.weight)
+
+        if (h, w) != self.shape:
+            self.shape = (h, w)
+            self.width = w + 2
+            self.g = np.empty(padded.size)
+            self.parent = np.empty(padded.size, dtype=np.int64)
+            self.closed = np.empty(padded.size, dtype=np.uint8)
+            self._g = memoryview(self.g)
+            self._parent = memoryview(self.parent)
+            self._closed = memoryview(self.closed)
+            stride = self.width
+            self.neighbours = tuple((dr * stride + dc, SQRT2 if dr and dc else 1.0)
+                                    for dr, dc in [(-1, 0), (1, 0), (0, -1), (0, 1),
+                                                   (-1, -1), (-1, 1), (1, -1), (1, 1)])
+
+    def index(self, r: int, c: int):
+        """Flat index of cell (r, c), or None outside the grid."""
+        if 0 <= r < self.shape[0] and 0 <= c < self.shape[1]:
+            return (r + 1) * self.width + c + 1
+        return None
+
+    def cell(self, n: int):
+        r, c = divmod(n, self.width)
+        return (r - 1, c - 1)
+
+    def is_free(self, r: int, c: int) -> bool:
+        n = self.index(r, c)
+        return n is not None and self.free[n] == 1
+
+    def plan(self, start_rc, goal_rc):
+        """Shortest 8-connected path of free cells from `start_rc` to `goal_rc`, or None."""
+        start = self.index(*start_rc)
+        goal = self.index(*goal_rc)
+        self.expanded = 0
+        if start is None or goal is None or not self.free[start] or not self.free[goal]:
+            return None
+
+        free, neighbours, stride = self.free, self.neighbours, self.width
+        g, parent, closed, weight = self._g, self._parent, self._closed, self._weight
+        self.g.fill(np.inf)
+        self.closed.fill(0)
+        goal_r, goal_c = divmod(goal, stride)
+        diagonal = SQRT2 - 2.0
+
+        g[start] = 0.0
+        parent[start] = -1
+        heap = [(0.0, start)]
+        expanded = 0
+        while heap:
+            _, n = heappop(heap)
+            if closed[n]:
+                continue
+            if n == goal:
+                self.expanded = expanded
+                return self.extract_path(goal)
+            closed[n] = 1
+            expanded += 1
+
+            g_n = g[n]
+            for offset, step in neighbours:
+                m = n + offset
+                if free[m] and not closed[m]:
+                    cost = g_n + step * weight[m]
+                    if cost < g[m]:
+                        g[m] = cost
+                        parent[m] = n
+                        # Octile distance, exact on an empty 8-connected grid
+                        r, c = divmod(m, stride)
+                        dr = abs(r - goal_r)
+                        dc = abs(c - goal_c)
+                        heappush(heap, (cost + dr + dc + diagonal * min(dr, dc), m))
+        self.expanded = expanded
+        return None
+
+    def flood(self, start_rc) -> bool:
+        """
+        Dijkstra from `start_rc` over every cell reachable from it. Until the next
+        plan() or flood(), reachable() and path_to() then answer for any goal without
+        another search. False when the start itself is not free.
+        """
+        start = self.index(*start_rc)
+        self.g.fill(np.inf)
+        self.expanded = 0
+        if start is None or not self.free[start]:
+            return False
+
+        free, neighbours = self.free, self.neighbours
+        g, parent, closed, weight = self._g, self._parent, self._closed, self._weight
+        self.closed.fill(0)
+        g[start] = 0.0
+        parent[start] = -1
+        heap = [(0.0, start)]
+        expanded = 0
+        while heap:
+            g_n, n = heappop(heap)
+            if closed[n]:
+                continue
+            closed[n] = 1
+            expanded += 1
+            for offset, step in neighbours:
+                m = n + offset
+                if free[m] and not closed[m]:
+                    cost = g_n + step * weight[m]
+                    if cost < g[m]:
+                        g[m] = cost
+                        parent[m] = n
+                        heappush(heap, (cost, m))
+        self.expanded = expanded
+        return True
+
+    def cost_field(self) -> np.ndarray:
+        """(rows, cols) path cost from the last flood()'s start to every cell, inf where not reached."""
+        h, w = self.shape
+        return self.g.reshape(h + 2, w + 2)[1:-1, 1:-1]
+
+    def reachable(self) -> np.ndarray:
+        """Boolean (rows, cols) mask of the cells the last flood() reached."""
+        return self.cost_field() < np.inf
+
+    def path_to(self, goal_rc):
+        """Path from the last flood()'s start to `goal_rc`, or None if it was not reached."""
+        goal = self.index(*goal_rc)
+        if goal is None or self._g[goal] == np.inf:
+            return None
+        return self.extract_path(goal)
+
+    def extract_path(self, n: int) -> list:
+        """Follow the parent array from flat index `n` back to the search start."""
+        parent = self._parent
+        path = []
+        while n != -1:
+            path.append(self.cell(n))
+            n = parent[n]
+        path.reverse()
+        return path
+
+
+class DStarLite(GridPlanner):
+    """
+    Incremental planner (D* Lite) with the same set_grid()/plan() interface as
+    GridPlanner.
+
+    The search runs backwards from the goal and is kept between calls. set_grid()
+    compares the new grid with the previous one and re-queues only the cells whose
+    occupancy changed and their neighbours; plan() towards the same goal then
+    repairs the previous search rather than starting over, so a replan costs time in
+    proportion to the change near the path. A new goal, or a grid of another shape,
+    starts a fresh search.
+
+    Grids may be windows that move with the robot: given the window `origin`,
+    set_grid() shifts the search state along with the window first, so only the
+    newly exposed edge and the edge whose neighbours dropped out of the window are
+    re-examined, besides the cells that actually changed.
+
+    It expands far fewer cells than a fresh search, but the bookkeeping costs more
+    per cell, so on small grids a GridPlanner search is still faster in wall time.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.goal = None
+        self.start = None
+        self.km = 0.0            # Key modifier, grows as the start moves
+        self.heap = []           # (k1, k2, cell); stale entries are skipped when popped
+        self.rhs = np.empty(0)
+        self.origin = None       # Global (row, col) cell of the grid's corner, if given
+        self.changed_cells = 0   # Cells that changed in the last set_grid()
+
+    def set_grid(self, grid: np.ndarray, cell_cost: np.ndarray = None, origin=None) -> None:
+        """
+        As GridPlanner.set_grid(); `origin` is the global (row, col) cell of
+        grid[0, 0], e.g. (round(min_y / resolution), round(min_x / resolution)) of a
+        world-frame window. Without it, every grid is taken to cover the same cells.
+        """
+        if grid is self.grid and cell_cost is self.cell_cost and origin == self.origin:
+            return
+        old_free, old_weight, old_shape, old_origin = self.free, self.weight, self.shape, self.origin
+        super().set_grid(grid, cell_cost)
+        self.origin = origin
+        self.changed_cells = 0
+        if self.goal is None:
+            return
+        if self.shape != old_shape:
+            self.goal = None
+            return
+
+        old_free = np.frombuffer(old_free, dtype=np.uint8)
+        moved = np.zeros(old_free.size, dtype=bool)
+        if origin is not None and old_origin is not None and origin != old_origin:
+            old_free, old_weight, moved = self._shift_search(origin[0] - old_origin[0],
+                                                             origin[1] - old_origin[1],
+                                                             old_free, old_weight)
+            if self.goal is None:
+                return
+        changed = np.flatnonzero((old_free != np.frombuffer(self.free, dtype=np.uint8))
+                                 | (old_weight != self.weight) | moved)
+        self.changed_cells = len(changed)
+        if len(changed):
+            # A changed cell changes the cost of every edge into (and, when it gets
+            # blocked or unblocked, out of) it
+            offsets = np.array([0] + [offset for offset, _ in self.neighbours])
+            self._update_vertices(np.unique(changed[:, np.newaxis] + offsets))
+
+    def _shift_search(self, dr: int, dc: int, old_free, old_weight):
+        """
+        Move the search by the window step (dr, dc): g and rhs follow their cells,
+        cells that left the window are forgotten and the queue is rebuilt from the
+        inconsistent cells. Returns the previous free mask and weights moved the same
+        way, plus the cells that must be re-examined because their neighbourhood
+        changed with the move. Drops the search (goal None) when the start or the
+        goal left the window.
+        """
+        h, w = self.shape
+        goal_r, goal_c = self.cell(self.goal)
+        start_r, start_c = self.cell(self.start)
+        if not (0 <= goal_r - dr < h and 0 <= goal_c - dc < w
+                and 0 <= start_r - dr < h and 0 <= start_c - dc < w):
+            self.goal = None
+            return old_free, old_weight, None
+        self.goal = self.index(goal_r - dr, goal_c - dc)
+        self.start = self.index(start_r - dr, start_c - dc)
+
+        def shift(array, fill):
+            padded = array.reshape(h + 2, w + 2)
+            shifted = np.full_like(padded, fill)
+            shifted[1:-1, 1:-1] = shift_grid(padded[1:-1, 1:-1], dr, dc, fill)
+            return shifted
+
+        self.g[:] = shift(self.g, np.inf).ravel()
+        self.rhs[:] = shift(self.rhs, np.inf).ravel()
+        inside = shift(np.ones(self.g.size, dtype=bool), False)
+        exposed = ~inside
+        exposed[0, :] = exposed[-1, :] = exposed[:, 0] = exposed[:, -1] = False
+
+        # Cells next to the exposed area may now have a new route out through it, and
+        # the edge the window moved away from lost the neighbours beyond it
+        near_exposed = exposed.copy()
+        for row_step, col_step in [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]:
+            near_exposed |= np.roll(exposed, (row_step, col_step), axis=(0, 1))
+        moved = near_exposed & inside
+        if dr > 0:
+            moved[1, 1:-1] = True
+        elif dr < 0:
+            moved[h, 1:-1] = True
+        if dc > 0:
+            moved[1:-1, 1] = True
+        elif dc < 0:
+            moved[1:-1, w] = True
+
+        self.heap = []
+        self._push_all(np.flatnonzero(self.g != self.rhs))
+        # Exposed cells compare equal to the new grid, only the overlap is diffed
+        exposed = exposed.ravel()
+        old_free = np.where(exposed, np.frombuffer(self.free, dtype=np.uint8), shift(old_free, 0).ravel())
+        old_weight = np.where(exposed, self.weight, shift(old_weight, 1.0).ravel())
+        return old_free, old_weight, moved.ravel()
+
+    def _h(self, a: int, b: int) -> float:
+        ar, ac = divmod(a, self.width)
+        br, bc = divmod(b, self.width)
+        dr = abs(ar - br)
+        dc = abs(ac - bc)
+        return dr + dc + (SQRT2 - 2.0) * min(dr, dc)
+
+    def _push(self, u: int) -> None:
+        m = min(self._g[u], self._rhs[u])
+        heappush(self.heap, (round(m + self._h(self.start, u) + self.km, KEY_DIGITS), m, u))
+
+    def _push_all(self, cells: np.ndarray) -> None:
+        """_push() for an array of cells, with the keys computed in one go."""
+        if len(cells) == 0:
+            return
+        m = np.minimum(self.g[cells], self.rhs[cells])
+        rows, cols = np.divmod(cells, self.width)
+        start_r, start_c = divmod(self.start, self.width)
+        dr, dc = np.abs(rows - start_r), np.abs(cols - start_c)
+        k1 = m + (dr + dc + (SQRT2 - 2.0) * np.minimum(dr, dc)) + self.km
+        for entry in zip(k1.tolist(), m.tolist(), cells.tolist()):
+            heappush(self.heap, (round(entry[0], KEY_DIGITS),) + entry[1:])
+
+    def _update_vertices(self, cells: np.ndarray) -> None:
+        """
+        _update_vertex() for an array of cells, vectorised: rhs only depends on the
+        neighbours' g, so every cell can be updated at once and only the ones left
+        inconsistent go through the heap.
+        """
+        rows, cols = np.divmod(cells, self.width)
+        h, w = self.shape
+        cells = cells[(rows >= 1) & (rows <= h) & (cols >= 1) & (cols <= w) & (cells != self.goal)]
+        free = np.frombuffer(self.free, dtype=np.uint8)
+        offsets, steps = (np.array(column) for column in zip(*self.neighbours))
+        m = cells[:, np.newaxis] + offsets
+        best = np.where(free[m] == 1, steps * self.weight[m] + self.g[m], np.inf).min(axis=1)
+        best[free[cells] == 0] = np.inf
+        self.rhs[cells] = best
+        self._push_all(cells[self.g[cells] != best])
+
+    def _update_vertex(self, u: int) -> None:
+        g, rhs, free, weight = self._g, self._rhs, self.free, self._weight
+        if u != self.goal:
+            best = np.inf
+            if free[u]:
+                for offset, step in self.neighbours:
+                    m = u + offset
+                    if free[m] and step * weight[m] + g[m] < best:
+                        best = step * weight[m] + g[m]
+            rhs[u] = best
+        if g[u] != rhs[u]:
+            self._push(u)
+
+    def _reset(self, start: int, goal: int) -> None:
+        if self.rhs.size != self.g.size:
+            self.rhs = np.empty(self.g.size)
+            self._rhs = memoryview(self.rhs)
+        self.g.fill(np.inf)
+        self.rhs.fill(np.inf)
+        self._rhs[goal] = 0.0
+        self.start = start
+        self.goal = goal
+        self.km = 0.0
+        self.heap = [(round(self._h(start, goal), KEY_DIGITS), 0.0, goal)]
+
+    def plan(self, start_rc, goal_rc):
+        """Shortest path from `start_rc` to `goal_rc`, reusing the search while the goal stays."""
+        start = self.index(*start_rc)
+        goal = self.index(*goal_rc)
+        self.expanded = 0
+        if start is None or goal is None or not self.free[start] or not self.free[goal]:
+            return None
+
+        if goal != self.goal:
+            self._reset(start, goal)
+        elif start != self.start:
+            self.km += self._h(self.start, start)
+            self.start = start
+        self._compute_shortest_path()
+        return self._extract_path()
+
+    def _compute_shortest_path(self) -> None:
+        g, rhs, free, heap = self._g, self._rhs, self.free, self.heap
+        start, goal, km = self.start, self.goal, self.km
+        expanded = 0
+        while heap:
+            k1, k2, u = heap[0]
+            g_start, rhs_start = g[start], rhs[start]
+            m = min(g_start, rhs_start)
+            if (k1, k2) >= (round(m + km, KEY_DIGITS), m) and rhs_start <= g_start:
+                break
+            heappop(heap)
+            g_u, rhs_u = g[u], rhs[u]
+            if g_u == rhs_u:
+                continue  # Stale entry, already consistent
+            m = min(g_u, rhs_u)
+            key = (round(m + self._h(start, u) + km, KEY_DIGITS), m)
+            if (k1, k2) < key:
+                heappush(heap, key + (u,))
+                continue
+            expanded += 1
+
+            if g_u > rhs_u:
+                g[u] = rhs_u
+                weight_u = self._weight[u]  # Every step from a neighbour into u
+                for offset, step in self.neighbours:
+                    s = u + offset
+                    if s != goal and free[s] and rhs_u + step * weight_u < rhs[s]:
+                        rhs[s] = rhs_u + step * weight_u
+                        if g[s] != rhs[s]:
+                            self._push(s)
+            else:
+                g[u] = np.inf
+                self._update_vertex(u)
+                for offset, _ in self.neighbours:
+                    self._update_vertex(u + offset)
+        self.expanded = expanded
+
+    def _extract_path(self):
+        """Walk from the start to the goal, always to the neighbour with the lowest cost-to-goal."""
+        g, free, weight, start = self._g, self.free, self._weight, self.start
+        if self._rhs[start] == np.inf:
+            return None
+        n = start
+        path = [self.cell(n)]
+        while n != self.goal:
+            best, best_cost = -1, np.inf
+            for offset, step in self.neighbours:
+                m = n + offset
+                if free[m] and step * weight[m] + g[m] < best_cost:
+                    best, best_cost = m, step * weight[m] + g[m]
+            if best < 0 or len(path) > len(free):
+                return None
+            n = best
+            path.append(self.cell(n))
+        return path
+
+
+class PathCorridor:
+    """
+    The cells swept by a path, for checking it against every new grid.
+
+    The dense path is kept in world coordinates, so it stays valid when the grid
+    window moves, and sampled once, at no more than `spacing` metres apart, along
+    every segment between consecutive points. first_blocked() then converts all
+    samples to cells and looks them up in one fancy-indexing operation.
+    """
+
+    def __init__(self, path_xy, spacing: float) -> None:
+        self.path_xy = np.asarray(path_xy, dtype=np.float64).reshape(-1, 2)
+        points = self.path_xy
+        segments = points[1:] - points[:-1]
+        counts = np.maximum(np.ceil(np.linalg.norm(segments, axis=1) / spacing), 1).astype(np.int64)
+        segment = np.repeat(np.arange(len(segments)), counts)
+        t = (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)) / np.repeat(counts, counts)
+
+        # Every sample belongs to the path point its segment starts at; the last
+        # point closes the final segment
+        self.samples = np.concatenate([points[segment] + t[:, np.newaxis] * segments[segment], points[-1:]])
+        self.sample_index = np.concatenate([segment, [len(points) - 1]])
+
+    def __len__(self) -> int:
+        return len(self.path_xy)
+
+    def nearest_sample(self, x: float, y: float) -> int:
+        """Index of the corridor sample closest to (x, y), i.e. how far along the path the robot is."""
+        return int(np.argmin(np.hypot(self.samples[:, 0] - x, self.samples[:, 1] - y)))
+
+    def first_blocked(self, grid: np.ndarray, min_x: float, min_y: float, resolution: float,
+                      from_sample: int = 0):
+        """
+        Index of the first path point, looking from sample `from_sample` on, whose
+        segment to the next point crosses an occupied cell of `grid`; None when the
+        corridor is clear. Parts of the path outside the grid cannot be checked and
+        count as clear.
+        """
+        samples = self.samples[from_sample:]
+        cols = np.floor((samples[:, 0] - min_x) / resolution).astype(np.int64)
+        rows = np.floor((samples[:, 1] - min_y) / resolution).astype(np.int64)
+        inside = (cols >= 0) & (rows >= 0) & (rows < grid.shape[0]) & (cols < grid.shape[1])
+        blocked = np.zeros(len(samples), dtype=bool)
+        blocked[inside] = grid[rows[inside], cols[inside]] == OCCUPIED
+        hits = np.flatnonzero(blocked)
+        if len(hits) == 0:
+            return None
+        return int(self.sample_index[from_sample + hits[0]])
+
+
+def _line_cells(start_rc, ends_rc):
+    """
+    The cells the straight lines from the centre of `start_rc` to the centres of
+    `ends_rc` pass through, as (N, K, 2) row/col cells: one point between each pair
+    of consecutive cell boundary crossings. Crossings that coincide (the line
+    passes exactly through a cell corner) fall back to the start cell.
+    """
+    start = np.asarray(start_rc, dtype=np.float64)
+    delta = np.asarray(ends_rc, dtype=np.float64).reshape(-1, 2) - start
+    span = np.abs(delta)
+
+    # Line parameters t in (0, 1) where the line crosses a row or column boundary
+    boundaries = np.arange(int(span.max(initial=0.0))) + 0.5
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = boundaries[np.newaxis, np.newaxis, :] / span[:, :, np.newaxis]
+    t = np.where(t < 1.0, t, 1.0).reshape(len(delta), -1)
+    t = np.sort(np.concatenate([np.zeros((len(delta), 1)), t, np.ones((len(delta), 1))], axis=1), axis=1)
+
+    lower, upper = t[:, :-1], t[:, 1:]
+    mid = np.where(upper > lower, (lower + upper) / 2.0, 0.0)
+    return np.floor(start + mid[..., np.newaxis] * delta[:, np.newaxis, :] + 0.5).astype(np.int64)
+
+
+def line_of_sight(grid: np.ndarray, start_rc, ends_rc) -> np.ndarray:
+    """
+    For every cell of `ends_rc`, whether the straight line between its centre and
+    the centre of `start_rc` crosses only FREE cells. The line is tested in every
+    cell it passes through - one point between each pair of consecutive cell
+    boundary crossings - for all end cells in one batch. Passing exactly through a
+    cell corner does not count as crossing the two diagonal cells, just as the
+    8-connected planner may step diagonally between them.
+    """
+    cells = _line_cells(start_rc, ends_rc)
+    return (grid[cells[..., 0], cells[..., 1]] == FREE).all(axis=1)
+
+
+def shorten_path(grid: np.ndarray, path_rc: list, max_waypoints: int = None,
+                 cell_cost: np.ndarray = None) -> list:
+    """
+    Any-angle shortening (string pulling) of a grid path: from each waypoint, jump
+    to the furthest later cell of the path that is still in line of sight, so the
+    straight segments between the returned waypoints only cross FREE cells and turn
+    only where an obstacle forces it.
+
+    With the `cell_cost` the path was planned with, a shortcut may also not cross a
+    cell costlier than the costliest cell of the part of the path it replaces: the
+    segments never get closer to obstacles than the planned path did, so the room
+    the clearance cost bought is kept.
+
+    With `max_waypoints`, the path is cut after that many waypoints; the caller
+    plans the rest from there.
+    """
+    if cell_cost is not None:
+        cells = np.asarray(path_rc, dtype=np.int64).reshape(-1, 2)
+        path_cost = cell_cost[cells[:, 0], cells[:, 1]]
+    waypoints = [path_rc[0]]
+    i = 0
+    while i < len(path_rc) - 1:
+        if max_waypoints is not None and len(waypoints) >= max_waypoints:
+            break
+        cells = _line_cells(path_rc[i], path_rc[i + 1:])
+        acceptable = (grid[cells[..., 0], cells[..., 1]] == FREE).all(axis=1)
+        if cell_cost is not None:
+            # Peak cost along each shortcut against the peak of the path cells it replaces
+            line_peak = cell_cost[cells[..., 0], cells[..., 1]].max(axis=1)
+            acceptable &= line_peak <= np.maximum.accumulate(path_cost[i:])[1:] + 1e-9
+        visible = np.flatnonzero(acceptable)
+        i += 1 + (int(visible[-1]) if len(visible) else 0)
+        waypoints.append(path_rc[i])
+    return waypoints
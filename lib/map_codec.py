@@ -0,0 +1,254 @@
+import json
+import struct
+import time
+import zlib
+import numpy as np
+
+# -----------------------------------------------------------------------------
+# Binary wire format for robot/tof_grid (grid and delta sections),
+# robot/tof_points (sensor sections) and the legacy robot/tof_map (both)
+# -----------------------------------------------------------------------------
+# Message = header + sections. Every section is prefixed with its type and byte
+# length, so decoders skip section types they do not know about.
+#
+#   header  : magic "TOFM", version u8, flags u8, section count u16,
+#             sequence number u32, timestamp f64
+#   section : type u8, length u32, payload
+#
+# Grid payloads hold the grid geometry followed by the zlib-compressed, bit-packed
+# cells (1 bit per cell, set = free). Delta payloads hold the same geometry, the
+# sequence number of the message they apply on top of and the zlib-compressed
+# indices and bit-packed new values of the cells that changed. Sensor payloads
+# hold the float32 valid/invalid point arrays of each sensor. Known payloads hold the
+# grid geometry followed by the zlib-compressed, bit-packed mask of cells the map
+# has observed (set = known), for subscribers that need to tell unknown from free.
+MAGIC = b"TOFM"
+MAP_CODEC_VERSION = 1
+
+SECTION_GRID = 1
+SECTION_GRID_DELTA = 2
+SECTION_SENSORS = 3
+SECTION_KNOWN = 4
+
+_HEADER = struct.Struct("<4sBBHId")
+_SECTION = struct.Struct("<BI")
+_GRID_GEOMETRY = struct.Struct("<HHdddB")  # height, width, resolution, min_x, min_y, frame
+_DELTA_INFO = struct.Struct("<II")         # base sequence number, changed cell count
+_SENSOR = struct.Struct("<BBHH")           # sensor index, i2c address, n_valid, n_invalid
+
+_FRAMES = ("robot", "world")
+
+
+def _pack_grid_geometry(grid: np.ndarray, grid_info: dict) -> bytes:
+    return _GRID_GEOMETRY.pack(grid.shape[0], grid.shape[1], grid_info["resolution"],
+                               grid_info["min_x"], grid_info["min_y"],
+                               _FRAMES.index(grid_info.get("frame", "robot")))
+
+
+def _unpack_grid_geometry(payload: bytes) -> dict:
+    h, w, resolution, min_x, min_y, frame = _GRID_GEOMETRY.unpack_from(payload)
+    return {
+        "height": h,
+        "width": w,
+        "resolution": resolution,
+        "min_x": min_x,
+        "max_x": min_x + w * resolution,
+        "min_y": min_y,
+        "max_y": min_y + h * resolution,
+        "frame": _FRAMES[frame],
+    }
+
+
+class MapEncoder:
+    """
+    Encodes occupancy grids and sensor point clouds into the binary map format.
+
+    Grids are sent as keyframes every `keyframe_interval` messages, or whenever the
+    geometry changes; in between, only the cells that changed since the previous
+    message are sent. A subscriber that misses a message resynchronises on the
+    next keyframe.
+    """
+
+    def __init__(self, keyframe_interval: int = 10, use_deltas: bool = True) -> None:
+        self.keyframe_interval = keyframe_interval
+        self.use_deltas = use_deltas
+        self.seq = 0
+        self._last_grid = None
+        self._last_geometry = None
+        self._last_grid_seq = 0
+        self._since_keyframe = 0
+
+    def force_keyframe(self) -> None:
+        self._last_grid = None
+
+    def encode(self, grid: np.ndarray = None, grid_info: dict = None,
+               sensors: list = None, timestamp: float = None, known: np.ndarray = None) -> bytes:
+        """
+        :param grid: (H, W) uint8 grid of FREE/OCCUPIED cells, or None
+        :param grid_info: dict with "resolution", "min_x", "min_y" and optionally "frame"
+        :param sensors: list of dicts with "sensor_index", "sensor_address" (int or hex
+                        string), "valid_points" and "invalid_points" (N, 3) arrays
+        :param known: (H, W) boolean mask of the grid cells that have been observed, or
+                      None; always sent whole, it compresses to little
+        """
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        sections = []
+        if grid is not None:
+            sections.append(self._encode_grid(grid, grid_info))
+        if known is not None:
+            known = np.asarray(known, dtype=bool)
+            sections.append((SECTION_KNOWN, _pack_grid_geometry(known, grid_info)
+                             + zlib.compress(np.packbits(known.ravel()).tobytes())))
+        if sensors is not None:
+            sections.append((SECTION_SENSORS, self._encode_sensors(sensors)))
+
+        header = _HEADER.pack(MAGIC, MAP_CODEC_VERSION, 0, len(sections), self.seq,
+                              time.time() if timestamp is None else timestamp)
+        parts = [header]
+        for section_type, payload in sections:
+            parts.append(_SECTION.pack(section_type, len(payload)))
+            parts.append(payload)
+        return b"".join(parts)
+
+    def _encode_grid(self, grid: np.ndarray, grid_info: dict):
+        grid = np.asarray(grid, dtype=np.uint8)
+        geometry = _pack_grid_geometry(grid, grid_info)
+
+        if (self.use_deltas and self._last_grid is not None
+                and geometry == self._last_geometry
+                and self._since_keyframe < self.keyframe_interval):
+            changed = np.flatnonzero(grid.ravel() != self._last_grid.ravel()).astype(np.uint32)
+            # Fall back to a keyframe when most of the grid changed
+            if len(changed) * 8 < grid.size:
+                values = np.packbits(grid.ravel()[changed] != 0)
+                payload = (geometry
+                           + _DELTA_INFO.pack(self._last_grid_seq, len(changed))
+                           + zlib.compress(changed.tobytes() + values.tobytes()))
+                self._last_grid = grid.copy()
+                self._last_grid_seq = self.seq
+                self._since_keyframe += 1
+                return SECTION_GRID_DELTA, payload
+
+        self._last_grid = grid.copy()
+        self._last_geometry = geometry
+        self._last_grid_seq = self.seq
+        self._since_keyframe = 0
+        return SECTION_GRID, geometry + zlib.compress(np.packbits(grid.ravel() != 0).tobytes())
+
+    @staticmethod
+    def _encode_sensors(sensors: list) -> bytes:
+        parts = [struct.pack("<B", len(sensors))]
+        for sensor in sensors:
+            address = sensor["sensor_address"]
+            if isinstance(address, str):
+                address = int(address, 16)
+            valid = np.ascontiguousarray(sensor["valid_points"], dtype=np.float32).reshape(-1, 3)
+            invalid = np.ascontiguousarray(sensor["invalid_points"], dtype=np.float32).reshape(-1, 3)
+            parts.append(_SENSOR.pack(sensor["sensor_index"], address, len(valid), len(invalid)))
+            parts.append(valid.tobytes())
+            parts.append(invalid.tobytes())
+        return b"".join(parts)
+
+
+class MapDecoder:
+    """
+    Decodes binary map messages back into the same structure the JSON payload used:
+    {"sensors": [...], "occupancy_grid": {"data": ..., "height": ..., ...}}, with numpy
+    arrays in place of nested lists. Keeps the last grid so delta messages can be
+    applied; "occupancy_grid" is left out until a keyframe has been received. A
+    known-cell mask sent along with the grid is added to it as "known".
+    Plain JSON payloads are still accepted.
+    """
+
+    def __init__(self) -> None:
+        self._grid = None
+        self._grid_info = None
+        self._seq = None
+
+    def decode(self, payload: bytes) -> dict:
+        payload = bytes(payload)
+        if payload[:1] == b"{":
+            return json.loads(payload)
+
+        magic, version, _flags, n_sections, seq, timestamp = _HEADER.unpack_from(payload)
+        if magic != MAGIC:
+            raise ValueError("Not a ToF map message")
+        if version != MAP_CODEC_VERSION:
+            raise ValueError(f"Unsupported map message version {version}")
+
+        result = {"seq": seq, "timestamp": timestamp}
+        known = None
+        offset = _HEADER.size
+        for _ in range(n_sections):
+            section_type, length = _SECTION.unpack_from(payload, offset)
+            offset += _SECTION.size
+            section = payload[offset:offset + length]
+            offset += length
+
+            if section_type == SECTION_GRID:
+                self._decode_grid(section, seq)
+            elif section_type == SECTION_GRID_DELTA:
+                self._decode_delta(section, seq)
+            elif section_type == SECTION_SENSORS:
+                result["sensors"] = self._decode_sensors(section)
+            elif section_type == SECTION_KNOWN:
+                known = self._decode_known(section)
+                continue
+            else:
+                continue
+
+            if section_type in (SECTION_GRID, SECTION_GRID_DELTA) and self._seq == seq:
+                result["occupancy_grid"] = {"data": self._grid.copy(), **self._grid_info}
+
+        if known is not None and "occupancy_grid" in result and known[0] == self._grid_info:
+            result["occupancy_grid"]["known"] = known[1]
+        return result
+
+    def _decode_grid(self, section: bytes, seq: int) -> None:
+        info = _unpack_grid_geometry(section)
+        h, w = info["height"], info["width"]
+        bits = np.frombuffer(zlib.decompress(section[_GRID_GEOMETRY.size:]), dtype=np.uint8)
+        self._grid = np.unpackbits(bits, count=h * w).reshape(h, w)
+        self._grid_info = info
+        self._seq = seq
+
+    @staticmethod
+    def _decode_known(section: bytes):
+        info = _unpack_grid_geometry(section)
+        bits = np.frombuffer(zlib.decompress(section[_GRID_GEOMETRY.size:]), dtype=np.uint8)
+        return info, np.unpackbits(bits, count=info["height"] * info["width"]).reshape(
+            info["height"], info["width"]).astype(bool)
+
+    def _decode_delta(self, section: bytes, seq: int) -> None:
+        info = _unpack_grid_geometry(section)
+        base_seq, count = _DELTA_INFO.unpack_from(section, _GRID_GEOMETRY.size)
+        if self._grid is None or base_seq != self._seq or info != self._grid_info:
+            # Missed a message: wait for the next keyframe
+            self._seq = None
+            return
+
+        body = zlib.decompress(section[_GRID_GEOMETRY.size + _DELTA_INFO.size:])
+        changed = np.frombuffer(body, dtype=np.uint32, count=count)
+        values = np.unpackbits(np.frombuffer(body, dtype=np.uint8, offset=count * 4), count=count)
+        self._grid.ravel()[changed] = values
+        self._seq = seq
+
+    @staticmethod
+    def _decode_sensors(section: bytes) -> list:
+        sensors = []
+        (count,) = struct.unpack_from("<B", section)
+        offset = 1
+        for _ in range(count):
+            index, address, n_valid, n_invalid = _SENSOR.unpack_from(section, offset)
+            offset += _SENSOR.size
+            valid = np.frombuffer(section, dtype=np.float32, count=n_valid * 3, offset=offset).reshape(-1, 3)
+            offset += valid.nbytes
+            invalid = np.frombuffer(section, dtype=np.float32, count=n_invalid * 3, offset=offset).reshape(-1, 3)
+            offset += invalid.nbytes
+            sensors.append({
+                "sensor_address": hex(address),
+                "sensor_index": index,
+                "valid_points": valid,
+                "invalid_points": invalid,
+            })
+        return sensors
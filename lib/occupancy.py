@@ -0,0 +1,267 @@
+import numpy as np
+
+try:
+    from scipy import ndimage
+except ImportError:  # scipy is optional, the numpy fallback gives the same field
+    ndimage = None
+
+# Grid cell values, shared by node_map and its subscribers
+FREE = 1
+OCCUPIED = 0
+
+INFLATION_BACKENDS = ("loop", "disk", "edt")
+
+
+def mark_obstacles(grid: np.ndarray, points: np.ndarray, min_x: float, min_y: float,
+                   resolution: float, height_threshold: float) -> np.ndarray:
+    """
+    Mark every point above `height_threshold` that falls inside the grid as occupied.
+    `points` is an (N, 3) array in the same frame as `min_x`/`min_y`. Modifies `grid`
+    in place and returns it.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    points = points[points[:, 2] > height_threshold]
+
+    grid_x = ((points[:, 0] - min_x) / resolution).astype(np.int64)
+    grid_y = ((points[:, 1] - min_y) / resolution).astype(np.int64)
+    inside = ((points[:, 0] >= min_x) & (points[:, 1] >= min_y)
+              & (grid_x < grid.shape[1]) & (grid_y < grid.shape[0]))
+
+    grid[grid_y[inside], grid_x[inside]] = OCCUPIED
+    return grid
+
+
+def disk_offsets(radius_m: float, resolution: float) -> np.ndarray:
+    """
+    Return the (dy, dx) cell offsets whose centre lies within `radius_m` of the
+    origin cell - the structuring element used to inflate obstacles.
+    """
+    radius_cells = int(radius_m / resolution)
+    span = np.arange(-radius_cells, radius_cells + 1)
+    dy, dx = np.meshgrid(span, span, indexing="ij")
+    inside = np.sqrt(dy**2 + dx**2) * resolution <= radius_m
+    return np.stack([dy[inside], dx[inside]], axis=1)
+
+
+def distance_field(obstacles: np.ndarray) -> np.ndarray:
+    """
+    Euclidean distance (in cells) from every cell to the nearest obstacle cell.
+    `obstacles` is a boolean mask; cells get `inf` when there are no obstacles at all.
+    """
+    obstacles = np.asarray(obstacles, dtype=bool)
+    if not obstacles.any():
+        return np.full(obstacles.shape, np.inf)
+    if ndimage is not None:
+        return ndimage.distance_transform_edt(~obstacles)
+    return _distance_field_numpy(obstacles)
+
+
+def clearance_cost(grid: np.ndarray, resolution: float, clearance_m: float,
+                   weight: float) -> np.ndarray:
+    """
+    Soft per-cell planning cost from the distance to the nearest occupied cell of
+    `grid` (usually already inflated): `weight` right next to it, falling linearly
+    to 0 at `clearance_m` and beyond. Occupied cells themselves get `weight`.
+    """
+    dist = distance_field(grid == OCCUPIED) * resolution
+    return weight * np.clip(1.0 - dist / clearance_m, 0.0, 1.0)
+
+
+def _distance_field_numpy(obstacles: np.ndarray) -> np.ndarray:
+    """Separable exact EDT: column scans followed by a broadcast row minimisation."""
+    h, w = obstacles.shape
+
+    # Vertical distance to the nearest obstacle in the same column
+    vertical = np.empty((h, w))
+    run = np.full(w, np.inf)
+    for r in range(h):
+        run = np.where(obstacles[r], 0.0, run + 1.0)
+        vertical[r] = run
+    run = np.full(w, np.inf)
+    for r in range(h - 1, -1, -1):
+        run = np.where(obstacles[r], 0.0, run + 1.0)
+        vertical[r] = np.minimum(vertical[r], run)
+
+    # Combine with the horizontal offset to every column of the same row
+    cols = np.arange(w)
+    dx2 = (cols[:, np.newaxis] - cols[np.newaxis, :]) ** 2
+    d2 = (vertical[:, np.newaxis, :] ** 2 + dx2[np.newaxis, :, :]).min(axis=2)
+    return np.sqrt(d2)
+
+
+def inflate_obstacles(grid: np.ndarray, radius_m: float, resolution: float,
+                      backend: str = "disk") -> np.ndarray:
+    """
+    Return a copy of `grid` with every occupied cell dilated by `radius_m`.
+
+    Backends (all produce the same grid cell for cell):
+      "loop" - the original per-obstacle Python loop, kept as the reference
+      "disk" - OR of the obstacle mask shifted by each disk offset
+      "edt"  - Euclidean distance transform thresholded at `radius_m`
+    """
+    if backend == "loop":
+        return _inflate_loop(grid, radius_m, resolution)
+
+    obstacles = grid == OCCUPIED
+    if backend == "disk":
+        h, w = grid.shape
+        inflated = np.zeros_like(obstacles)
+        for dy, dx in disk_offsets(radius_m, resolution):
+            inflated[max(0, dy):h + min(0, dy), max(0, dx):w + min(0, dx)] |= \
+                obstacles[max(0, -dy):h - max(0, dy), max(0, -dx):w - max(0, dx)]
+    elif backend == "edt":
+        radius_cells = int(radius_m / resolution)
+        dist = distance_field(obstacles)
+        inflated = (dist * resolution <= radius_m) & (dist < radius_cells + 1)
+    else:
+        raise ValueError(f"Unknown inflation backend '{backend}', expected one of {INFLATION_BACKENDS}")
+
+    dilated_grid = grid.copy()
+    dilated_grid[inflated] = OCCUPIED
+    return dilated_grid
+
+
+def _inflate_loop(grid: np.ndarray, radius_m: float, resolution: float) -> np.ndarray:
+    dilated_grid = grid.copy()
+    robot_cells = int(radius_m / resolution)  # Number of cells for robot radius
+
+    # Find all obstacle cells
+    obstacle_ys, obstacle_xs = np.where(grid == OCCUPIED)
+
+    # For each obstacle cell, mark surrounding cells within robot radius as occupied
+    for obs_y, obs_x in zip(obstacle_ys, obstacle_xs):
+        # Calculate bounds for the square region to check
+        y_min = max(0, obs_y - robot_cells)
+        y_max = min(grid.shape[0], obs_y + robot_cells + 1)
+        x_min = max(0, obs_x - robot_cells)
+        x_max = min(grid.shape[1], obs_x + robot_cells + 1)
+
+        # Check each cell in the square region
+        for y in range(y_min, y_max):
+            for x in range(x_min, x_max):
+                # Calculate distance to obstacle cell
+                dist = np.sqrt((y - obs_y)**2 + (x - obs_x)**2) * resolution
+                # If within robot radius, mark as occupied
+                if dist <= radius_m:
+                    dilated_grid[y, x] = OCCUPIED
+
+    return dilated_grid
+
+
+def shift_grid(array: np.ndarray, dr: int, dc: int, fill) -> np.ndarray:
+    """
+    Copy of a grid-aligned array for a window moved by (dr, dc) cells: cell (r, c)
+    of the result is `array[r + dr, c + dc]`, and `fill` where that is outside.
+    """
+    h, w = array.shape
+    shifted = np.full_like(array, fill)
+    shifted[max(0, -dr):h - max(0, dr), max(0, -dc):w - max(0, dc)] = \
+        array[max(0, dr):h + min(0, dr), max(0, dc):w + min(0, dc)]
+    return shifted
+
+
+def transform_points(points: np.ndarray, x: float, y: float, theta: float) -> np.ndarray:
+    """
+    Apply the 2D pose (x, y, theta) to an (N, 2) or (N, 3) array of points.
+    Only the x/y columns are rotated and translated; z is left untouched.
+    """
+    points = np.array(points, dtype=np.float64, copy=True)
+    cos_t, sin_t = np.cos(theta), np.sin(theta)
+    px, py = points[:, 0].copy(), points[:, 1].copy()
+    points[:, 0] = cos_t * px - sin_t * py + x
+    points[:, 1] = sin_t * px + cos_t * py + y
+    return points
+
+
+def beam_cells(start: np.ndarray, end: np.ndarray, hits: np.ndarray):
+    """
+    Cells crossed by a batch of beams, in fractional (col, row) cell coordinates.
+
+    Every beam is sampled at half-cell steps, stopping short of its endpoint. Returns
+    the integer (col, row) cells the beams pass through plus the endpoints of beams
+    that ended on free space, and the endpoint cells of the beams that hit something.
+    """
+    delta = end - start
+    length = np.linalg.norm(delta, axis=1)
+
+    steps = np.arange(int(np.ceil(length.max() * 2.0)) + 1) * 0.5
+    frac = steps[np.newaxis, :] / np.maximum(length[:, np.newaxis], 1e-9)
+    along = frac < 1.0
+    samples = start[:, np.newaxis, :] + frac[..., np.newaxis] * delta[:, np.newaxis, :]
+
+    end_cells = np.floor(end).astype(np.int64)
+    free_cells = np.concatenate([np.floor(samples[along]).astype(np.int64), end_cells[~hits]])
+    return free_cells, end_cells[hits]
+
+
+class LogOddsGrid:
+    """
+    Persistent log-odds occupancy grid in the world frame.
+
+    Each beam lowers the log-odds of the cells it passes through and raises the
+    log-odds of the cell it ends in when that endpoint is an obstacle. Only the
+    cells touched by the beams of a frame are updated.
+    """
+
+    def __init__(self, shape, min_x: float, min_y: float, resolution: float,
+                 hit: float = 0.85, miss: float = -0.4,
+                 clamp_min: float = -2.0, clamp_max: float = 3.5,
+                 occupied_threshold: float = 0.5) -> None:
+        self.min_x = min_x
+        self.min_y = min_y
+        self.resolution = resolution
+        self.hit = hit
+        self.miss = miss
+        self.clamp_min = clamp_min
+        self.clamp_max = clamp_max
+        self.occupied_threshold = occupied_threshold
+        self.log_odds = np.zeros(shape, dtype=np.float32)
+
+    def clear(self) -> None:
+        self.log_odds[:] = 0.0
+
+    def _to_cells(self, xy: np.ndarray) -> np.ndarray:
+        """World x/y → fractional (col, row) cell coordinates."""
+        return (xy - (self.min_x, self.min_y)) / self.resolution
+
+    def _flat_in_bounds(self, cells: np.ndarray) -> np.ndarray:
+        """Integer (col, row) cells → flat indices, dropping cells outside the grid."""
+        h, w = self.log_odds.shape
+        cols, rows = cells[..., 0], cells[..., 1]
+        inside = (cols >= 0) & (cols < w) & (rows >= 0) & (rows < h)
+        return rows[inside] * w + cols[inside]
+
+    def _update(self, flat_idx: np.ndarray, delta: float) -> None:
+        values = self.log_odds.flat[flat_idx] + delta
+        self.log_odds.flat[flat_idx] = np.clip(values, self.clamp_min, self.clamp_max)
+
+    def integrate(self, origins: np.ndarray, endpoints: np.ndarray, hits: np.ndarray) -> np.ndarray:
+        """
+        Ray-cast a batch of beams into the grid.
+
+        :param origins: (N, 2) world x/y of each beam's start (the sensor)
+        :param endpoints: (N, 2) world x/y of each beam's return
+        :param hits: (N,) True where the endpoint is an obstacle, False where the
+                     beam ended on free space (e.g. the floor)
+        :return: flat indices of every cell that was updated
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 2)
+        endpoints = np.asarray(endpoints, dtype=np.float64).reshape(-1, 2)
+        hits = np.asarray(hits, dtype=bool).reshape(-1)
+        if len(endpoints) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        free_cells, hit_cells = beam_cells(self._to_cells(origins), self._to_cells(endpoints), hits)
+        free_idx = self._flat_in_bounds(free_cells)
+        hit_idx = np.unique(self._flat_in_bounds(hit_cells))
+        free_idx = np.setdiff1d(free_idx, hit_idx)
+
+        self._update(free_idx, self.miss)
+        self._update(hit_idx, self.hit)
+        return np.concatenate([free_idx, hit_idx])
+
+    def occupancy(self) -> np.ndarray:
+        """Threshold the log-odds into a FREE/OCCUPIED grid (unknown cells are free)."""
+        grid = np.full(self.log_odds.shape, FREE, dtype=np.uint8)
+        grid[self.log_odds > self.occupied_threshold] = OCCUPIED
+        return grid
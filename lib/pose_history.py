@@ -0,0 +1,88 @@
+import bisect
+import math
+import threading
+from collections import deque
+
+
+def wrap_angle(angle: float) -> float:
+    return (angle + math.pi) % (2.0 * math.pi) - math.pi
+
+
+def relative_pose(from_pose: dict, to_pose: dict) -> tuple:
+    """
+    Return the (x, y, theta) transform that maps points expressed in the robot frame
+    at `from_pose` into the robot frame at `to_pose`. Poses are dicts with 'x', 'y'
+    and 'theta' in the world frame.
+    """
+    dx = from_pose['x'] - to_pose['x']
+    dy = from_pose['y'] - to_pose['y']
+    cos_t, sin_t = math.cos(-to_pose['theta']), math.sin(-to_pose['theta'])
+    return (cos_t * dx - sin_t * dy,
+            sin_t * dx + cos_t * dy,
+            wrap_angle(from_pose['theta'] - to_pose['theta']))
+
+
+class PoseHistory:
+    """
+    Short, thread-safe history of robot/odometry poses stamped with time.monotonic()
+    on arrival, so frames can be placed at the pose the robot had when they were read.
+    """
+
+    def __init__(self, max_age: float = 5.0) -> None:
+        self.max_age = max_age
+        self._times = deque()
+        self._poses = deque()
+        self._lock = threading.Lock()
+
+    def add(self, timestamp: float, x: float, y: float, theta: float) -> None:
+        with self._lock:
+            self._times.append(timestamp)
+            self._poses.append({'x': x, 'y': y, 'theta': theta})
+            while self._times and timestamp - self._times[0] > self.max_age:
+                self._times.popleft()
+                self._poses.popleft()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._times.clear()
+            self._poses.clear()
+
+    def latest(self) -> dict:
+        with self._lock:
+            return dict(self._poses[-1]) if self._poses else {'x': 0.0, 'y': 0.0, 'theta': 0.0}
+
+    def pose_at(self, timestamp: float) -> dict:
+        """Pose linearly interpolated at `timestamp`, clamped to the oldest/newest pose."""
+        with self._lock:
+            if not self._poses:
+                return {'x': 0.0, 'y': 0.0, 'theta': 0.0}
+            i = bisect.bisect_left(self._times, timestamp)
+            if i == 0:
+                return dict(self._poses[0])
+            if i == len(self._times):
+                return dict(self._poses[-1])
+
+            t0, t1 = self._times[i - 1], self._times[i]
+            p0, p1 = self._poses[i - 1], self._poses[i]
+            a = (timestamp - t0) / (t1 - t0) if t1 > t0 else 1.0
+            return {
+                'x': p0['x'] + a * (p1['x'] - p0['x']),
+                'y': p0['y'] + a * (p1['y'] - p0['y']),
+                'theta': wrap_angle(p0['theta'] + a * wrap_angle(p1['theta'] - p0['theta'])),
+            }
+
+    def velocity(self, window: float = 0.5) -> tuple:
+        """
+        (speed m/s, turn rate rad/s) over the last `window` seconds of poses;
+        (0.0, 0.0) until there are two poses.
+        """
+        with self._lock:
+            if len(self._times) < 2:
+                return 0.0, 0.0
+            t0, t1 = max(self._times[-1] - window, self._times[0]), self._times[-1]
+        if t1 <= t0:
+            return 0.0, 0.0
+        p0, p1 = self.pose_at(t0), self.pose_at(t1)
+        dt = t1 - t0
+        return (math.hypot(p1['x'] - p0['x'], p1['y'] - p0['y']) / dt,
+                abs(wrap_angle(p1['theta'] - p0['theta'])) / dt)
@@ -0,0 +1,223 @@
+import json
+import math
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+import numpy as np
+
+from lib.occupancy import FREE, OCCUPIED, beam_cells
+
+TILE_FILE = "tile_{}_{}.npy"
+META_FILE = "map.json"
+
+
+def _cell_keys(cells: np.ndarray) -> np.ndarray:
+    return (cells[:, 0] << 32) + cells[:, 1]
+
+
+def _keys_to_cells(keys: np.ndarray) -> np.ndarray:
+    rows = ((keys + (1 << 31)) & 0xFFFFFFFF) - (1 << 31)
+    return np.stack([(keys - rows) >> 32, rows], axis=1)
+
+
+class TiledLogOddsMap:
+    """
+    Sparse log-odds occupancy map in the world frame, made of square tiles of
+    `tile_size` x `tile_size` cells that are allocated the first time a beam
+    touches them.
+
+    Cells are addressed globally: cell (col, row) covers world x in
+    [col * resolution, (col + 1) * resolution), likewise for y and rows. Tile
+    (tx, ty) holds cols tx * tile_size ... and rows ty * tile_size ...
+
+    With `directory` set, every tile is a memory-mapped .npy file in that
+    directory, so the map survives restarts: tiles are only paged in when they are
+    read or updated, and opening a large map costs nothing up front. Without it
+    the tiles are plain in-memory arrays.
+
+    At most `max_tiles` tiles are kept open; the least recently used one beyond
+    that is flushed and closed. Without a `directory`, evicted tiles are saved to
+    a temporary spill directory and loaded back when they are touched again.
+
+    Memory and per-frame work scale with the area around the robot, not with the
+    area explored: a frame only touches the few tiles its beams cross, and
+    occupancy() assembles just the local window handed to the planner.
+    """
+
+    def __init__(self, resolution: float, tile_size: int = 64, directory: str = None,
+                 max_tiles: int = 64, hit: float = 0.85, miss: float = -0.4,
+                 clamp_min: float = -2.0, clamp_max: float = 3.5,
+                 occupied_threshold: float = 0.5) -> None:
+        self.resolution = resolution
+        self.tile_size = tile_size
+        self.directory = directory
+        self.hit = hit
+        self.miss = miss
+        self.clamp_min = clamp_min
+        self.clamp_max = clamp_max
+        self.occupied_threshold = occupied_threshold
+        self.max_tiles = max_tiles
+        # (tx, ty) -> (tile_size, tile_size) float32 log-odds, [row, col]; least recently used first
+        self.tiles = OrderedDict()
+        self._on_disk = set()
+        self._spill_dir = None  # Evicted in-memory tiles, only without `directory`
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._check_meta()
+            # Existing tiles are opened lazily, just remember which ones there are
+            for name in os.listdir(directory):
+                if name.startswith("tile_") and name.endswith(".npy"):
+                    tx, ty = name[len("tile_"):-len(".npy")].split("_")
+                    self._on_disk.add((int(tx), int(ty)))
+
+    def _check_meta(self) -> None:
+        meta = {"resolution": self.resolution, "tile_size": self.tile_size}
+        path = os.path.join(self.directory, META_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                stored = json.load(f)
+            if stored != meta:
+                raise ValueError(f"Map in '{self.directory}' was saved with {stored}, not {meta}")
+        else:
+            with open(path, "w") as f:
+                json.dump(meta, f)
+
+    def _tile(self, key, create: bool):
+        """Return the tile `key`, opening or allocating it; None if absent and not `create`."""
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.tiles.move_to_end(key)
+            return tile
+
+        shape = (self.tile_size, self.tile_size)
+        if self.directory is None:
+            if key in self._on_disk:
+                tile = np.load(os.path.join(self._spill_dir, TILE_FILE.format(*key)))
+            elif create:
+                tile = np.zeros(shape, dtype=np.float32)
+            else:
+                return None
+        else:
+            path = os.path.join(self.directory, TILE_FILE.format(*key))
+            if key in self._on_disk:
+                tile = np.load(path, mmap_mode="r+")
+            elif create:
+                tile = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=shape)
+                self._on_disk.add(key)
+            else:
+                return None
+        self.tiles[key] = tile
+        while len(self.tiles) > self.max_tiles:
+            self._evict()
+        return tile
+
+    def _evict(self) -> None:
+        """Write the least recently used tile to disk and close it."""
+        key, tile = self.tiles.popitem(last=False)
+        if isinstance(tile, np.memmap):
+            tile.flush()
+            return
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="tiled_map_")
+        np.save(os.path.join(self._spill_dir, TILE_FILE.format(*key)), tile)
+        self._on_disk.add(key)
+
+    def world_to_cell(self, x: float, y: float):
+        return math.floor(x / self.resolution), math.floor(y / self.resolution)
+
+    def cell_to_world(self, col: int, row: int):
+        """World x/y of the lower corner of cell (col, row)."""
+        return col * self.resolution, row * self.resolution
+
+    def _update(self, cells: np.ndarray, delta: float) -> None:
+        """Add `delta` to each (col, row) cell once, allocating tiles as needed."""
+        if len(cells) == 0:
+            return
+        tile_cells = np.floor_divide(cells, self.tile_size)
+        local = cells - tile_cells * self.tile_size
+        tile_keys = _cell_keys(tile_cells)
+        order = np.argsort(tile_keys, kind="stable")
+        unique_keys, starts = np.unique(tile_keys[order], return_index=True)
+        for key, group in zip(_keys_to_cells(unique_keys), np.split(order, starts[1:])):
+            tile = self._tile((int(key[0]), int(key[1])), create=True)
+            cols, rows = local[group, 0], local[group, 1]
+            tile[rows, cols] = np.clip(tile[rows, cols] + delta, self.clamp_min, self.clamp_max)
+
+    def integrate(self, origins: np.ndarray, endpoints: np.ndarray, hits: np.ndarray) -> np.ndarray:
+        """
+        Ray-cast a batch of beams into the map (see LogOddsGrid.integrate).
+
+        :return: (N, 2) global (col, row) cells that were updated
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 2)
+        endpoints = np.asarray(endpoints, dtype=np.float64).reshape(-1, 2)
+        hits = np.asarray(hits, dtype=bool).reshape(-1)
+        if len(endpoints) == 0:
+            return np.empty((0, 2), dtype=np.int64)
+
+        free_cells, hit_cells = beam_cells(origins / self.resolution, endpoints / self.resolution, hits)
+        # Deduplicate on one int64 key per cell; a cell hit by one beam is not carved
+        # free by another beam of the same batch
+        hit_keys = np.unique(_cell_keys(hit_cells))
+        free_keys = np.setdiff1d(_cell_keys(free_cells), hit_keys)
+        free_cells, hit_cells = _keys_to_cells(free_keys), _keys_to_cells(hit_keys)
+
+        self._update(free_cells, self.miss)
+        self._update(hit_cells, self.hit)
+        return np.concatenate([free_cells, hit_cells])
+
+    def log_odds_window(self, col0: int, row0: int, height: int, width: int) -> np.ndarray:
+        """Copy of the (height, width) block of log-odds starting at cell (col0, row0); unknown cells are 0."""
+        window = np.zeros((height, width), dtype=np.float32)
+        ts = self.tile_size
+        for ty in range(row0 // ts, (row0 + height - 1) // ts + 1):
+            for tx in range(col0 // ts, (col0 + width - 1) // ts + 1):
+                tile = self._tile((tx, ty), create=False)
+                if tile is None:
+                    continue
+                # Overlap of this tile with the window, in global cells
+                r_lo, r_hi = max(row0, ty * ts), min(row0 + height, (ty + 1) * ts)
+                c_lo, c_hi = max(col0, tx * ts), min(col0 + width, (tx + 1) * ts)
+                window[r_lo - row0:r_hi - row0, c_lo - col0:c_hi - col0] = \
+                    tile[r_lo - ty * ts:r_hi - ty * ts, c_lo - tx * ts:c_hi - tx * ts]
+        return window
+
+    def occupancy(self, col0: int, row0: int, height: int, width: int) -> np.ndarray:
+        """FREE/OCCUPIED grid of the window starting at cell (col0, row0) (unknown cells are free)."""
+        grid = np.full((height, width), FREE, dtype=np.uint8)
+        grid[self.log_odds_window(col0, row0, height, width) > self.occupied_threshold] = OCCUPIED
+        return grid
+
+    def known(self, col0: int, row0: int, height: int, width: int) -> np.ndarray:
+        """Boolean mask of the cells of the window that any beam has updated."""
+        return self.log_odds_window(col0, row0, height, width) != 0.0
+
+    def window_origin(self, x: float, y: float, height: int, width: int, step: int = 16):
+        """
+        Lower-left cell of a (height, width) window centred near world (x, y). The
+        origin moves in steps of `step` cells so the published grid geometry only
+        changes once the robot has moved that far.
+        """
+        col, row = self.world_to_cell(x, y)
+        col0 = round((col - width / 2) / step) * step
+        row0 = round((row - height / 2) / step) * step
+        return col0, row0
+
+    def flush(self) -> None:
+        """Write dirty memory-mapped tiles back to disk."""
+        for tile in self.tiles.values():
+            if isinstance(tile, np.memmap):
+                tile.flush()
+
+    def clear(self) -> None:
+        """Forget the whole map, including the tiles on disk."""
+        self.tiles = OrderedDict()
+        if self.directory is not None:
+            for key in self._on_disk:
+                os.remove(os.path.join(self.directory, TILE_FILE.format(*key)))
+        elif self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+        self._on_disk = set()
@@ -0,0 +1,220 @@
+import contextlib
+import queue
+import threading
+import time
+
+from lib.vl53l5cx_lib.batch import VL53L5CXBatch
+
+
+class ToFFrame:
+    """
+    One ranging result, stamped (time.monotonic()) right after it was read, with
+    the zone count (16 or 64) the sensor was ranging at.
+    """
+
+    __slots__ = ("sensor_index", "data", "timestamp", "num_zones")
+
+    def __init__(self, sensor_index: int, data, timestamp: float, num_zones: int = 64) -> None:
+        self.sensor_index = sensor_index
+        self.data = data
+        self.timestamp = timestamp
+        self.num_zones = num_zones
+
+
+class ToFReader(threading.Thread):
+    """
+    Reads frames from a group of VL53L5CX sensors (one sensor, or all the sensors
+    on one I2C bus) and hands them to the mapping stage through a bounded queue.
+
+    Without INT pins the reader polls check_data_ready() every `poll_interval`
+    seconds. With INT pins it sleeps until a sensor pulls its INT line low and only
+    reads that sensor; `poll_interval` is then only a fallback for missed edges.
+    When the queue is full the oldest frame is dropped, so the mapping stage always
+    sees the freshest data.
+
+    With `batch_reads` a polling reader of several sensors checks them all in one
+    combined I2C transaction and reads the ready frames in a second one
+    (VL53L5CXBatch) instead of two transactions per sensor.
+    """
+
+    def __init__(self, sensors: dict, frame_queue: queue.Queue, int_pins: dict = None,
+                 poll_interval: float = 0.005, name: str = None, batch_reads: bool = False) -> None:
+        super().__init__(name=name, daemon=True)
+        self.sensors = sensors              # sensor index -> VL53L5CX
+        self.frame_queue = frame_queue
+        self.int_pins = int_pins or {}      # sensor index -> BCM pin of its INT line
+        self.poll_interval = poll_interval
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self._stop_event = threading.Event()
+        self._wake = threading.Event()
+        self.lock = threading.Lock()  # Held while reading; see ToFAcquisition.paused()
+        self._pending = set(sensors)
+        self._pending_lock = threading.Lock()  # _pending is also updated from the GPIO callback thread
+        self.batch = None
+        if batch_reads and len(sensors) > 1 and not int_pins:
+            self._batch_indices = list(sensors)
+            self.batch = VL53L5CXBatch([sensors[s_idx] for s_idx in self._batch_indices])
+
+        if self.int_pins:
+            from RPi import GPIO
+            for s_idx, pin in self.int_pins.items():
+                GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+                # INT is active low: it is pulled down when a new frame is ready
+                GPIO.add_event_detect(pin, GPIO.FALLING,
+                                      callback=lambda _pin, s_idx=s_idx: self._on_interrupt(s_idx))
+
+    def _on_interrupt(self, s_idx: int) -> None:
+        with self._pending_lock:
+            self._pending.add(s_idx)
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._wake.set()
+
+    def _put(self, frame: ToFFrame) -> None:
+        while True:
+            try:
+                self.frame_queue.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    self.frame_queue.get_nowait()
+                    self.frames_dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _read(self, s_idx: int) -> bool:
+        sensor = self.sensors[s_idx]
+        try:
+            if not sensor.check_data_ready():
+                return False
+            data = sensor.get_ranging_data()
+            timestamp = time.monotonic()
+        except Exception as e:
+            print(f"Error reading sensor {s_idx}: {e}")
+            return False
+
+        self._put(ToFFrame(s_idx, data, timestamp, sensor.resolution))
+        self.frames_read += 1
+        return True
+
+    def _read_batch(self) -> bool:
+        ready = self.batch.check_data_ready()
+        frames = self.batch.read_frames(ready)
+        timestamp = time.monotonic()
+        for position, e in self.batch.errors.items():
+            print(f"Error reading sensor {self._batch_indices[position]}: {e}")
+
+        for position, data in frames.items():
+            s_idx = self._batch_indices[position]
+            self._put(ToFFrame(s_idx, data, timestamp, self.sensors[s_idx].resolution))
+            self.frames_read += 1
+        return bool(frames)
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            if self.int_pins:
+                # Sleep until an INT edge; on timeout poll everything in case one was missed
+                timed_out = not self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                with self._pending_lock:
+                    if timed_out:
+                        self._pending.update(self.sensors)
+                    to_read, self._pending = self._pending, set()
+                with self.lock:
+                    for s_idx in to_read:
+                        if s_idx in self.sensors:
+                            self._read(s_idx)
+            elif self.batch is not None:
+                with self.lock:
+                    got_frame = self._read_batch()
+                if not got_frame:
+                    self._stop_event.wait(self.poll_interval)
+            else:
+                got_frame = False
+                with self.lock:
+                    for s_idx in self.sensors:
+                        got_frame |= self._read(s_idx)
+                if not got_frame:
+                    self._stop_event.wait(self.poll_interval)
+
+
+class ToFAcquisition:
+    """
+    Runs one ToFReader per I2C bus (sensors on one bus are read by the same thread),
+    or one per sensor with `reader_per_sensor=True`, all feeding one bounded queue.
+    """
+
+    def __init__(self, sensors: list, bus_ids: list = None, int_pins: list = None,
+                 reader_per_sensor: bool = False, queue_size: int = 12,
+                 poll_interval: float = 0.005, batch_reads: bool = True) -> None:
+        self.frame_queue = queue.Queue(maxsize=queue_size)
+        bus_ids = bus_ids or [1] * len(sensors)
+
+        groups = {}
+        for s_idx, sensor in enumerate(sensors):
+            key = s_idx if reader_per_sensor else bus_ids[s_idx]
+            groups.setdefault(key, {})[s_idx] = sensor
+
+        if int_pins:
+            # INT edges wake the readers; polling is only a fallback for missed edges
+            poll_interval = max(poll_interval, 0.1)
+        int_pins = int_pins or []
+
+        self.readers = []
+        for key, group in groups.items():
+            pins = {s_idx: int_pins[s_idx] for s_idx in group if s_idx < len(int_pins)}
+            name = f"tof-sensor-{key}" if reader_per_sensor else f"tof-bus-{key}"
+            self.readers.append(ToFReader(group, self.frame_queue, pins, poll_interval, name=name,
+                                          batch_reads=batch_reads))
+
+    def start(self) -> None:
+        for reader in self.readers:
+            reader.start()
+
+    def stop(self) -> None:
+        for reader in self.readers:
+            reader.stop()
+        for reader in self.readers:
+            reader.join(timeout=1.0)
+
+    @contextlib.contextmanager
+    def paused(self):
+        """Hold every reader between reads, e.g. while the sensors are reconfigured."""
+        with contextlib.ExitStack() as stack:
+            for reader in self.readers:
+                stack.enter_context(reader.lock)
+            yield
+
+    def get_frames(self, timeout: float = None) -> list:
+        """Block until at least one frame is available (or timeout), then drain the queue."""
+        frames = []
+        try:
+            frames.append(self.frame_queue.get(timeout=timeout))
+        except queue.Empty:
+            return frames
+        while True:
+            try:
+                frames.append(self.frame_queue.get_nowait())
+            except queue.Empty:
+                return frames
+
+    @property
+    def frames_dropped(self) -> int:
+        return sum(reader.frames_dropped for reader in self.readers)
+
+    @property
+    def batch_timing(self) -> dict:
+        """Last combined transaction times of every batching reader, by reader name."""
+        return {
+            reader.name: {
+                "check_ms": reader.batch.last_check_time * 1000.0,
+                "read_ms": reader.batch.last_read_time * 1000.0,
+                "read_bytes": reader.batch.last_read_bytes,
+                "fallbacks": reader.batch.fallbacks,
+                "combined": reader.batch.combined,
+            }
+            for reader in self.readers if reader.batch is not None
+        }
@@ -0,0 +1,107 @@
+import numpy as np
+
+# Target status codes the VL53L5CX reports for a valid range
+VALID_TARGET_STATUS = (5, 9)
+
+
+class ToFZoneFilter:
+    """
+    Per-zone temporal filter for VL53L5CX ranges.
+
+    Keeps a ring buffer of the last `history` frames of every sensor and turns it
+    into one stabilised range per zone:
+
+      - each sample is weighted by signal_per_spad / range_sigma_mm^2, so weak,
+        noisy returns count less than strong, tight ones
+      - a sample is confirmed when at least `min_valid` buffered samples lie within
+        `gate_mm` (or 3 sigma, whichever is larger) of it; the zone reports the
+        weighted mean of the samples around its newest confirmed sample, or is
+        invalid when there is none
+      - so a single-frame ghost or dropout does not flip grid cells, while a real
+        step - an object moving in front of the robot - is followed as soon as
+        `min_valid` frames agree on it instead of being averaged away
+
+    Frames with range_sigma_mm / signal_per_spad disabled in the driver (all zeros)
+    fall back to equal weights.
+    """
+
+    def __init__(self, num_sensors: int, num_zones: int, history: int = 4,
+                 min_valid: int = 2, gate_mm: float = 100.0,
+                 max_sigma_mm: float = 60.0, min_signal_per_spad: float = 0.0) -> None:
+        self.num_sensors = num_sensors
+        self.history = history
+        self.min_valid = min_valid
+        self.gate_mm = gate_mm
+        self.max_sigma_mm = max_sigma_mm
+        self.min_signal_per_spad = min_signal_per_spad
+        self.resize(num_zones)
+
+    def resize(self, num_zones: int) -> None:
+        """Reallocate the buffers for a new zone count (4x4 <-> 8x8) and forget all history."""
+        self.num_zones = num_zones
+        shape = (self.num_sensors, self.history, num_zones)
+        self._ranges = np.zeros(shape)
+        self._sigmas = np.zeros(shape)
+        self._weights = np.zeros(shape)  # 0 where the sample was invalid
+        self._head = np.zeros(self.num_sensors, dtype=np.int64)
+        self._frames = np.zeros(self.num_sensors, dtype=np.int64)
+
+    def reset(self, sensor_index: int = None) -> None:
+        """Forget the history of one sensor, or of every sensor."""
+        sensors = slice(None) if sensor_index is None else sensor_index
+        self._weights[sensors] = 0.0
+        self._frames[sensors] = 0
+
+    def update(self, sensor_index: int, distance_mm, target_status,
+               range_sigma_mm=None, signal_per_spad=None):
+        """
+        Push one frame of `sensor_index` and return its filtered zones.
+
+        :return: (ranges_mm, valid) arrays of length num_zones; ranges of invalid
+                 zones are the raw distances
+        """
+        z = self.num_zones
+        distance_mm = np.asarray(distance_mm[:z], dtype=np.float64)
+        target_status = np.asarray(target_status[:z])
+        sigma = np.zeros(z) if range_sigma_mm is None else np.asarray(range_sigma_mm[:z], dtype=np.float64)
+        signal = np.zeros(z) if signal_per_spad is None else np.asarray(signal_per_spad[:z], dtype=np.float64)
+
+        valid = np.isin(target_status, VALID_TARGET_STATUS) & (distance_mm != 0)
+        if sigma.any():
+            valid &= sigma <= self.max_sigma_mm
+        if signal.any():
+            valid &= signal >= self.min_signal_per_spad
+            weight = signal / np.maximum(sigma, 1.0) ** 2
+        else:
+            weight = np.ones(z)
+
+        s = sensor_index
+        head = self._head[s]
+        self._ranges[s, head] = distance_mm
+        self._sigmas[s, head] = sigma
+        self._weights[s, head] = np.where(valid, weight, 0.0)
+        self._head[s] = (head + 1) % self.history
+        self._frames[s] = min(self._frames[s] + 1, self.history)
+
+        ranges = self._ranges[s]
+        weights = self._weights[s]
+        used = weights > 0
+        need = min(self.min_valid, self._frames[s])
+
+        # Support of every buffered sample: how many valid samples agree with it
+        gates = np.maximum(self.gate_mm, 3.0 * self._sigmas[s])
+        agree = np.abs(ranges[:, np.newaxis, :] - ranges[np.newaxis, :, :]) <= gates[:, np.newaxis, :]
+        support = (agree & used[np.newaxis, :, :]).sum(axis=1)
+        confirmed = used & (support >= need)
+
+        # Reference: newest confirmed sample of every zone (ring buffer order, newest first)
+        order = (head - np.arange(self.history)) % self.history
+        newest = order[np.argmax(confirmed[order], axis=0)]
+        zones = np.arange(z)
+        valid_out = confirmed[newest, zones]
+
+        weights = np.where(agree[newest, :, zones].T, weights, 0.0)
+        total = weights.sum(axis=0)
+        filtered = np.where(valid_out, (weights * ranges).sum(axis=0) / np.maximum(total, 1e-12),
+                            distance_mm)
+        return filtered, valid_out
@@ -0,0 +1,38 @@
+class StaticSceneGate:
+    """
+    Tells, per sensor, whether a new frame can change the map or whether it shows
+    the same scene as the last frame that was processed.
+
+    A frame is unchanged when the robot stands still (odometry speed and turn rate
+    below the thresholds) and the sensor's on-chip motion indicator reports no
+    aggregate with motion. Everything else - a moving robot, detected motion, a
+    frame without the motion indicator block - goes through. So that nothing is
+    missed for long (motion outside the indicator's distance window, a filter still
+    settling), a frame is processed anyway once `refresh_interval` seconds passed
+    since the sensor's last processed frame.
+    """
+
+    def __init__(self, num_sensors: int, static_speed: float = 0.01,
+                 static_turn_rate: float = 0.02, refresh_interval: float = 2.0) -> None:
+        self.static_speed = static_speed
+        self.static_turn_rate = static_turn_rate
+        self.refresh_interval = refresh_interval
+        self.last_processed = [None] * num_sensors
+        self.frames_skipped = 0
+
+    def robot_static(self, speed: float, turn_rate: float) -> bool:
+        return speed < self.static_speed and turn_rate < self.static_turn_rate
+
+    def reset(self) -> None:
+        """Process the next frame of every sensor, e.g. after a resolution switch."""
+        self.last_processed = [None] * len(self.last_processed)
+
+    def changed(self, sensor_index: int, data, robot_static: bool, timestamp: float) -> bool:
+        """True when the frame `data` of `sensor_index` has to be processed."""
+        last = self.last_processed[sensor_index]
+        if (not robot_static or last is None or timestamp - last >= self.refresh_interval
+                or data.nb_of_aggregates == 0 or data.nb_of_detected_aggregates > 0):
+            self.last_processed[sensor_index] = timestamp
+            return True
+        self.frames_skipped += 1
+        return False
@@ -0,0 +1,63 @@
+class RangingProfile:
+    """A VL53L5CX ranging setup: zone count (16 or 64) and ranging frequency."""
+
+    __slots__ = ("name", "resolution", "frequency_hz")
+
+    def __init__(self, name: str, resolution: int, frequency_hz: int) -> None:
+        self.name = name
+        self.resolution = resolution
+        self.frequency_hz = frequency_hz
+
+    def __repr__(self) -> str:
+        return f"RangingProfile({self.name!r}, {self.resolution}, {self.frequency_hz})"
+
+
+class AdaptiveRangingController:
+    """
+    Picks between a dense profile (8x8, low rate) and a fast profile (4x4, high
+    rate) from the robot's speed and turn rate.
+
+    Obstacle latency matters more than angular density when moving, so the switch
+    to the fast profile happens on the first update above `fast_speed` or
+    `fast_turn_rate`. Going back to the dense profile needs the robot to stay below
+    the lower `dense_speed` / `dense_turn_rate` for `settle_time` seconds. The gap
+    between the thresholds plus the settle time keep the sensors from flapping
+    between resolutions around a single speed.
+    """
+
+    def __init__(self, dense: RangingProfile, fast: RangingProfile,
+                 fast_speed: float = 0.25, dense_speed: float = 0.15,
+                 fast_turn_rate: float = 0.8, dense_turn_rate: float = 0.5,
+                 settle_time: float = 1.0, initial: RangingProfile = None) -> None:
+        self.dense = dense
+        self.fast = fast
+        self.fast_speed = fast_speed
+        self.dense_speed = dense_speed
+        self.fast_turn_rate = fast_turn_rate
+        self.dense_turn_rate = dense_turn_rate
+        self.settle_time = settle_time
+        self.profile = initial or dense
+        self.switches = 0
+        self._slow_since = None
+
+    def update(self, speed: float, turn_rate: float, now: float):
+        """Return the profile to switch to, or None to keep the current one."""
+        if speed > self.fast_speed or turn_rate > self.fast_turn_rate:
+            self._slow_since = None
+            return self._switch(self.fast)
+
+        if speed < self.dense_speed and turn_rate < self.dense_turn_rate:
+            if self._slow_since is None:
+                self._slow_since = now
+            if now - self._slow_since >= self.settle_time:
+                return self._switch(self.dense)
+        else:
+            self._slow_since = None
+        return None
+
+    def _switch(self, profile: RangingProfile):
+        if profile is self.profile:
+            return None
+        self.profile = profile
+        self.switches += 1
+        return profile
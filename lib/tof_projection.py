@@ -0,0 +1,99 @@
+import math
+import numpy as np
+
+# Field of View
+FOV_DEG = 60
+OFFSET_8X8 = 3.75
+OFFSET_4X4 = 7.5
+
+# Sensor mounting
+SENSOR_HEIGHT_M = 0.75
+OFFSET_TOWARDS_CENTER = -0.5          # meters, applied along sensor_index * 60 deg
+TILT_ANGLE_DEG = -30.0                # all sensors are tilted down
+SENSOR_YAWS_DEG = (-60.0, 0.0, 60.0)  # left, forward, right
+
+
+def zone_angles_deg(num_zones: int) -> np.ndarray:
+    """
+    Return the centre angle (degrees) of each zone row/column for a 4x4 or 8x8 grid.
+    """
+    grid_size = math.isqrt(num_zones)  # 8 or 4
+    offset = OFFSET_8X8 if grid_size == 8 else OFFSET_4X4
+    return np.linspace(-FOV_DEG/2 + offset, FOV_DEG/2 - offset, grid_size)
+
+
+class ToFProjector:
+    """
+    Projects VL53L5CX zone distances into (x, y, z) points in robot coordinates.
+
+    All the geometry that does not depend on the measured distance (zone angles,
+    sensor tilt/yaw, the offset towards the centre and the sensor height) is folded
+    into one unit-ray table and one bias vector per sensor at construction time, so
+    projecting a frame is a single broadcast multiply-add:
+
+        points[s, i] = distance_m[s, i] * rays[s, i] + bias[s]
+    """
+
+    def __init__(self, num_zones: int, sensor_yaws_deg=SENSOR_YAWS_DEG,
+                 tilt_deg: float = TILT_ANGLE_DEG,
+                 sensor_height_m: float = SENSOR_HEIGHT_M,
+                 offset_towards_center: float = OFFSET_TOWARDS_CENTER) -> None:
+        self.num_zones = num_zones
+        self.num_sensors = len(sensor_yaws_deg)
+
+        angles = np.deg2rad(zone_angles_deg(num_zones))
+        grid_size = len(angles)
+        vert_rad = np.repeat(angles, grid_size)   # zone i -> row i // grid_size
+        horiz_rad = np.tile(angles, grid_size)    # zone i -> col i % grid_size
+
+        # Spherical → Cartesian unit directions, shared by every sensor
+        zone_rays = np.stack([
+            np.cos(vert_rad) * np.cos(horiz_rad),
+            np.cos(vert_rad) * np.sin(horiz_rad),
+            np.sin(vert_rad),
+        ], axis=1)
+
+        tilt = math.radians(tilt_deg)
+        rot_y = np.array([
+            [ math.cos(tilt), 0, math.sin(tilt)],
+            [ 0,              1, 0             ],
+            [-math.sin(tilt), 0, math.cos(tilt)],
+        ])
+
+        self.rays = np.empty((self.num_sensors, num_zones, 3))
+        self.bias = np.empty((self.num_sensors, 3))
+        for s_idx, yaw_deg in enumerate(sensor_yaws_deg):
+            yaw = math.radians(yaw_deg)
+            rot_z = np.array([
+                [math.cos(yaw), -math.sin(yaw), 0],
+                [math.sin(yaw),  math.cos(yaw), 0],
+                [0,              0,             1],
+            ])
+            rotation = rot_y @ rot_z
+
+            # Fixed offset towards the center of the robot plus the sensor height
+            offset_rad = math.radians(s_idx * 60)
+            offset = np.array([
+                offset_towards_center * math.cos(offset_rad),
+                offset_towards_center * math.sin(offset_rad),
+                sensor_height_m,
+            ])
+
+            self.rays[s_idx] = zone_rays @ rotation
+            self.bias[s_idx] = offset @ rotation
+
+        # Fold the mm → m conversion into the ray table
+        self._rays_mm = self.rays * 0.001
+
+    def project(self, distances_mm: np.ndarray) -> np.ndarray:
+        """
+        Project a (num_sensors, num_zones) distance array (mm) into a
+        (num_sensors, num_zones, 3) array of points.
+        """
+        distances_mm = np.asarray(distances_mm, dtype=np.float64)
+        return distances_mm[..., np.newaxis] * self._rays_mm + self.bias[:, np.newaxis, :]
+
+    def project_sensor(self, distances_mm, sensor_index: int) -> np.ndarray:
+        """Project one sensor's zone distances (mm) into a (num_zones, 3) array of points."""
+        distances_mm = np.asarray(distances_mm, dtype=np.float64)
+        return distances_mm[:, np.newaxis] * self._rays_mm[sensor_index] + self.bias[sensor_index]
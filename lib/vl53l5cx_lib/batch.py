@@ -0,0 +1,109 @@
+import time
+
+from .vl53l5cx import VL53L5CXException
+
+MAX_COMBINED_FAILURES = 3       # Consecutive failed combined transfers before switching to per-sensor mode
+COMBINED_RETRY_TRANSFERS = 300  # Per-sensor transfers before a combined one is tried again
+
+
+class VL53L5CXBatch:
+    """
+    Reads several VL53L5CX sensors on the same I2C bus with combined transactions.
+
+    check_data_ready() polls the UI status of every sensor with one i2c_rdwr call
+    (a register-select and a 4-byte read message per sensor), and read_frames()
+    pulls the frames of all ready sensors back to back in a second one, so a
+    mapping cycle costs two ioctl syscalls instead of two per sensor. Every message
+    reads straight into its sensor's temp_buffer, which is then decoded exactly as
+    VL53L5CX.check_data_ready() / get_ranging_data() would.
+
+    If the combined transfer fails (e.g. one sensor NACKs, or the adapter only
+    allows a read as the last message, like the Pi 4's bcm2835 driver), the sensors
+    are retried one at a time so a single bad device does not stall the others.
+    After MAX_COMBINED_FAILURES failures in a row the batch switches to per-sensor
+    mode instead of paying a failed transaction every frame, and tries a combined
+    transfer again every COMBINED_RETRY_TRANSFERS transfers, so a transient glitch
+    does not cost the combined mode for good.
+    """
+
+    def __init__(self, sensors: list) -> None:
+        self.sensors = list(sensors)
+        self.errors = {}               # sensor position -> exception of the last poll/read
+        self.last_check_time = 0.0     # seconds of the last combined data-ready transaction
+        self.last_read_time = 0.0      # seconds of the last combined frame transaction
+        self.last_read_bytes = 0
+        self.transactions = 0
+        self.fallbacks = 0             # combined transfers that had to be retried per sensor
+        self.failures = 0              # combined transfers failed in a row
+        self.combined = True           # False while in per-sensor mode
+        self._skipped = 0              # per-sensor transfers since combined mode was last tried
+
+    def _transfer(self, sensors: list, sizes: list) -> bool:
+        if not self.combined:
+            self._skipped += 1
+            if self._skipped < COMBINED_RETRY_TRANSFERS:
+                return False
+            self._skipped = 0
+        msgs = []
+        for sensor, size in zip(sensors, sizes):
+            msgs.extend(sensor._temp_read_msgs(0x0, size))
+        try:
+            sensors[0]._i2c_bus.i2c_rdwr(*msgs)
+        except OSError:
+            self.fallbacks += 1
+            self.failures += 1
+            if self.failures >= MAX_COMBINED_FAILURES:
+                self.combined = False
+            return False
+        self.transactions += 1
+        self.failures = 0
+        self.combined = True
+        return True
+
+    def check_data_ready(self) -> list:
+        """Return, for every sensor, whether a new frame is ready (False on error, see `errors`)."""
+        self.errors = {}
+        start = time.perf_counter()
+        combined = self._transfer(self.sensors, [4] * len(self.sensors))
+        self.last_check_time = time.perf_counter() - start
+
+        ready = []
+        for position, sensor in enumerate(self.sensors):
+            try:
+                if combined:
+                    ready.append(sensor._data_ready_status())
+                else:
+                    ready.append(sensor.check_data_ready())
+            except (OSError, VL53L5CXException) as e:
+                self.errors[position] = e
+                ready.append(False)
+        return ready
+
+    def read_frames(self, ready: list) -> dict:
+        """
+        Read and decode the frames of the sensors flagged in `ready` (as returned by
+        check_data_ready()). Returns {sensor position: results}.
+        """
+        positions = [position for position, is_ready in enumerate(ready) if is_ready]
+        if not positions:
+            return {}
+        sensors = [self.sensors[position] for position in positions]
+        sizes = [sensor.data_read_size for sensor in sensors]
+
+        start = time.perf_counter()
+        combined = self._transfer(sensors, sizes)
+        self.last_read_time = time.perf_counter() - start
+        self.last_read_bytes = sum(sizes)
+
+        frames = {}
+        for position, sensor, size in zip(positions, sensors, sizes):
+            try:
+                if combined:
+                    # Share of the combined transfer, for the per-sensor stats
+                    sensor.frame_read_time = self.last_read_time * size / self.last_read_bytes
+                    frames[position] = sensor._decode_frame()
+                else:
+                    frames[position] = sensor.get_ranging_data()
+            except (OSError, VL53L5CXException) as e:
+                self.errors[position] = e
+        return frames
@@ -0,0 +1,258 @@
+import ctypes
+import time
+import numpy as np
+
+from .api import (
+    VL53L5CX_DEFAULT_I2C_ADDRESS,
+    VL53L5CX_NVM_DATA_SIZE,
+    VL53L5CX_UI_CMD_STATUS,
+    VL53L5CX_UI_CMD_START,
+    VL53L5CX_UI_CMD_END,
+    VL53L5CX_DCI_ZONE_CONFIG,
+)
+
+PAGE_REGISTER = 0x7fff
+FRAME_REGISTER = 0x0000      # Page 2: UI status (4 bytes) and ranging frames
+NVM_COMMAND_ADDRESS = 0x2fd8
+START_RANGING_COMMAND = bytes([0x00, 0x03, 0x00, 0x00])
+I2C_M_RD = 0x0001            # Read flag of an I2C message (uapi/linux/i2c.h)
+
+
+def _swap_words(data: bytes) -> bytes:
+    """The sensor's DCI and frame payloads are big-endian 32-bit words."""
+    words = bytearray(data) + bytes(-len(data) % 4)
+    np.frombuffer(words, dtype=np.uint32).byteswap(inplace=True)
+    return bytes(words[:len(data)])
+
+
+class _ReplayDevice:
+    """Register state of one emulated VL53L5CX."""
+
+    def __init__(self, frames: list, frame_rate_hz: float, nvm: bytes, clock) -> None:
+        self.frames = frames
+        self.frame_rate_hz = frame_rate_hz
+        self.nvm = nvm
+        self.clock = clock
+        self.page = 0
+        self.pages = {}
+        self.dci = {
+            # The default configuration is 4x4
+            VL53L5CX_DCI_ZONE_CONFIG: _swap_words(bytes([4, 4, 0, 0, 8, 8, 0, 0])),
+        }
+        self.mcu_running = False
+        self.mcu_stopped = False
+        self.ranging = False
+        self.ranging_start = 0.0
+        self.frame_index = -1
+        self.polls = 0
+
+    def memory(self, page: int) -> bytearray:
+        mem = self.pages.get(page)
+        if mem is None:
+            mem = self.pages[page] = bytearray(0x10000)
+        return mem
+
+    def write(self, register: int, data: bytes) -> None:
+        if register == PAGE_REGISTER:
+            self.page = data[0]
+            return
+        mem = self.memory(self.page)
+        mem[register:register + len(data)] = data
+
+        if self.page == 0:
+            if register == 0x0f and data[0] == 0x43:
+                self.mcu_running = False  # Reboot sequence
+            elif register == 0x0b and data[0] == 0x01:
+                self.mcu_running = True  # MCU reset released after the firmware upload
+            elif register == 0x14:
+                self.mcu_stopped = data[0] == 0x01
+        elif self.page == 2 and register + len(data) == VL53L5CX_UI_CMD_END + 1:
+            self._command(register, data)
+
+    def _command(self, register: int, data: bytes) -> None:
+        """Commands end at VL53L5CX_UI_CMD_END; the driver then polls VL53L5CX_UI_CMD_STATUS."""
+        if register == NVM_COMMAND_ADDRESS:
+            start = VL53L5CX_UI_CMD_START
+            self.memory(2)[start:start + len(self.nvm)] = self.nvm
+        elif bytes(data) == START_RANGING_COMMAND:
+            self.ranging = True
+            self.mcu_stopped = False
+            self.ranging_start = self.clock()
+            self.frame_index = -1
+            self.polls = 0
+        elif len(data) >= 12 and data[-4] == 0x05 and data[-3] == 0x01:
+            # DCI write: header (index, size), payload, footer
+            index = data[0] << 8 | data[1]
+            size = data[2] << 4 | data[3] >> 4
+            self.dci[index] = bytes(data[4:4 + size])
+        elif len(data) == 12 and data[-3] == 0x02:
+            # DCI read request: answer header + payload + footer at VL53L5CX_UI_CMD_START
+            index = data[0] << 8 | data[1]
+            size = data[2] << 4 | data[3] >> 4
+            payload = self.dci.get(index, b"")[:size]
+            answer = bytes(data[:4]) + payload + bytes(size - len(payload)) + bytes(8)
+            start = VL53L5CX_UI_CMD_START
+            self.memory(2)[start:start + len(answer)] = answer
+        # Offset, xtalk and default configuration uploads are just accepted
+
+    def read(self, register: int, size: int) -> bytes:
+        if self.page == 0:
+            if register == 0x00 and size == 1:
+                return b"\xf0"  # Device id
+            if register == 0x01 and size == 1:
+                return b"\x02"  # Revision id
+            if register == 0x06:
+                return bytes([0x80 if self.mcu_stopped else (0x00 if self.mcu_running else 0x01)])
+            if register == 0x07:
+                return b"\x84"  # GO2 status 1 after an MCU stop
+        elif self.page == 1 and register == 0x21:
+            return b"\x10"  # Firmware access granted
+        elif self.page == 2:
+            if register == VL53L5CX_UI_CMD_STATUS:
+                # Byte 0 answers the NVM request, byte 1 every other command
+                return bytes([2, 3, 0, 0])[:size]
+            if register == FRAME_REGISTER and self.ranging:
+                return self._frame(size)
+        if register == PAGE_REGISTER:
+            return bytes([self.page])
+        mem = self.memory(self.page)
+        return bytes(mem[register:register + size])
+
+    def _due_frame(self) -> int:
+        if self.frame_rate_hz:
+            return int((self.clock() - self.ranging_start) * self.frame_rate_hz)
+        # Without a frame rate every status poll finds a new frame
+        self.polls += 1
+        return self.polls - 1
+
+    def _frame(self, size: int) -> bytes:
+        if size == 4:
+            self.frame_index = self._due_frame()
+            if self.frame_index < 0 or self.mcu_stopped:
+                return bytes([255, 5, 5, 0x10])
+            return bytes([self.frame_index % 255, 5, 5, 0x10])
+
+        frame = bytearray(self.frames[max(self.frame_index, 0) % len(self.frames)][:size])
+        frame += bytes(size - len(frame))
+        frame[0] = max(self.frame_index, 0) % 255  # Stream count
+        return bytes(frame)
+
+
+class ReplayI2CBus:
+    """
+    Stand-in for smbus2.SMBus that emulates VL53L5CX sensors well enough for the
+    driver: pass it as `i2c_bus` and init(), set_resolution(), start_ranging(),
+    check_data_ready() and get_ranging_data() run as on the robot, with no sensor
+    attached.
+
+    It answers the boot, firmware-access and MCU polls, accepts the firmware,
+    offset, xtalk and configuration uploads, keeps DCI writes so they read back,
+    serves `nvm` (the 492-byte NVM block) after the NVM command, and once ranging
+    serves `frames` - raw frames as read off the bus, e.g. recorded by
+    RecordingI2CBus - in a loop at `frame_rate_hz` (or a new one on every status
+    poll when it is None).
+
+    `frames` is a list of frames shared by every sensor, or a dict of lists keyed
+    by I2C address. Devices start at `addresses`, and move when the driver sets a
+    new address. Transfers to any other address fail with OSError, as a NACK does.
+    With `bitrate` set, every transfer sleeps as long as it would take on the wire.
+    """
+
+    def __init__(self, frames, frame_rate_hz: float = 15.0, nvm: bytes = None,
+                 addresses: list = None, bitrate: float = None, clock=time.monotonic) -> None:
+        if not isinstance(frames, dict):
+            frames = {address: frames for address in (addresses or [VL53L5CX_DEFAULT_I2C_ADDRESS])}
+        nvm = bytes(nvm) if nvm is not None else bytes(VL53L5CX_NVM_DATA_SIZE)
+        self.devices = {address: _ReplayDevice([bytes(f) for f in device_frames], frame_rate_hz, nvm, clock)
+                        for address, device_frames in frames.items()}
+        self.bitrate = bitrate
+        self.transactions = 0
+        self.bytes_transferred = 0
+        self._registers = {}  # address -> register selected by the last write
+
+    def _device(self, address: int) -> _ReplayDevice:
+        device = self.devices.get(address)
+        if device is None:
+            raise OSError(121, f"Remote I/O error: no device at {address:#04x}")
+        return device
+
+    def i2c_rdwr(self, *msgs) -> None:
+        self.transactions += 1
+        for msg in msgs:
+            device = self._device(msg.addr)
+            if msg.flags & I2C_M_RD:
+                data = device.read(self._registers.get(msg.addr, 0), msg.len)
+                ctypes.memmove(msg.buf, data, msg.len)
+            else:
+                data = ctypes.string_at(msg.buf, msg.len)
+                register = data[0] << 8 | data[1]
+                self._registers[msg.addr] = register
+                if len(data) > 2:
+                    device.write(register, data[2:])
+                    if device.page == 0 and register == 0x04:
+                        # New I2C address
+                        self.devices[data[2]] = self.devices.pop(msg.addr)
+            self.bytes_transferred += msg.len + 1
+            if self.bitrate:
+                # 9 clocks per byte (8 bits + ACK), plus the address byte
+                time.sleep((msg.len + 1) * 9 / self.bitrate)
+
+    def close(self) -> None:
+        pass
+
+
+class RecordingI2CBus:
+    """
+    Wraps a real smbus2.SMBus and keeps what a ReplayI2CBus needs to replay a
+    session: every ranging frame read (reads of more than 4 bytes at register 0)
+    and the NVM block, per I2C address. save() writes them to an .npz file.
+    """
+
+    def __init__(self, bus) -> None:
+        self.bus = bus
+        self.frames = {}      # address -> list of raw frames
+        self.timestamps = {}  # address -> list of time.monotonic() per frame
+        self.nvm = None
+        self._registers = {}
+
+    def i2c_rdwr(self, *msgs) -> None:
+        self.bus.i2c_rdwr(*msgs)
+        for msg in msgs:
+            if msg.flags & I2C_M_RD:
+                register = self._registers.get(msg.addr)
+                if register == FRAME_REGISTER and msg.len > 4:
+                    self.frames.setdefault(msg.addr, []).append(ctypes.string_at(msg.buf, msg.len))
+                    self.timestamps.setdefault(msg.addr, []).append(time.monotonic())
+                elif register == VL53L5CX_UI_CMD_START and msg.len == VL53L5CX_NVM_DATA_SIZE and self.nvm is None:
+                    self.nvm = ctypes.string_at(msg.buf, msg.len)
+            elif msg.len >= 2:
+                data = ctypes.string_at(msg.buf, 2)
+                self._registers[msg.addr] = data[0] << 8 | data[1]
+
+    def __getattr__(self, name):
+        return getattr(self.bus, name)
+
+    def save(self, path: str) -> None:
+        arrays = {}
+        for address, frames in self.frames.items():
+            arrays[f"frames_{address:02x}"] = np.array([np.frombuffer(f, dtype=np.uint8) for f in frames])
+            arrays[f"timestamps_{address:02x}"] = np.array(self.timestamps[address])
+        if self.nvm is not None:
+            arrays["nvm"] = np.frombuffer(self.nvm, dtype=np.uint8)
+        np.savez_compressed(path, **arrays)
+
+
+def load_recording(path: str):
+    """
+    Load a RecordingI2CBus.save() file as (frames, nvm): {address: [raw frame]} and
+    the NVM block (None if it was not recorded), ready for ReplayI2CBus.
+    """
+    frames = {}
+    nvm = None
+    with np.load(path) as data:
+        for name in data.files:
+            if name.startswith("frames_"):
+                frames[int(name[len("frames_"):], 16)] = [row.tobytes() for row in data[name]]
+            elif name == "nvm":
+                nvm = data[name].tobytes()
+    return frames, nvm
@@ -1,4 +1,8 @@
 import time
+import ctypes
+import hashlib
+import struct
+import numpy as np
 
 from typing import List
 from .api import *
@@ -15,6 +19,27 @@ PRINT_SIZE_MAX = 1024
 
 VL53L5CX_COMMS_CHUNK_SIZE = 4096  # Mark's original value was 1024, but 4096 works as well
 
+I2C_M_RD = 0x0001  # Read flag of an I2C message (uapi/linux/i2c.h)
+
+# Optional result blocks, in the order of the disable_* constructor flags
+OUTPUTS = ("ambient_per_spad", "nb_spads_enabled", "nb_target_detected", "signal_per_spad",
+           "range_sigma_mm", "distance_mm", "reflectance_percent", "target_status",
+           "motion_indicator")
+
+# Named sets of enabled outputs for the output_profile constructor argument. Every
+# disabled block shrinks data_read_size, i.e. the bytes read over I2C each frame.
+OUTPUT_PROFILES = {
+    "full": OUTPUTS,
+    # What the per-zone temporal filter weighs samples with
+    "quality": ("nb_target_detected", "signal_per_spad", "range_sigma_mm", "distance_mm",
+                "target_status"),
+    # Just enough to place points in an occupancy grid
+    "mapping-minimal": ("distance_mm", "target_status"),
+    # "quality" plus the motion indicator, for skipping frames of a static scene
+    "quality-motion": ("nb_target_detected", "signal_per_spad", "range_sigma_mm", "distance_mm",
+                       "target_status", "motion_indicator"),
+}
+
 
 def to_long_uint(data: List[int], i: int) -> int:
     return data[i] + data[i + 1] * 0x100 + data[i + 2] * 0x10000 + data[i + 3] * 0x1000000
@@ -163,6 +188,126 @@ class VL53L5CXResultsData:
                 size -= 4
 
 
+class VL53L5CXResultsArrays:
+    """
+    Same fields as VL53L5CXResultsData, held in numpy arrays so a frame is decoded
+    with whole-array operations. Converted fields are float64 (raw integers with
+    use_raw_format). Slicing, e.g. distance_mm[:16], returns a view.
+    """
+
+    def __init__(self, nb_target_per_zone: int, use_raw_format: bool = False) -> None:
+        zones = VL53L5CX_RESOLUTION_8X8
+        targets = VL53L5CX_RESOLUTION_8X8 * nb_target_per_zone
+        real = np.float64
+
+        self.silicon_temp_degc: int = 0
+        self.ambient_per_spad = np.zeros(zones, dtype=np.uint32 if use_raw_format else real)
+        self.nb_target_detected = np.zeros(zones, dtype=np.uint8)
+        self.nb_spads_enabled = np.zeros(zones, dtype=np.uint32)
+        self.signal_per_spad = np.zeros(targets, dtype=np.uint32 if use_raw_format else real)
+        self.range_sigma_mm = np.zeros(targets, dtype=np.uint16 if use_raw_format else real)
+        self.distance_mm = np.zeros(targets, dtype=np.int16 if use_raw_format else real)
+        self.reflectance = np.zeros(targets, dtype=np.uint8)
+        self.target_status = np.zeros(targets, dtype=np.uint8)
+
+        self.global_indicator_1: int = 0
+        self.global_indicator_2: int = 0
+        self.status: int = 0
+        self.nb_of_detected_aggregates: int = 0
+        self.nb_of_aggregates: int = 0
+        self.spare: int = 0
+        self.motion = np.zeros(32, dtype=np.uint32 if use_raw_format else real)
+
+
+class VL53L5CXMotionConfiguration:
+    """
+    Host copy of the motion indicator configuration (VL53L5CX_Motion_Configuration
+    of ST's motion indicator plugin), written to VL53L5CX_DCI_MOTION_DETECTOR_CFG.
+    Defaults are the ones of vl53l5cx_motion_indicator_init().
+    """
+
+    # int32 ref_bin_offset, uint32 detection_threshold, extra_noise_sigma,
+    # null_den_clip_value, 12 uint8 settings, int8 map_id[64],
+    # uint8 indicator_format_1[32], indicator_format_2[32]: 156 bytes
+    FORMAT = "<iIII12B64b32B32B"
+
+    def __init__(self, resolution: int = VL53L5CX_RESOLUTION_8X8) -> None:
+        self.ref_bin_offset = 13633
+        self.detection_threshold = 2883584
+        self.extra_noise_sigma = 0
+        self.null_den_clip_value = 0
+        self.mem_update_mode = 6
+        self.mem_update_choice = 2
+        self.sum_span = 4
+        self.feature_length = 9
+        self.nb_of_aggregates = 16
+        self.nb_of_temporal_accumulations = 16
+        self.min_nb_for_global_detection = 1
+        self.global_indicator_format_1 = 8
+        self.global_indicator_format_2 = 0
+        self.spare_1 = 0
+        self.spare_2 = 0
+        self.spare_3 = 0
+        self.map_id = [0] * 64
+        self.indicator_format_1 = [0] * 32
+        self.indicator_format_2 = [0] * 32
+        self.set_resolution(resolution)
+
+    def set_resolution(self, resolution: int) -> None:
+        """Map the zones onto the 16 aggregates: one per zone in 4x4, 2x2 zones each in 8x8."""
+        if resolution == VL53L5CX_RESOLUTION_4X4:
+            self.map_id = list(range(16)) + [-1] * 48
+        elif resolution == VL53L5CX_RESOLUTION_8X8:
+            self.map_id = [(i % 8) // 2 + 4 * (i // 16) for i in range(64)]
+        else:
+            raise VL53L5CXException(VL53L5CX_STATUS_INVALID_PARAM)
+
+    def set_distance(self, distance_min_mm: int, distance_max_mm: int) -> None:
+        """Restrict motion detection to [distance_min_mm, distance_max_mm]: 400-4000 mm, at most 1500 mm wide."""
+        if (distance_max_mm - distance_min_mm > 1500
+                or distance_min_mm < 400 or distance_max_mm > 4000):
+            raise VL53L5CXException(VL53L5CX_STATUS_INVALID_PARAM)
+        self.ref_bin_offset = int((distance_min_mm / 37.5348 - 4.0) * 2048.5)
+        self.feature_length = int(((distance_max_mm - distance_min_mm) / 10.0 + 30.02784) / 15.01392 + 0.5)
+
+    def pack(self) -> bytearray:
+        return bytearray(struct.pack(
+            self.FORMAT,
+            self.ref_bin_offset, self.detection_threshold, self.extra_noise_sigma, self.null_den_clip_value,
+            self.mem_update_mode, self.mem_update_choice, self.sum_span, self.feature_length,
+            self.nb_of_aggregates, self.nb_of_temporal_accumulations, self.min_nb_for_global_detection,
+            self.global_indicator_format_1, self.global_indicator_format_2,
+            self.spare_1, self.spare_2, self.spare_3,
+            *self.map_id, *self.indicator_format_1, *self.indicator_format_2))
+
+
+class _I2CMessage(ctypes.Structure):
+    """
+    Same layout and constructors as smbus2's i2c_msg, used with an injected bus
+    (e.g. replay.ReplayI2CBus) when smbus2 is not installed.
+    """
+
+    _fields_ = [
+        ("addr", ctypes.c_uint16),
+        ("flags", ctypes.c_uint16),
+        ("len", ctypes.c_uint16),
+        ("buf", ctypes.POINTER(ctypes.c_char))]
+
+    def __len__(self) -> int:
+        return self.len
+
+    @staticmethod
+    def read(address: int, length: int):
+        return _I2CMessage(addr=address, flags=I2C_M_RD, len=length,
+                           buf=ctypes.create_string_buffer(length))
+
+    @staticmethod
+    def write(address: int, buf):
+        buf = bytes(buf)
+        return _I2CMessage(addr=address, flags=0, len=len(buf),
+                           buf=ctypes.create_string_buffer(buf, len(buf)))
+
+
 class VL53L5CX:
     def __init__(
             self,
@@ -179,10 +324,17 @@ class VL53L5CX:
             disable_reflectance_percent: bool = False,
             disable_target_status: bool = False,
             disable_motion_indicator: bool = False,
-            i2c_address: int = VL53L5CX_DEFAULT_I2C_ADDRESS) -> None:
+            i2c_address: int = VL53L5CX_DEFAULT_I2C_ADDRESS,
+            use_numpy_results: bool = False,
+            output_profile: str = None) -> None:
+        """
+        :param output_profile: name of an entry of OUTPUT_PROFILES; when given it
+               replaces the disable_* flags, disabling every output it does not list
+        """
 
         self.buffers = Buffers(nb_target_per_zone)
         self.use_raw_format = use_raw_format
+        self.use_numpy_results = use_numpy_results
         self.nb_target_per_zone = nb_target_per_zone
 
         self.disable_ambient_per_spad = disable_ambient_per_spad
@@ -195,47 +347,55 @@ class VL53L5CX:
         self.disable_target_status = disable_target_status
         self.disable_motion_indicator = disable_motion_indicator
 
-        if disable_ambient_per_spad:
+        self.output_profile = output_profile
+        if output_profile is not None:
+            if output_profile not in OUTPUT_PROFILES:
+                raise ValueError(f"Unknown output profile '{output_profile}', "
+                                 f"expected one of {list(OUTPUT_PROFILES)}")
+            for name in OUTPUTS:
+                setattr(self, "disable_" + name, name not in OUTPUT_PROFILES[output_profile])
+
+        if self.disable_ambient_per_spad:
             self.L5CX_AMB_SIZE = 0
         else:
             self.L5CX_AMB_SIZE = 260
 
-        if disable_nb_spads_enabled:
+        if self.disable_nb_spads_enabled:
             self.L5CX_SPAD_SIZE = 0
         else:
             self.L5CX_SPAD_SIZE = 260
 
-        if disable_nb_target_detected:
+        if self.disable_nb_target_detected:
             self.L5CX_NTAR_SIZE = 0
         else:
             self.L5CX_NTAR_SIZE = 68
 
-        if disable_signal_per_spad:
+        if self.disable_signal_per_spad:
             self.L5CX_SPS_SIZE = 0
         else:
             self.L5CX_SPS_SIZE = ((256 * nb_target_per_zone) + 4)
 
-        if disable_range_sigma_mm is None:
-            self.L5CX_SIGR_SIZE = ((128 * nb_target_per_zone) + 4)
-        else:
+        if self.disable_range_sigma_mm:
             self.L5CX_SIGR_SIZE = 0
+        else:
+            self.L5CX_SIGR_SIZE = ((128 * nb_target_per_zone) + 4)
 
-        if disable_distance_mm:
+        if self.disable_distance_mm:
             self.L5CX_DIST_SIZE = 0
         else:
             self.L5CX_DIST_SIZE = ((128 * nb_target_per_zone) + 4)
 
-        if disable_reflectance_percent:
+        if self.disable_reflectance_percent:
             self.L5CX_RFLEST_SIZE = 0
         else:
             self.L5CX_RFLEST_SIZE = ((64 * nb_target_per_zone) + 4)
 
-        if disable_target_status:
+        if self.disable_target_status:
             self.L5CX_STA_SIZE = 0
         else:
             self.L5CX_STA_SIZE = ((64 * nb_target_per_zone) + 4)
 
-        if disable_motion_indicator:
+        if self.disable_motion_indicator:
             self.L5CX_MOT_SIZE = 0
         else:
             self.L5CX_MOT_SIZE = 144
@@ -302,23 +462,58 @@ class VL53L5CX:
 
         self.i2c_address = i2c_address
 
+        self._i2c_m_rd = I2C_M_RD
         if i2c_bus is None:
             from smbus2 import SMBus, i2c_msg
-            self._i2c_bus = SMBus(bus_id)
             self.i2c_msg = i2c_msg
+            self._i2c_bus = SMBus(bus_id)
         else:
+            # smbus2 is only needed to open a bus; an injected one may be a stand-in
+            try:
+                from smbus2 import i2c_msg
+            except ImportError:
+                i2c_msg = _I2CMessage
+            self.i2c_msg = i2c_msg
             self._i2c_bus = i2c_bus
 
         self.streamcount: int = 0
         self.data_read_size: int = 0
+        self.frame_read_time: float = 0.0  # Seconds the last get_ranging_data() spent on I2C
         self.default_configuration: int = 0
         self.default_xtalk: int = 0
         self.offset_data = [0] * VL53L5CX_OFFSET_BUFFER_SIZE
         self.xtalk_data = [0] * VL53L5CX_XTALK_BUFFER_SIZE
-        self.temp_buffer = [0] * self.VL53L5CX_TEMPORARY_BUFFER_SIZE
+        self._offset_cache = {}  # resolution -> (offset_data it was built from, payload)
+        self._xtalk_cache = {}   # resolution -> (xtalk_data it was built from, payload)
+        self.resolution: int = 0  # Resolution of the current ranging session
+        self.motion_config = None  # VL53L5CXMotionConfiguration once the motion indicator is set up
+        self.last_switch_time: float = 0.0  # Seconds the last switch_resolution() took
+        # I2C transfers read straight into temp_buffer and write straight out of
+        # _write_buffer: the i2c_msg structs point into these bytearrays, so neither
+        # may ever be resized (slice assignments must keep their length).
+        self.temp_buffer = bytearray(self.VL53L5CX_TEMPORARY_BUFFER_SIZE)
+        self._write_buffer = bytearray(VL53L5CX_COMMS_CHUNK_SIZE)
+        self._msg_cache = {}
+        self._decode_plan = None
+        self._decode_plan_key = None
+
+    def _addr_msg(self, addr: int):
+        """Write message selecting register `addr`, cached per device address."""
+        key = ("addr", self.i2c_address, addr)
+        msg = self._msg_cache.get(key)
+        if msg is None:
+            msg = self.i2c_msg.write(self.i2c_address, [addr >> 8 & 0xff, addr & 0xff])
+            self._msg_cache[key] = msg
+        return msg
+
+    def _buffer_msg(self, buffer: bytearray, size: int, flags: int):
+        """I2C message whose data is the first `size` bytes of `buffer`, without copying."""
+        data = (ctypes.c_char * size).from_buffer(buffer)
+        return self.i2c_msg(addr=self.i2c_address, flags=flags, len=size,
+                            buf=ctypes.cast(data, ctypes.POINTER(ctypes.c_char)))
 
     @staticmethod
-    def swap_buffer(buffer: List[int], size: int) -> None:
+    def swap_buffer(buffer, size: int) -> None:
         # Original code:
         # 	for(i = 0; i < size; i = i + 4)
         # 	{
@@ -330,6 +525,12 @@ class VL53L5CX:
         #
         # 		memcpy(&(buffer[i]), &tmp, 4);
         # 	}
+        if isinstance(buffer, (bytearray, np.ndarray)):
+            # Byte-swap every 32-bit word in place through a numpy view of the buffer
+            words = (min(size, len(buffer)) + 3) // 4
+            np.frombuffer(buffer, dtype=np.uint32, count=words).byteswap(inplace=True)
+            return
+
         for i in range(0, min(size, len(buffer)), 4):
             t = buffer[i]
             buffer[i] = buffer[i + 3]
@@ -338,17 +539,32 @@ class VL53L5CX:
             buffer[i + 1] = buffer[i + 2]
             buffer[i + 2] = t
 
-    def rd_multi(self, addr: int, buffer: List[int], size: int) -> None:
-        write_addr = self.i2c_msg.write(self.i2c_address, [addr >> 8 & 0xff, addr & 0xff])
-        read_data = self.i2c_msg.read(self.i2c_address, size)
-
-        self._i2c_bus.i2c_rdwr(write_addr, read_data)
+    def _temp_read_msgs(self, addr: int, size: int):
+        """
+        (register select, read) message pair reading `size` bytes at `addr` straight
+        into temp_buffer. The messages are cached, and can be combined with other
+        sensors' messages in one i2c_rdwr call (see batch.VL53L5CXBatch).
+        """
+        key = ("read", self.i2c_address, size)
+        read_data = self._msg_cache.get(key)
+        if read_data is None:
+            read_data = self._buffer_msg(self.temp_buffer, size, self._i2c_m_rd)
+            self._msg_cache[key] = read_data
+        return self._addr_msg(addr), read_data
+
+    def rd_multi(self, addr: int, buffer, size: int) -> None:
+        if buffer is self.temp_buffer:
+            # Read straight into temp_buffer; the message is reused for every frame
+            select, read_data = self._temp_read_msgs(addr, size)
+            self._i2c_bus.i2c_rdwr(select, read_data)
+        else:
+            read_data = self.i2c_msg.read(self.i2c_address, size)
+            self._i2c_bus.i2c_rdwr(self._addr_msg(addr), read_data)
+            buffer[:len(read_data)] = read_data.buf[:len(read_data)]
 
         read_size = len(read_data)
 
         if read_size > 0:
-            read_buffer = list(read_data)
-            buffer[:read_size] = read_buffer[:read_size]
             if DEBUG_IO:
                 print(f"rd_multi addr={addr:#0{6}x}, len={{}}, size={size}. read_size={read_size}, buf_len= read=[", end="")
                 print_size = read_size
@@ -357,23 +573,26 @@ class VL53L5CX:
                 for i in range(print_size):
                     if i > 0:
                         print(", ", end="")
-                    print(f"{read_buffer[i]:#0{2}x}", end="")
+                    print(f"{buffer[i]:#0{2}x}", end="")
                 if print_size != read_size:
                     print(", ...", end="")
                 print("]")
         else:
             raise Exception("Couldn't read any bytes")
 
-    def wr_multi(self, addr: int, buffer: List[int], size: int) -> None:
+    def wr_multi(self, addr: int, buffer, size: int) -> None:
         position = 0
         while position < size:
             data_size = VL53L5CX_COMMS_CHUNK_SIZE - 2 if size - position > VL53L5CX_COMMS_CHUNK_SIZE - 2 else size - position
 
-            buf = [0] * (data_size + 2)
+            buf = self._write_buffer
             buf[0] = addr >> 8
             buf[1] = addr & 0xff
-            buf[2:] = buffer[position:position + data_size]
-            write = self.i2c_msg.write(self.i2c_address, buf)
+            if isinstance(buffer, (bytes, bytearray, memoryview)):
+                buf[2:2 + data_size] = memoryview(buffer)[position:position + data_size]
+            else:
+                buf[2:2 + data_size] = bytes(buffer[position:position + data_size])
+            write = self._buffer_msg(buf, data_size + 2, 0)
             self._i2c_bus.i2c_rdwr(write)
 
             if DEBUG_IO:
@@ -465,6 +684,36 @@ class VL53L5CX:
         @brief Inner function, not available outside this file. This function is used
         to set the offset data gathered from NVM.
         """
+        self._send_calibration(self._offset_cache, self.offset_data, VL53L5CX_OFFSET_BUFFER_SIZE,
+                               resolution, self._offset_payload, 0x2e18)
+
+    def _send_xtalk_data(self, resolution: int) -> None:
+        """
+        @brief Inner function, not available outside this file. This function is used
+        to set the Xtalk data from generic configuration, or user's calibration.
+        """
+        self._send_calibration(self._xtalk_cache, self.xtalk_data, VL53L5CX_XTALK_BUFFER_SIZE,
+                               resolution, self._xtalk_payload, 0x2cf8)
+
+    def _send_calibration(self, cache: dict, data, size: int, resolution: int, build, addr: int) -> None:
+        """
+        Write the offset or xtalk payload for `resolution`. The payload (with the 4x4
+        extrapolation) is built in temp_buffer once per resolution and calibration
+        data, then reused, so switching resolution back and forth only costs the I2C
+        writes.
+        """
+        source = bytes(data[:size])
+        cached = cache.get(resolution)
+        if cached is not None and cached[0] == source:
+            self.temp_buffer[:size] = cached[1]
+        else:
+            build(resolution)
+            cache[resolution] = (source, bytes(self.temp_buffer[:size]))
+        self.wr_multi(addr, self.temp_buffer, size)
+        self._poll_for_answer(4, 1, VL53L5CX_UI_CMD_STATUS, 0xff, 0x03)
+
+    def _offset_payload(self, resolution: int) -> None:
+        """Build the offset payload sent for `resolution` in temp_buffer."""
 
         signal_grid: List[int] = [0] * 64 * 4
         range_grid: List[int] = [0] * 64 * 2
@@ -549,18 +798,12 @@ class VL53L5CX:
 
             self.swap_buffer(self.temp_buffer, VL53L5CX_OFFSET_BUFFER_SIZE)
 
-        for k in range(VL53L5CX_OFFSET_BUFFER_SIZE - 4):
-            self.temp_buffer[k] = self.temp_buffer[k + 8]
+        self.temp_buffer[:VL53L5CX_OFFSET_BUFFER_SIZE - 4] = self.temp_buffer[8:VL53L5CX_OFFSET_BUFFER_SIZE + 4]
 
         self.temp_buffer[0x1E0: 0x1E0 + 8] = footer[:]
-        self.wr_multi(0x2e18, self.temp_buffer, VL53L5CX_OFFSET_BUFFER_SIZE)
-        self._poll_for_answer(4, 1, VL53L5CX_UI_CMD_STATUS, 0xff, 0x03)
 
-    def _send_xtalk_data(self, resolution: int) -> None:
-        """
-        @brief Inner function, not available outside this file. This function is used
-        to set the Xtalk data from generic configuration, or user's calibration.
-        """
+    def _xtalk_payload(self, resolution: int) -> None:
+        """Build the xtalk payload sent for `resolution` in temp_buffer."""
 
         res4x4 = [0x0F, 0x04, 0x04, 0x17, 0x08, 0x10, 0x10, 0x07]
         dss_4x4 = [0x00, 0x78, 0x00, 0x08, 0x00, 0x00, 0x00, 0x08]
@@ -593,9 +836,6 @@ class VL53L5CX:
             self.temp_buffer[0x134:0x134 + len(profile_4x4)] = profile_4x4[:]
             self.temp_buffer[0x078:0x078 + 4] = [0] * 4
 
-        self.wr_multi(0x2cf8, self.temp_buffer, VL53L5CX_XTALK_BUFFER_SIZE)
-        self._poll_for_answer(4, 1, VL53L5CX_UI_CMD_STATUS, 0xff, 0x03)
-
     def is_alive(self) -> bool:
         self.wr_byte(0x7fff, 0x00)
         device_id = self.rd_byte(0)
@@ -681,12 +921,13 @@ class VL53L5CX:
         self.wr_byte(0x20, 0x06)
 
         # Download FW into VL53L5
+        firmware = memoryview(self.buffers.VL53L5CX_FIRMWARE)
         self.wr_byte(0x7fff, 0x09)
-        self.wr_multi(0, self.buffers.VL53L5CX_FIRMWARE[0:0x8000], 0x8000)
+        self.wr_multi(0, firmware[0:0x8000], 0x8000)
         self.wr_byte(0x7fff, 0x0a)
-        self.wr_multi(0, self.buffers.VL53L5CX_FIRMWARE[0x8000:0x10000], 0x8000)
+        self.wr_multi(0, firmware[0x8000:0x10000], 0x8000)
         self.wr_byte(0x7fff, 0x0b)
-        self.wr_multi(0, self.buffers.VL53L5CX_FIRMWARE[0x10000:0x15000], 0x5000)
+        self.wr_multi(0, firmware[0x10000:0x15000], 0x5000)
         self.wr_byte(0x7fff, 0x01)
 
         # Check if FW correctly downloaded
@@ -777,21 +1018,12 @@ class VL53L5CX:
 
             self.wr_byte(0x7FFF, 0x02)
 
-    def start_ranging(self) -> None:
-        header_config = [0, 0]
-
-        # union Block_header *bh_ptr
-        #    uint32_t bytes
-        #    struct {
-        #        uint32_t type : 4
-        #        uint32_t size : 12
-        #        uint32_t idx : 16
-        #    }
-        cmd = [0x00, 0x03, 0x00, 0x00]
-
-        resolution = self.get_resolution()
-        self.data_read_size = 0
-        self.streamcount = 255
+    def _output_config(self, resolution: int):
+        """
+        Output block list, output enable mask and frame size (data_read_size) for
+        `resolution` and the outputs enabled in the constructor.
+        """
+        data_read_size = 0
 
         # Enable mandatory output (meta and common data)
         output_bh_enable = [0x00000007, 0x00000000, 0x00000000, 0xC0000000]
@@ -859,19 +1091,39 @@ class VL53L5CX:
                 # bh_ptr_size back to output!
                 output[i] = output[i] & 0xffff000f | (bh_ptr_size << 4) & 0xfff0
 
-                self.data_read_size += bh_ptr_type * bh_ptr_size
+                data_read_size += bh_ptr_type * bh_ptr_size
                 if DEBUG_LOW_LEVEL_LOGIC_START_RANGING:
-                    print(f"vl53l5cx_start_ranging:    output[{i}]={output[i]:0{8}x}, data_read_size={self.data_read_size}")
+                    print(f"vl53l5cx_start_ranging:    output[{i}]={output[i]:0{8}x}, data_read_size={data_read_size}")
             else:
                 bh_ptr_size = (output[i] >> 4) & 0xfff
-                self.data_read_size += bh_ptr_size
-            self.data_read_size += 4
+                data_read_size += bh_ptr_size
+            data_read_size += 4
             if DEBUG_LOW_LEVEL_LOGIC_START_RANGING:
-                print(f"vl53l5cx_start_ranging:  data_read_size={self.data_read_size}")
+                print(f"vl53l5cx_start_ranging:  data_read_size={data_read_size}")
 
-        self.data_read_size += 20
+        data_read_size += 20
         if DEBUG_LOW_LEVEL_LOGIC_START_RANGING:
-            print(f"vl53l5cx_start_ranging:  final data_read_size={self.data_read_size}")
+            print(f"vl53l5cx_start_ranging:  final data_read_size={data_read_size}")
+
+        return output, output_bh_enable, data_read_size
+
+    def start_ranging(self) -> None:
+        header_config = [0, 0]
+
+        # union Block_header *bh_ptr
+        #    uint32_t bytes
+        #    struct {
+        #        uint32_t type : 4
+        #        uint32_t size : 12
+        #        uint32_t idx : 16
+        #    }
+        cmd = [0x00, 0x03, 0x00, 0x00]
+
+        resolution = self.get_resolution()
+        self.resolution = resolution
+        self.streamcount = 255
+        output, output_bh_enable, self.data_read_size = self._output_config(resolution)
+        total_output_len = len(output)
 
         output_bytes = long_array_to_bytes(output)
         self.dci_write_data(output_bytes, VL53L5CX_DCI_OUTPUT_LIST, len(output_bytes))
@@ -907,6 +1159,62 @@ class VL53L5CX:
         #     print(f"vl53l5cx_start_ranging: size={size} != data_read_size={self.data_read_size}, temp_buffer={self.temp_buffer[:32]}")
         #     # raise VL53L5CXException(VL53L5CX_STATUS_ERROR)
 
+    def is_ranging(self) -> bool:
+        """
+        One 4-byte read of the UI status at 0x0: True when the sensor answers, has
+        its firmware running and is in a ranging session without a GO2 error.
+        Used to pick a sensor up again after a restart of the host process.
+        """
+        try:
+            self.rd_multi(0x0, self.temp_buffer, 4)
+        except OSError:
+            return False
+        return (self.temp_buffer[0] != 255
+                and self.temp_buffer[1] == 0x5
+                and self.temp_buffer[3] & 0x80 == 0)
+
+    def resume_ranging(self, resolution: int) -> None:
+        """
+        Take over a sensor that is already ranging with this driver's output
+        configuration at `resolution`, without touching it: only the host-side
+        frame size and stream counter are restored.
+        """
+        _, _, self.data_read_size = self._output_config(resolution)
+        self.resolution = resolution
+        self.streamcount = 255
+
+    def switch_resolution(self, resolution: int, frequency_hz: int = None) -> None:
+        """
+        Restart ranging at another resolution (and optionally ranging frequency).
+        Offset and xtalk payloads are cached per resolution, so after the first
+        switch to a resolution this is a handful of DCI writes.
+        """
+        start = time.perf_counter()
+        self.stop_ranging()
+        self.set_resolution(resolution)
+        if self.motion_config is not None:
+            self.motion_indicator_set_resolution(resolution)
+        if frequency_hz is not None:
+            self.set_ranging_frequency_hz(frequency_hz)
+        self.start_ranging()
+        self.last_switch_time = time.perf_counter() - start
+
+    def config_hash(self, resolution: int, **settings) -> str:
+        """
+        Hash of everything that start-up writes to the sensor: firmware, default
+        configuration and xtalk, target count, enabled outputs, resolution and any
+        extra `settings` (e.g. ranging frequency). A sensor found ranging can be
+        resumed when its stored hash matches.
+        """
+        _, output_bh_enable, data_read_size = self._output_config(resolution)
+        digest = hashlib.sha1()
+        digest.update(self.buffers.VL53L5CX_FIRMWARE)
+        digest.update(self.buffers.VL53L5CX_DEFAULT_CONFIGURATION)
+        digest.update(self.buffers.VL53L5CX_DEFAULT_XTALK)
+        digest.update(repr((self.nb_target_per_zone, output_bh_enable, data_read_size,
+                            resolution, sorted(settings.items()))).encode())
+        return digest.hexdigest()
+
     def stop_ranging(self) -> None:
         timeout = 0
         buf = [0, 0, 0, 0]
@@ -950,7 +1258,10 @@ class VL53L5CX:
 
     def check_data_ready(self) -> bool:
         self.rd_multi(0x0, self.temp_buffer, 4)
+        return self._data_ready_status()
 
+    def _data_ready_status(self) -> bool:
+        """Evaluate the UI status read into temp_buffer[:4] by check_data_ready()."""
         if ((self.temp_buffer[0] != self.streamcount)
                 and (self.temp_buffer[0] != 255)
                 and (self.temp_buffer[1] == 0x5)
@@ -967,19 +1278,35 @@ class VL53L5CX:
             print(f"vl53l5cx_check_data_ready: buf={self.temp_buffer[:4]}, streamcount={self.streamcount}")
         return False
 
-    def get_ranging_data(self) -> VL53L5CXResultsData:
-        p_results = VL53L5CXResultsData(self.nb_target_per_zone)
-
+    def get_ranging_data(self, results=None):
+        """
+        Read and decode one frame. Returns a VL53L5CXResultsData of lists, or with
+        use_numpy_results a VL53L5CXResultsArrays; pass `results` to decode into a
+        previously returned VL53L5CXResultsArrays instead of allocating a new one.
+        """
         if DEBUG_LOW_LEVEL_LOGIC_GET_RANGING_DATA:
             print(f"vl53l5cx_get_ranging_data: data_read_size={self.data_read_size}")
+        start = time.perf_counter()
         self.rd_multi(0x0, self.temp_buffer, self.data_read_size)
+        self.frame_read_time = time.perf_counter() - start
+        return self._decode_frame(results)
+
+    def _decode_frame(self, results=None):
+        """Decode the raw frame read into temp_buffer by get_ranging_data()."""
         self.streamcount = self.temp_buffer[0]
         self.swap_buffer(self.temp_buffer, self.data_read_size)
         if DEBUG_LOW_LEVEL_LOGIC_GET_RANGING_DATA:
             print(f"vl53l5cx_get_ranging_data: streamcount={self.streamcount}")
 
+        if self.use_numpy_results:
+            return self._decode_ranging_data_numpy(results)
+        return self._decode_ranging_data()
+
+    def _result_blocks(self):
+        """Yield (block index, data offset, data size) for every block of the frame in temp_buffer."""
         # Start conversion at position 16 to avoid headers
-        for i in range(16, self.data_read_size, 4):
+        i = 16
+        while i < self.data_read_size:
             bh_ptr_type = self.temp_buffer[i] & 0x0f
             bh_ptr_size = (self.temp_buffer[i] >> 4) & 0xf | (self.temp_buffer[i + 1] << 4)
             if 0x1 < bh_ptr_type < 0xd:
@@ -988,31 +1315,36 @@ class VL53L5CX:
                 msize = bh_ptr_size
 
             bh_ptr_idx = self.temp_buffer[i + 2] + self.temp_buffer[i + 3] * 256
+            yield bh_ptr_idx, i + 4, msize
+            i += msize + 4
+
+    def _decode_ranging_data(self) -> VL53L5CXResultsData:
+        p_results = VL53L5CXResultsData(self.nb_target_per_zone)
 
+        for bh_ptr_idx, i, msize in self._result_blocks():
             if bh_ptr_idx == self.VL53L5CX_METADATA_IDX:
-                p_results.silicon_temp_degc = self.temp_buffer[i + 12]
+                p_results.silicon_temp_degc = self.temp_buffer[i + 8]
             elif not self.disable_ambient_per_spad and bh_ptr_idx == self.VL53L5CX_AMBIENT_RATE_IDX:
-                to_ulong_array(p_results.ambient_per_spad, self.temp_buffer, i + 4, msize)
+                to_ulong_array(p_results.ambient_per_spad, self.temp_buffer, i, msize)
             elif not self.disable_nb_spads_enabled and bh_ptr_idx == self.VL53L5CX_SPAD_COUNT_IDX:
-                to_ulong_array(p_results.nb_spads_enabled, self.temp_buffer, i + 4, msize)
+                to_ulong_array(p_results.nb_spads_enabled, self.temp_buffer, i, msize)
             elif not self.disable_nb_target_detected and bh_ptr_idx == self.VL53L5CX_NB_TARGET_DETECTED_IDX:
-                p_results.nb_target_detected[:msize] = self.temp_buffer[i + 4: i + 4 + msize]
+                p_results.nb_target_detected[:msize] = self.temp_buffer[i: i + msize]
             elif not self.disable_signal_per_spad and bh_ptr_idx == self.VL53L5CX_SIGNAL_RATE_IDX:
-                to_ulong_array(p_results.signal_per_spad, self.temp_buffer, i + 4, msize)
+                to_ulong_array(p_results.signal_per_spad, self.temp_buffer, i, msize)
             elif not self.disable_range_sigma_mm and bh_ptr_idx == self.VL53L5CX_RANGE_SIGMA_MM_IDX:
-                to_uint_array(p_results.range_sigma_mm, self.temp_buffer, i + 4, msize)
+                to_uint_array(p_results.range_sigma_mm, self.temp_buffer, i, msize)
             elif not self.disable_distance_mm and bh_ptr_idx == self.VL53L5CX_DISTANCE_IDX:
-                to_uint_array(p_results.distance_mm, self.temp_buffer, i + 4, msize)
+                to_int_array(p_results.distance_mm, self.temp_buffer, i, msize)
             elif not self.disable_reflectance_percent and bh_ptr_idx == self.VL53L5CX_REFLECTANCE_EST_PC_IDX:
-                p_results.reflectance[:msize] = self.temp_buffer[i + 4: i + 4 + msize]
+                p_results.reflectance[:msize] = self.temp_buffer[i: i + msize]
             elif not self.disable_target_status and bh_ptr_idx == self.VL53L5CX_TARGET_STATUS_IDX:
-                p_results.target_status[:msize] = self.temp_buffer[i + 4: i + 4 + msize]
+                p_results.target_status[:msize] = self.temp_buffer[i: i + msize]
             elif not self.disable_motion_indicator and bh_ptr_idx == self.VL53L5CX_MOTION_DETEC_IDX:
 
                 if DEBUG_LOW_LEVEL_LOGIC_GET_RANGING_DATA:
-                    print(f"vl53l5cx_get_ranging_data: i+4={i + 4} msize={msize}, len(self.temp_buffer)={len(self.temp_buffer)}")
-                p_results.update_motion_indicator(self.temp_buffer, i + 4, msize)
-            i += msize
+                    print(f"vl53l5cx_get_ranging_data: i={i} msize={msize}, len(self.temp_buffer)={len(self.temp_buffer)}")
+                p_results.update_motion_indicator(self.temp_buffer, i, msize)
 
         if not self.use_raw_format:
             # Convert data into their real format */
@@ -1045,6 +1377,88 @@ class VL53L5CX:
 
         return p_results
 
+    def _numpy_decode_plan(self) -> list:
+        """
+        (field, dtype, offset, count, divisor) for every block of the current frame
+        layout. The layout only changes with start_ranging(), so the plan is built
+        from the block headers of the first frame and cached per data_read_size.
+        """
+        key = (self.data_read_size, self.use_raw_format)
+        if self._decode_plan_key == key:
+            return self._decode_plan
+
+        raw = self.use_raw_format
+        zones = VL53L5CX_RESOLUTION_8X8
+        targets = VL53L5CX_RESOLUTION_8X8 * self.nb_target_per_zone
+        fields = {}
+        if not self.disable_ambient_per_spad:
+            fields[self.VL53L5CX_AMBIENT_RATE_IDX] = ("ambient_per_spad", "<u4", zones, None if raw else 2048)
+        if not self.disable_nb_spads_enabled:
+            fields[self.VL53L5CX_SPAD_COUNT_IDX] = ("nb_spads_enabled", "<u4", zones, None)
+        if not self.disable_nb_target_detected:
+            fields[self.VL53L5CX_NB_TARGET_DETECTED_IDX] = ("nb_target_detected", np.uint8, zones, None)
+        if not self.disable_signal_per_spad:
+            fields[self.VL53L5CX_SIGNAL_RATE_IDX] = ("signal_per_spad", "<u4", targets, None if raw else 2048)
+        if not self.disable_range_sigma_mm:
+            fields[self.VL53L5CX_RANGE_SIGMA_MM_IDX] = ("range_sigma_mm", "<u2", targets, None if raw else 128)
+        if not self.disable_distance_mm:
+            fields[self.VL53L5CX_DISTANCE_IDX] = ("distance_mm", "<i2", targets, None if raw else 4)
+        if not self.disable_reflectance_percent:
+            fields[self.VL53L5CX_REFLECTANCE_EST_PC_IDX] = ("reflectance", np.uint8, targets, None)
+        if not self.disable_target_status:
+            fields[self.VL53L5CX_TARGET_STATUS_IDX] = ("target_status", np.uint8, targets, None)
+
+        plan = []
+        for bh_ptr_idx, i, msize in self._result_blocks():
+            if bh_ptr_idx == self.VL53L5CX_METADATA_IDX:
+                plan.append(("silicon_temp_degc", None, i + 8, 1, None))
+            elif bh_ptr_idx in fields:
+                name, dtype, length, divisor = fields[bh_ptr_idx]
+                plan.append((name, dtype, i, min(msize // np.dtype(dtype).itemsize, length), divisor))
+            elif not self.disable_motion_indicator and bh_ptr_idx == self.VL53L5CX_MOTION_DETEC_IDX and msize >= 12:
+                plan.append(("motion_indicator", None, i, 1, None))
+                plan.append(("motion", "<u4", i + 12, min((msize - 12) // 4, 32), None if raw else 65535))
+
+        self._decode_plan = plan
+        self._decode_plan_key = key
+        return plan
+
+    def _decode_ranging_data_numpy(self, p_results: VL53L5CXResultsArrays = None) -> VL53L5CXResultsArrays:
+        if p_results is None:
+            p_results = VL53L5CXResultsArrays(self.nb_target_per_zone, self.use_raw_format)
+        buf = self.temp_buffer
+
+        # Every field is one strided read out of temp_buffer, with the unit
+        # conversion fused into the copy
+        for name, dtype, offset, count, divisor in self._numpy_decode_plan():
+            if dtype is None:
+                if name == "silicon_temp_degc":
+                    p_results.silicon_temp_degc = buf[offset]
+                else:
+                    (p_results.global_indicator_1, p_results.global_indicator_2, p_results.status,
+                     p_results.nb_of_detected_aggregates, p_results.nb_of_aggregates,
+                     p_results.spare) = struct.unpack_from("<IIBBBB", buf, offset)
+                continue
+
+            out = getattr(p_results, name)
+            values = np.frombuffer(buf, dtype=dtype, count=count, offset=offset)
+            if divisor is None:
+                out[:count] = values
+            else:
+                np.divide(values, divisor, out=out[:count])
+            out[count:] = 0
+
+        if not self.use_raw_format:
+            if not self.disable_distance_mm:
+                np.maximum(p_results.distance_mm, 0, out=p_results.distance_mm)
+
+            # Set target status to 255 if no target is detected for this zone
+            if not self.disable_nb_target_detected and not self.disable_target_status:
+                no_target = p_results.nb_target_detected == 0
+                p_results.target_status.reshape(VL53L5CX_RESOLUTION_8X8, self.nb_target_per_zone)[no_target] = 255
+
+        return p_results
+
     def get_resolution(self) -> int:
         self.dci_read_data(self.temp_buffer, VL53L5CX_DCI_ZONE_CONFIG, 8)
         return self.temp_buffer[0x00] * self.temp_buffer[0x01]
@@ -1082,6 +1496,24 @@ class VL53L5CX:
         self._send_offset_data(resolution)
         self._send_xtalk_data(resolution)
 
+    def motion_indicator_init(self, resolution: int) -> None:
+        """Set up the motion indicator with ST's default configuration (sensor must not be ranging)."""
+        self.motion_config = VL53L5CXMotionConfiguration(resolution)
+        self._write_motion_config()
+
+    def motion_indicator_set_distance_motion(self, distance_min_mm: int, distance_max_mm: int) -> None:
+        self.motion_config.set_distance(distance_min_mm, distance_max_mm)
+        self._write_motion_config()
+
+    def motion_indicator_set_resolution(self, resolution: int) -> None:
+        """Must follow set_resolution() whenever the motion indicator is used."""
+        self.motion_config.set_resolution(resolution)
+        self._write_motion_config()
+
+    def _write_motion_config(self) -> None:
+        config = self.motion_config.pack()
+        self.dci_write_data(config, VL53L5CX_DCI_MOTION_DETECTOR_CFG, len(config))
+
     def get_ranging_frequency_hz(self) -> int:
         self.dci_read_data(self.temp_buffer, VL53L5CX_DCI_FREQ_HZ, 4)
         return self.temp_buffer[0x01]
@@ -1184,9 +1616,7 @@ class VL53L5CX:
             self.swap_buffer(self.temp_buffer, data_size + 12)
 
             # Copy data from FW into input structure (-4 bytes to remove header)
-            for i in range(data_size):
-                data[i] = self.temp_buffer[i + 4]
-            # data[:data_size] = self.temp_buffer[4: data_size + 4]
+            data[:data_size] = self.temp_buffer[4: data_size + 4]
 
     def dci_write_data(self,
                                 data: List[int],
@@ -1211,8 +1641,7 @@ class VL53L5CX:
 
             # Copy data from structure to FW format (+4 bytes to add header)
             self.swap_buffer(data, data_size)
-            for i in range(data_size - 1, -1, -1):
-                self.temp_buffer[i + 4] = data[i]
+            self.temp_buffer[4:data_size + 4] = bytes(data[:data_size])
 
             # Add headers and footer
             self.temp_buffer[:len(headers)] = headers[:]
@@ -1233,5 +1662,5 @@ class VL53L5CX:
                                   new_data_pos: int) -> None:
 
         self.dci_read_data(data, index, data_size)
-        data[new_data_pos: new_data_pos + data_size] = new_data[:new_data_size]
+        data[new_data_pos: new_data_pos + new_data_size] = new_data[:new_data_size]
         self.dci_write_data(data, index, data_size)
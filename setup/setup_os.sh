@@ -45,6 +45,9 @@ fi
 echo "Installing RPi.GPIO and lgpio libraries..."
 pip install RPi.GPIO rpi-lgpio                                      # Install GPIO libraries
 
+echo "Installing smbus2..."
+pip install smbus2                                                 # Install I2C library (ToF sensors)
+
 echo "Installing Adafruit MPU6050 library..."
 pip install adafruit-circuitpython-mpu6050                         # Install IMU library
 
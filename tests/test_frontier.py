@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# Adds the lib directory to the Python path
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import math
+import time
+import numpy as np
+from lib.frontier import FrontierIndex
+from lib.grid_planner import GridPlanner, line_of_sight
+from lib.occupancy import inflate_obstacles, FREE, OCCUPIED
+from lib.map_codec import MapEncoder, MapDecoder
+
+GRID_SHAPE = (80, 80)
+GRID_RESOLUTION = 0.05
+ROBOT_RADIUS = 0.15
+SENSOR_RANGE = 0.8       # m, cells within range and line of sight get known
+TARGET_COVERAGE = 0.9    # Fraction of the reachable room to explore
+MAX_CYCLES = 150
+
+# Same goal selection settings as core/node_pathplanning.py
+FRONTIER_MIN_SIZE = 4
+FRONTIER_GAIN_RADIUS = 0.5
+FRONTIER_COST_WEIGHT = 2.0
+VISITED_RADIUS = 0.3
+
+def check_incremental(rng):
+    """The incrementally updated frontier must match one computed from scratch, also as the window moves."""
+    index = FrontierIndex()
+    world_known = np.zeros((200, 200), dtype=bool)
+    world_free = rng.random((200, 200)) > 0.05
+    row0, col0 = 60, 60
+    updated = []
+    for step in range(60):
+        # Reveal a random blob, sometimes move the window by a few cells
+        r, c = (int(v) for v in rng.integers(20, 180, size=2))
+        world_known[r - 6:r + 7, c - 6:c + 7] = True
+        if step % 5 == 4:
+            row0 += int(rng.integers(-16, 17))
+            col0 += int(rng.integers(-16, 17))
+        window = (slice(row0, row0 + GRID_SHAPE[0]), slice(col0, col0 + GRID_SHAPE[1]))
+        grid = np.where(world_free[window], FREE, OCCUPIED).astype(np.uint8)
+        known = world_known[window]
+        min_x, min_y = col0 * GRID_RESOLUTION, row0 * GRID_RESOLUTION
+
+        index.update(grid, known, min_x, min_y, GRID_RESOLUTION)
+        fresh = FrontierIndex()
+        fresh.update(grid, known, min_x, min_y, GRID_RESOLUTION)
+        if not np.array_equal(index.frontier, fresh.frontier):
+            print(f"Error: incremental frontier differs from a full recomputation at step {step}")
+            return False
+        updated.append(index.updated_cells)
+    print(f"Incremental frontier: {np.mean(updated[1:]):.0f} of {grid.size} cells re-evaluated per update")
+    return True
+
+def check_codec(rng):
+    """The known mask must survive robot/tof_grid encoding, keyframe and delta alike."""
+    encoder, decoder = MapEncoder(keyframe_interval=10), MapDecoder()
+    grid_info = {"resolution": GRID_RESOLUTION, "min_x": -2.0, "min_y": -2.0, "frame": "world"}
+    for _ in range(3):
+        grid = np.where(rng.random(GRID_SHAPE) < 0.02, OCCUPIED, FREE).astype(np.uint8)
+        known = rng.random(GRID_SHAPE) < 0.5
+        decoded = decoder.decode(encoder.encode(grid, grid_info, known=known))["occupancy_grid"]
+        if not np.array_equal(decoded["known"], known) or not np.array_equal(decoded["data"], grid):
+            print("Error: known mask did not survive encoding")
+            return False
+    return True
+
+def check_visited():
+    """The visited memory must stay bounded and be forgotten on a reset."""
+    index = FrontierIndex(max_visited=100)
+    for i in range(150):
+        index.mark_visited(i * 0.1, 0.0)
+    if len(index.visited) != 100 or index.visited[0] != (5.0, 0.0):
+        print("Error: visited places are not bounded to the most recent ones")
+        return False
+    index.update(np.ones(GRID_SHAPE, dtype=np.uint8), np.ones(GRID_SHAPE, dtype=bool), 0.0, 0.0, GRID_RESOLUTION)
+    index.reset()
+    if len(index.visited) or index.frontier is not None:
+        print("Error: reset() did not forget the frontier and the visited places")
+        return False
+    return True
+
+def make_room(rng):
+    """A walled room with a partition wall and a few boxes."""
+    room = np.full(GRID_SHAPE, FREE, dtype=np.uint8)
+    room[:2, :] = room[-2:, :] = room[:, :2] = room[:, -2:] = OCCUPIED
+    room[:50, 40:42] = OCCUPIED
+    for _ in range(6):
+        r, c = (int(v) for v in rng.integers(8, 72, size=2))
+        room[r:r + 5, c:c + 5] = OCCUPIED
+    room[10:16, 8:14] = FREE  # Keep the start area clear
+    return room
+
+def reveal(room, known, cell):
+    """Mark the cells within sensor range and line of sight of `cell` as known."""
+    radius = int(SENSOR_RANGE / GRID_RESOLUTION)
+    r0, r1 = max(cell[0] - radius, 0), min(cell[0] + radius + 1, GRID_SHAPE[0])
+    c0, c1 = max(cell[1] - radius, 0), min(cell[1] + radius + 1, GRID_SHAPE[1])
+    rows, cols = np.mgrid[r0:r1, c0:c1]
+    near = np.hypot(rows - cell[0], cols - cell[1]) <= radius
+    ends = np.stack([rows[near], cols[near]], axis=1)
+    visible = line_of_sight(room, cell, ends)
+    known[ends[visible, 0], ends[visible, 1]] = True
+    # Walls are seen where they border a visible cell
+    seen = np.zeros(GRID_SHAPE, dtype=bool)
+    seen[ends[visible, 0], ends[visible, 1]] = True
+    grown = seen.copy()
+    for dr, dc in [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]:
+        grown[max(dr, 0):GRID_SHAPE[0] + min(dr, 0), max(dc, 0):GRID_SHAPE[1] + min(dc, 0)] |= \
+            seen[max(-dr, 0):GRID_SHAPE[0] + min(-dr, 0), max(-dc, 0):GRID_SHAPE[1] + min(-dc, 0)]
+    known |= grown & (room == OCCUPIED)
+
+def planner_grid(room, known):
+    """What node_map publishes: known obstacles, inflated; unknown cells are free."""
+    grid = np.where(known & (room == OCCUPIED), OCCUPIED, FREE).astype(np.uint8)
+    return inflate_obstacles(grid, ROBOT_RADIUS, GRID_RESOLUTION)
+
+def random_goal(planner, grid, robot, heading, rng):
+    """pick_random_free_cell_in_front from node_pathplanning, on one flood."""
+    planner.flood(robot)
+    reachable = planner.reachable()
+    for _ in range(30):
+        angle = heading + math.radians(rng.uniform(-85.0, 85.0))
+        r = int(robot[0] + 20 * math.sin(angle))
+        c = int(robot[1] + 20 * math.cos(angle))
+        if 0 <= r < GRID_SHAPE[0] and 0 <= c < GRID_SHAPE[1] and reachable[r, c]:
+            return planner.path_to((r, c))
+    return None
+
+def frontier_goal(planner, index, robot):
+    planner.flood(robot)
+    target = index.best_target(planner.cost_field(), FRONTIER_GAIN_RADIUS, FRONTIER_COST_WEIGHT, FRONTIER_MIN_SIZE)
+    return planner.path_to(target.cell) if target is not None else None
+
+def explore(room, mode, rng):
+    """Path cycles (and planning time) until TARGET_COVERAGE of the reachable room is known."""
+    known = np.zeros(GRID_SHAPE, dtype=bool)
+    robot, heading = (12, 10), 0.0
+    reveal(room, known, robot)
+    planner, index = GridPlanner(), FrontierIndex(visited_radius=VISITED_RADIUS)
+    full = GridPlanner()
+    full.set_grid(inflate_obstacles(room, ROBOT_RADIUS, GRID_RESOLUTION))
+    full.flood(robot)
+    explorable = full.reachable() & (room == FREE)
+
+    plan_time = 0.0
+    for cycle in range(1, MAX_CYCLES + 1):
+        grid = planner_grid(room, known)
+        planner.set_grid(grid)
+        t0 = time.perf_counter()
+        path = None
+        if mode == "frontier":
+            index.update(grid, known, 0.0, 0.0, GRID_RESOLUTION)
+            path = frontier_goal(planner, index, robot)
+        if path is None:
+            path = random_goal(planner, grid, robot, heading, rng)
+        plan_time += time.perf_counter() - t0
+
+        if path is None or len(path) < 2:
+            heading += math.pi / 2  # Nothing ahead, turn around
+        else:
+            for cell in path[::4] + [path[-1]]:
+                reveal(room, known, cell)
+            heading = math.atan2(path[-1][0] - path[-2][0], path[-1][1] - path[-2][1])
+            robot = path[-1]
+        if mode == "frontier":
+            index.mark_visited(*index.cell_to_world(*robot))
+
+        coverage = np.count_nonzero(known & explorable) / np.count_nonzero(explorable)
+        if coverage >= TARGET_COVERAGE:
+            return cycle, coverage, plan_time / cycle
+    return MAX_CYCLES, coverage, plan_time / MAX_CYCLES
+
+def test_frontier():
+    rng = np.random.default_rng(0)
+    if not check_incremental(rng) or not check_codec(rng) or not check_visited():
+        return False
+
+    results = {"frontier": [], "random": []}
+    for trial in range(5):
+        room = make_room(np.random.default_rng(trial))
+        for mode in results:
+            results[mode].append(explore(room, mode, np.random.default_rng(100 + trial)))
+    for mode, runs in results.items():
+        cycles = [run[0] for run in runs]
+        print(f"{mode:>8}: {np.mean(cycles):5.1f} path cycles to {TARGET_COVERAGE:.0%} coverage "
+              f"(per room {cycles}), {np.mean([run[2] for run in runs]) * 1000.0:5.1f} ms planning per cycle")
+    if np.mean([run[0] for run in results["frontier"]]) >= np.mean([run[0] for run in results["random"]]):
+        print("Error: frontier exploration did not need fewer path cycles than random goals")
+        return False
+    return True
+
+if __name__ == "__main__":
+    success = test_frontier()
+    sys.exit(0 if success else 1)
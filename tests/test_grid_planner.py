@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+# Adds the lib directory to the Python path
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import math
+import time
+import numpy as np
+from heapq import heappush, heappop
+from lib.grid_planner import GridPlanner, DStarLite, PathCorridor, shorten_path
+from lib.occupancy import inflate_obstacles, clearance_cost, distance_field
+
+GRID_SHAPE = (80, 80)
+GRID_RESOLUTION = 0.05
+ROBOT_RADIUS = 0.2
+NUM_QUERIES = 200
+CLEARANCE_DISTANCE = 0.15
+CLEARANCE_WEIGHT = 2.0
+
+def reference_a_star(grid, start_rc, goal_rc):
+    """The dict-based A* node_pathplanning used before GridPlanner."""
+    def free(r, c):
+        return 0 <= r < grid.shape[0] and 0 <= c < grid.shape[1] and grid[r, c] == 1
+    if not free(*start_rc) or not free(*goal_rc):
+        return None
+    frontier = [(0, start_rc)]
+    came_from = {start_rc: None}
+    cost_so_far = {start_rc: 0}
+    while frontier:
+        _, current = heappop(frontier)
+        if current == goal_rc:
+            path = []
+            while current is not None:
+                path.append(current)
+                current = came_from[current]
+            return path[::-1]
+        for dr, dc in [(-1,0),(1,0),(0,-1),(0,1),(-1,-1),(-1,1),(1,-1),(1,1)]:
+            nxt = (current[0] + dr, current[1] + dc)
+            if free(*nxt):
+                cost = cost_so_far[current] + (math.sqrt(2) if dr and dc else 1)
+                if nxt not in cost_so_far or cost < cost_so_far[nxt]:
+                    cost_so_far[nxt] = cost
+                    came_from[nxt] = current
+                    heappush(frontier, (cost + math.hypot(nxt[0] - goal_rc[0], nxt[1] - goal_rc[1]), nxt))
+    return None
+
+def path_cost(path):
+    return sum(math.hypot(b[0] - a[0], b[1] - a[1]) for a, b in zip(path, path[1:]))
+
+def valid_path(grid, path, start_rc, goal_rc):
+    steps_ok = all(max(abs(b[0] - a[0]), abs(b[1] - a[1])) == 1 for a, b in zip(path, path[1:]))
+    return path[0] == start_rc and path[-1] == goal_rc and steps_ok and all(grid[r, c] == 1 for r, c in path)
+
+def weighted_cost(path, cell_cost):
+    return sum(math.hypot(b[0] - a[0], b[1] - a[1]) * (1.0 + cell_cost[b]) for a, b in zip(path, path[1:]))
+
+def random_grid(rng, obstacle_fraction):
+    grid = np.ones(GRID_SHAPE, dtype=np.uint8)
+    grid[rng.random(GRID_SHAPE) < obstacle_fraction] = 0
+    return inflate_obstacles(grid, ROBOT_RADIUS, GRID_RESOLUTION)
+
+def random_queries(rng, grid, count):
+    free = np.argwhere(grid == 1)
+    picks = rng.integers(len(free), size=(count, 2))
+    return [(tuple(int(v) for v in free[a]), tuple(int(v) for v in free[b])) for a, b in picks]
+
+def add_obstacle(rng, grid, free_grid):
+    """Drop a small inflated obstacle somewhere on the grid, or clear one again."""
+    r, c = (int(v) for v in rng.integers(4, GRID_SHAPE[0] - 4, size=2))
+    changed = grid.copy()
+    if rng.random() < 0.7:
+        changed[r - 4:r + 5, c - 4:c + 5] = 0
+    else:
+        changed[r - 4:r + 5, c - 4:c + 5] = free_grid[r - 4:r + 5, c - 4:c + 5]
+    return changed
+
+def check_incremental(rng):
+    """D* Lite repairs must stay as short as a fresh A* search after every grid change."""
+    planner, incremental = GridPlanner(), DStarLite()
+    repair_expanded = full_expanded = repairs = 0
+    repair_s = full_s = 0.0
+    for _ in range(10):
+        base = random_grid(rng, 0.002)
+        grid = base
+        (start, goal), = random_queries(rng, grid, 1)
+        incremental.set_grid(grid)
+        path = incremental.plan(start, goal)
+        for _ in range(20):
+            if path is not None and len(path) > 3:
+                start = path[2]  # The robot moved on along the path
+            grid = add_obstacle(rng, grid, base)
+            t0 = time.perf_counter()
+            incremental.set_grid(grid)
+            path = incremental.plan(start, goal)
+            t1 = time.perf_counter()
+            planner.set_grid(grid)
+            expected = planner.plan(start, goal)
+            t2 = time.perf_counter()
+            if (expected is None) != (path is None) or (
+                    path is not None and (not valid_path(grid, path, start, goal)
+                                          or abs(path_cost(path) - path_cost(expected)) > 1e-9)):
+                print(f"Error: D* Lite repair {start} -> {goal} differs from A*")
+                return False
+            repairs += 1
+            repair_expanded += incremental.expanded
+            full_expanded += planner.expanded
+            repair_s += t1 - t0
+            full_s += t2 - t1
+    print(f"Incremental repairs: {repair_expanded / repairs:6.1f} cells expanded, "
+          f"{repair_s / repairs * 1000.0:6.3f} ms; full A*: {full_expanded / repairs:6.1f} cells, "
+          f"{full_s / repairs * 1000.0:6.3f} ms per replan")
+    return True
+
+def check_window_shift(rng):
+    """D* Lite must follow a grid window that moves with the robot and stay as short as A*."""
+    world = np.ones((240, 240), dtype=np.uint8)
+    world[rng.random(world.shape) < 0.002] = 0
+    world = inflate_obstacles(world, ROBOT_RADIUS, GRID_RESOLUTION)
+    planner, incremental = GridPlanner(), DStarLite()
+    robot, goal = (120, 120), None
+    shift_changed, shift_s, shifts, full_s = [], 0.0, 0, 0.0
+    origin = None
+    for step in range(150):
+        # The window is centred near the robot and moves in steps of 16 cells, as in node_map
+        new_origin = tuple(min(max(int(round((v - GRID_SHAPE[0] / 2) / 16) * 16), 0), world.shape[0] - GRID_SHAPE[0])
+                           for v in robot)
+        shifted = origin is not None and new_origin != origin
+        origin = new_origin
+        window = world[origin[0]:origin[0] + GRID_SHAPE[0], origin[1]:origin[1] + GRID_SHAPE[1]]
+        if rng.random() < 0.2:
+            window = add_obstacle(rng, window, window)
+        start = (robot[0] - origin[0], robot[1] - origin[1])
+        if goal is None or not (0 <= goal[0] - origin[0] < GRID_SHAPE[0] and 0 <= goal[1] - origin[1] < GRID_SHAPE[1]) \
+                or window[goal[0] - origin[0], goal[1] - origin[1]] != 1 or goal == robot:
+            (_, local_goal), = random_queries(rng, window, 1)
+            goal = (local_goal[0] + origin[0], local_goal[1] + origin[1])
+        goal_rc = (goal[0] - origin[0], goal[1] - origin[1])
+
+        t0 = time.perf_counter()
+        incremental.set_grid(window, origin=origin)
+        path = incremental.plan(start, goal_rc)
+        t1 = time.perf_counter()
+        planner.set_grid(window)
+        expected = planner.plan(start, goal_rc)
+        t2 = time.perf_counter()
+        if (expected is None) != (path is None) or (
+                path is not None and (not valid_path(window, path, start, goal_rc)
+                                      or abs(path_cost(path) - path_cost(expected)) > 1e-9)):
+            print(f"Error: D* Lite after a window move {start} -> {goal_rc} differs from A*")
+            return False
+        if shifted:
+            shifts += 1
+            shift_changed.append(incremental.changed_cells)
+            shift_s += t1 - t0
+            full_s += t2 - t1
+        if path is None or len(path) < 2:
+            goal = None
+        else:
+            robot = (path[min(4, len(path) - 1)][0] + origin[0], path[min(4, len(path) - 1)][1] + origin[1])
+    print(f"Window moves: {shifts}, {np.mean(shift_changed):.0f} of {window.size} cells re-examined, "
+          f"D* Lite {shift_s / shifts * 1000.0:6.3f} ms vs full A* {full_s / shifts * 1000.0:6.3f} ms per replan")
+    return True
+
+def check_clearance(rng):
+    """With the clearance cost, paths keep further from inflated space, and D* Lite agrees with A*."""
+    planner, incremental = GridPlanner(), DStarLite()
+    plain_clearance, soft_clearance, plain_length, soft_length = [], [], [], []
+    for _ in range(20):
+        grid = random_grid(rng, 0.004)
+        cell_cost = clearance_cost(grid, GRID_RESOLUTION, CLEARANCE_DISTANCE, CLEARANCE_WEIGHT)
+        clearance = distance_field(grid == 0) * GRID_RESOLUTION
+        (start, goal), = random_queries(rng, grid, 1)
+
+        planner.set_grid(grid)
+        plain = planner.plan(start, goal)
+        planner.set_grid(grid, cell_cost)
+        soft = planner.plan(start, goal)
+        incremental.set_grid(grid, cell_cost)
+        repaired = incremental.plan(start, goal)
+        if plain is None:
+            continue
+        if repaired is None or abs(weighted_cost(repaired, cell_cost) - weighted_cost(soft, cell_cost)) > 1e-9:
+            print(f"Error: D* Lite and A* disagree on the clearance-weighted path {start} -> {goal}")
+            return False
+        # Start and goal may sit next to obstacles, judge the path in between
+        plain_clearance.append(np.mean([clearance[cell] for cell in plain[1:-1]] or [0.0]))
+        soft_clearance.append(np.mean([clearance[cell] for cell in soft[1:-1]] or [0.0]))
+        plain_length.append(path_cost(plain))
+        soft_length.append(path_cost(soft))
+
+    print(f"Mean clearance along paths: {np.mean(plain_clearance):.3f} m without, "
+          f"{np.mean(soft_clearance):.3f} m with clearance cost "
+          f"(length {np.mean(plain_length):.1f} vs {np.mean(soft_length):.1f} cells)")
+    if np.mean(soft_clearance) <= np.mean(plain_clearance):
+        print("Error: the clearance cost did not move paths away from obstacles")
+        return False
+    return True
+
+def check_flood(rng):
+    """One flood must answer reachability and shortest paths like one A* per goal."""
+    planner, flooded = GridPlanner(), GridPlanner()
+    for fraction in [0.002, 0.01]:
+        grid = random_grid(rng, fraction)
+        cell_cost = clearance_cost(grid, GRID_RESOLUTION, CLEARANCE_DISTANCE, CLEARANCE_WEIGHT)
+        planner.set_grid(grid, cell_cost)
+        flooded.set_grid(grid, cell_cost)
+        (start, _), = random_queries(rng, grid, 1)
+        flooded.flood(start)
+        reachable = flooded.reachable()
+        goals = [goal for _, goal in random_queries(rng, grid, 30)]
+        for goal in goals:
+            expected = planner.plan(start, goal)
+            path = flooded.path_to(goal)
+            if (expected is None) != (path is None) or reachable[goal] != (path is not None) or (
+                    path is not None and (not valid_path(grid, path, start, goal)
+                                          or abs(weighted_cost(path, cell_cost) - weighted_cost(expected, cell_cost)) > 1e-9)):
+                print(f"Error: flood path {start} -> {goal} differs from A*")
+                return False
+
+        # Worst case for goal sampling: 30 tries that all end up unreachable
+        walled = grid.copy()
+        walled[:, GRID_SHAPE[1] // 2] = 0
+        left = [(r, c) for r, c in np.argwhere(walled == 1).tolist() if c < GRID_SHAPE[1] // 2]
+        right = [(r, c) for r, c in np.argwhere(walled == 1).tolist() if c > GRID_SHAPE[1] // 2]
+        start = left[len(left) // 2]
+        targets = [right[i] for i in rng.integers(len(right), size=30)]
+        planner.set_grid(walled, None)
+        t0 = time.perf_counter()
+        for goal in targets:
+            planner.plan(start, goal)
+        t1 = time.perf_counter()
+        flooded.set_grid(walled, None)
+        flooded.flood(start)
+        reachable = flooded.reachable()
+        found = [goal for goal in targets if reachable[goal]]
+        t2 = time.perf_counter()
+        if found:
+            print("Error: flood reached cells behind the wall")
+            return False
+        print(f"{np.count_nonzero(grid == 0)} occupied cells, 30 unreachable goals: "
+              f"{(t1 - t0) * 1000.0:7.2f} ms of A*, {(t2 - t1) * 1000.0:6.2f} ms for one flood")
+    return True
+
+def check_corridor(rng):
+    """The corridor check must find the first blocked cell of a path, also between sparse waypoints."""
+    planner = GridPlanner()
+    timings = []
+    for _ in range(20):
+        grid = random_grid(rng, 0.002)
+        planner.set_grid(grid)
+        (start, goal), = random_queries(rng, grid, 1)
+        path = planner.plan(start, goal)
+        if path is None or len(path) < 10:
+            continue
+        path_xy = [((c + 0.5) * GRID_RESOLUTION, (r + 0.5) * GRID_RESOLUTION) for r, c in path]
+        corridor = PathCorridor(path_xy, spacing=GRID_RESOLUTION / 2.0)
+        if corridor.first_blocked(grid, 0.0, 0.0, GRID_RESOLUTION) is not None:
+            print("Error: a fresh path is reported as blocked")
+            return False
+
+        # Block one cell in the second half of the path
+        blocked = int(rng.integers(len(path) // 2, len(path)))
+        changed = grid.copy()
+        changed[path[blocked]] = 0
+        t0 = time.perf_counter()
+        found = corridor.first_blocked(changed, 0.0, 0.0, GRID_RESOLUTION)
+        timings.append(time.perf_counter() - t0)
+        # The segment leading into the blocked cell already crosses it
+        if found not in (blocked - 1, blocked):
+            print(f"Error: blocked path point {blocked} reported as {found}")
+            return False
+        behind = int(np.searchsorted(corridor.sample_index, blocked + 1))
+        if corridor.first_blocked(changed, 0.0, 0.0, GRID_RESOLUTION, from_sample=behind) is not None:
+            print("Error: an obstacle behind the robot is reported")
+            return False
+
+        # With only start and goal left the cells in between are still checked
+        sparse = PathCorridor([path_xy[0], path_xy[-1]], spacing=GRID_RESOLUTION / 2.0)
+        line = changed.copy()
+        middle = sparse.samples[len(sparse.samples) // 2] / GRID_RESOLUTION
+        line[int(middle[1]), int(middle[0])] = 0
+        if sparse.first_blocked(line, 0.0, 0.0, GRID_RESOLUTION) != 0:
+            print("Error: obstacle between two waypoints not found")
+            return False
+    print(f"Corridor check: {np.mean(timings) * 1e6:6.1f} us per grid")
+    return True
+
+def simplify_path(path_rc, max_waypoints=4):
+    """The fixed 1/3 and 2/3 waypoint choice node_pathplanning used before shorten_path."""
+    if len(path_rc) <= max_waypoints:
+        return path_rc
+    return [path_rc[0], path_rc[len(path_rc) // 3], path_rc[(2 * len(path_rc)) // 3], path_rc[-1]]
+
+def segments_blocked(grid, waypoints):
+    """Number of straight segments between waypoints that cross an occupied cell (finely sampled)."""
+    blocked = 0
+    for a, b in zip(waypoints, waypoints[1:]):
+        # Offset samples never land exactly on a cell corner, which a segment may pass
+        t = ((np.arange(1000) + 0.37) / 1000.0)[:, np.newaxis]
+        cells = np.floor(np.array(a) + t * (np.array(b) - np.array(a)) + 0.5).astype(int)
+        blocked += bool((grid[cells[:, 0], cells[:, 1]] == 0).any())
+    return blocked
+
+def check_shortening(rng):
+    """String pulling must give collision-free segments, with no more turns than needed."""
+    planner = GridPlanner()
+    stats = {"old": [0, 0, 0.0], "new": [0, 0, 0.0]}  # blocked segments, waypoints, length
+    for _ in range(40):
+        grid = random_grid(rng, 0.006)
+        planner.set_grid(grid)
+        (start, goal), = random_queries(rng, grid, 1)
+        path = planner.plan(start, goal)
+        if path is None:
+            continue
+        for name, waypoints in [("old", simplify_path(path)), ("new", shorten_path(grid, path))]:
+            if waypoints[0] != start:
+                print(f"Error: {name} waypoints do not start at the robot")
+                return False
+            stats[name][0] += segments_blocked(grid, waypoints)
+            stats[name][1] += len(waypoints)
+            stats[name][2] += path_cost(waypoints)
+        shortened = shorten_path(grid, path)
+        if shortened[-1] != goal or path_cost(shortened) > path_cost(path) + 1e-9:
+            print("Error: shortened path does not reach the goal or got longer")
+            return False
+        capped = shorten_path(grid, path, max_waypoints=3)
+        if len(capped) > 3 or capped != shortened[:len(capped)]:
+            print("Error: max_waypoints does not cut the shortened path")
+            return False
+
+    for name, label in [("old", "simplify_path"), ("new", "shorten_path")]:
+        blocked, count, length = stats[name]
+        print(f"{label:>13}: {blocked:3d} segments through occupied cells, "
+              f"{count} waypoints, {length:.0f} cells long in total")
+    if stats["new"][0] != 0:
+        print("Error: shorten_path produced a segment through an occupied cell")
+        return False
+    return True
+
+def block_grid(rng, count):
+    """Inflated grid of `count` random rectangular obstacles."""
+    grid = np.ones(GRID_SHAPE, dtype=np.uint8)
+    for _ in range(count):
+        r, c = (int(v) for v in rng.integers(0, GRID_SHAPE[0] - 4, size=2))
+        height, width = (int(v) for v in rng.integers(2, 10, size=2))
+        grid[r:r + height, c:c + width] = 0
+    return inflate_obstacles(grid, ROBOT_RADIUS, GRID_RESOLUTION)
+
+def segments_clearance(clearance, waypoints):
+    """Smallest clearance along the straight segments between waypoints (finely sampled)."""
+    t = ((np.arange(1000) + 0.37) / 1000.0)[:, np.newaxis]
+    return min(clearance[tuple(np.floor(np.array(a) + t * (np.array(b) - np.array(a)) + 0.5).astype(int).T)].min()
+               for a, b in zip(waypoints, waypoints[1:]))
+
+def check_shortening_clearance(rng):
+    """Shortcuts of a clearance-weighted path must not get closer to obstacles than the path itself."""
+    planner = GridPlanner()
+    dense, plain, kept = [], [], []
+    for _ in range(100):
+        grid = block_grid(rng, 20)
+        cell_cost = clearance_cost(grid, GRID_RESOLUTION, CLEARANCE_DISTANCE, CLEARANCE_WEIGHT)
+        clearance = distance_field(grid == 0) * GRID_RESOLUTION
+        (start, goal), = random_queries(rng, grid, 1)
+        planner.set_grid(grid, cell_cost)
+        path = planner.plan(start, goal)
+        if path is None or len(path) < 3:
+            continue
+        dense.append(min(clearance[cell] for cell in path))
+        plain.append(segments_clearance(clearance, shorten_path(grid, path)))
+        kept.append(segments_clearance(clearance, shorten_path(grid, path, cell_cost=cell_cost)))
+        # Beyond CLEARANCE_DISTANCE the cost is flat, closer in it must not get tighter
+        if kept[-1] < min(dense[-1], CLEARANCE_DISTANCE) - 1e-9:
+            print(f"Error: shortened path {start} -> {goal} comes closer to obstacles than the planned path")
+            return False
+    print(f"Smallest clearance along paths: {np.mean(dense):.3f} m planned, {np.mean(plain):.3f} m shortened "
+          f"on line of sight only, {np.mean(kept):.3f} m shortened with the clearance cost")
+    return True
+
+def test_grid_planner():
+    rng = np.random.default_rng(0)
+    planner = GridPlanner()
+
+    # Same reachability and optimal cost as the reference on sparse and cluttered grids
+    for fraction in [0.002, 0.01]:
+        grid = random_grid(rng, fraction)
+        planner.set_grid(grid)
+        queries = random_queries(rng, grid, NUM_QUERIES)
+        for start, goal in queries:
+            expected = reference_a_star(grid, start, goal)
+            path = planner.plan(start, goal)
+            if (expected is None) != (path is None):
+                print(f"Error: reachability of {start} -> {goal} differs from the reference")
+                return False
+            if path is not None and (not valid_path(grid, path, start, goal)
+                                     or abs(path_cost(path) - path_cost(expected)) > 1e-9):
+                print(f"Error: path {start} -> {goal} is invalid or not optimal")
+                return False
+
+        start = time.perf_counter()
+        for s, g in queries:
+            reference_a_star(grid, s, g)
+        reference_ms = (time.perf_counter() - start) / len(queries) * 1000.0
+        start = time.perf_counter()
+        for s, g in queries:
+            planner.plan(s, g)
+        planner_ms = (time.perf_counter() - start) / len(queries) * 1000.0
+        print(f"{np.count_nonzero(grid == 0)} occupied cells: reference {reference_ms:6.3f} ms, "
+              f"GridPlanner {planner_ms:6.3f} ms per query")
+
+    # Cells off the grid or occupied have no path
+    if planner.plan((-1, 0), (5, 5)) is not None or planner.plan((0, 0), (GRID_SHAPE[0], 0)) is not None:
+        print("Error: out-of-grid query returned a path")
+        return False
+    return (check_incremental(rng) and check_window_shift(rng) and check_clearance(rng) and check_flood(rng)
+            and check_corridor(rng) and check_shortening(rng) and check_shortening_clearance(rng))
+
+if __name__ == "__main__":
+    success = test_grid_planner()
+    sys.exit(0 if success else 1)
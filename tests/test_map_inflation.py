@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# Adds the lib directory to the Python path
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import time
+import numpy as np
+from lib.occupancy import inflate_obstacles, INFLATION_BACKENDS
+
+GRID_SHAPE = (80, 80)
+GRID_RESOLUTION = 0.05
+ROBOT_RADIUS = 0.2
+
+def random_grid(obstacle_fraction, rng):
+    grid = np.ones(GRID_SHAPE, dtype=np.uint8)
+    grid[rng.random(GRID_SHAPE) < obstacle_fraction] = 0
+    return grid
+
+def time_backend(grid, backend, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        inflate_obstacles(grid, ROBOT_RADIUS, GRID_RESOLUTION, backend=backend)
+    return (time.perf_counter() - start) / repeats * 1000.0
+
+def test_map_inflation():
+    rng = np.random.default_rng(0)
+
+    # Every backend must reproduce the reference loop cell for cell
+    print("Checking backends against the reference loop...")
+    for radius, resolution in [(0.2, 0.05), (0.15, 0.05), (0.3, 0.1), (0.25, 0.04)]:
+        for fraction in [0.0, 0.001, 0.01, 0.05]:
+            grid = random_grid(fraction, rng)
+            reference = inflate_obstacles(grid, radius, resolution, backend="loop")
+            for backend in INFLATION_BACKENDS:
+                result = inflate_obstacles(grid, radius, resolution, backend=backend)
+                if not np.array_equal(result, reference):
+                    mismatched = np.count_nonzero(result != reference)
+                    print(f"Error: backend '{backend}' differs in {mismatched} cells "
+                          f"(radius={radius}, resolution={resolution}, fraction={fraction})")
+                    return False
+    print("All backends match the reference output.")
+
+    # Timing on a sparse and a cluttered 80x80 grid
+    for fraction in [0.01, 0.05]:
+        grid = random_grid(fraction, rng)
+        print(f"\n{np.count_nonzero(grid == 0)} obstacle cells:")
+        for backend in INFLATION_BACKENDS:
+            repeats = 3 if backend == "loop" else 200
+            print(f"  {backend:>5}: {time_backend(grid, backend, repeats):8.3f} ms")
+
+    return True
+
+if __name__ == "__main__":
+    success = test_map_inflation()
+    sys.exit(0 if success else 1)
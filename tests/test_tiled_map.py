@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# Adds the lib directory to the Python path
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import tempfile
+import time
+import numpy as np
+from lib.occupancy import LogOddsGrid
+from lib.tiled_map import TiledLogOddsMap
+
+GRID_RESOLUTION = 0.05
+NUM_BEAMS = 192
+
+def random_beams(rng, centre=(0.0, 0.0), spread=1.9):
+    origins = rng.uniform(-0.3, 0.3, (NUM_BEAMS, 2)) + centre
+    endpoints = rng.uniform(-spread, spread, (NUM_BEAMS, 2)) + centre
+    hits = rng.random(NUM_BEAMS) < 0.4
+    return origins, endpoints, hits
+
+def test_tiled_map():
+    rng = np.random.default_rng(0)
+    directory = tempfile.mkdtemp()
+
+    # The tiled map must match the dense grid over the dense grid's extent
+    dense = LogOddsGrid((80, 80), -2.0, -2.0, GRID_RESOLUTION)
+    tiled = TiledLogOddsMap(GRID_RESOLUTION, tile_size=16, directory=directory)
+    for _ in range(50):
+        beams = random_beams(rng)
+        dense.integrate(*beams)
+        tiled.integrate(*beams)
+    window = tiled.log_odds_window(-40, -40, 80, 80)
+    if not np.array_equal(window, dense.log_odds):
+        print(f"Error: tiled map differs from the dense grid in {np.count_nonzero(window != dense.log_odds)} cells")
+        return False
+    print(f"Tiled map matches the dense grid ({len(tiled.tiles)} tiles).")
+
+    # Reopening the directory must give back the same map
+    tiled.flush()
+    reopened = TiledLogOddsMap(GRID_RESOLUTION, tile_size=16, directory=directory)
+    if not np.array_equal(reopened.log_odds_window(-40, -40, 80, 80), window):
+        print("Error: map reloaded from disk differs")
+        return False
+    print("Map reloaded from disk.")
+
+    # With only a few tiles kept open, evicted tiles must come back unchanged,
+    # whether they were memory-mapped or spilled from memory
+    for evict_directory in (tempfile.mkdtemp(), None):
+        beam_rng = np.random.default_rng(0)  # The beams of the first map
+        small = TiledLogOddsMap(GRID_RESOLUTION, tile_size=16, directory=evict_directory, max_tiles=4)
+        for _ in range(50):
+            small.integrate(*random_beams(beam_rng))
+        if len(small.tiles) > 4:
+            print(f"Error: {len(small.tiles)} tiles open, at most 4 allowed")
+            return False
+        if not np.array_equal(small.log_odds_window(-40, -40, 80, 80), window):
+            print(f"Error: map with evicted tiles differs (directory={evict_directory})")
+            return False
+        small.clear()
+    print("Evicted tiles reloaded unchanged.")
+
+    # Loop time must not grow with the explored area: drive 20 m in a straight line
+    tiled = TiledLogOddsMap(GRID_RESOLUTION, tile_size=64)
+    times = []
+    for step in range(200):
+        centre = (step * 0.1, 0.0)
+        beams = random_beams(rng, centre)
+        start = time.perf_counter()
+        tiled.integrate(*beams)
+        col0, row0 = tiled.window_origin(*centre, 80, 80)
+        tiled.occupancy(col0, row0, 80, 80)
+        times.append(time.perf_counter() - start)
+    print(f"{len(tiled.tiles)} tiles after 20 m; first 20 frames {np.mean(times[:20]) * 1000:.2f} ms, "
+          f"last 20 frames {np.mean(times[-20:]) * 1000:.2f} ms")
+    return True
+
+if __name__ == "__main__":
+    success = test_tiled_map()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# Adds the lib directory to the Python path
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from lib.tof_filter import ToFZoneFilter
+
+NUM_ZONES = 64
+NUM_FRAMES = 200
+
+def synthetic_frames(rng):
+    """A wall at 1.2 m with range noise, 5% single-frame dropouts and 2% ghost returns."""
+    for _ in range(NUM_FRAMES):
+        sigma = rng.uniform(5.0, 25.0, NUM_ZONES)
+        distance = 1200.0 + rng.normal(0.0, sigma)
+        status = np.full(NUM_ZONES, 5)
+        status[rng.random(NUM_ZONES) < 0.05] = 255
+        ghosts = rng.random(NUM_ZONES) < 0.02
+        distance[ghosts] = rng.uniform(200.0, 600.0, np.count_nonzero(ghosts))
+        sigma[ghosts] = 50.0
+        signal = np.where(ghosts, 2.0, 40.0)
+        yield distance, status, sigma, signal
+
+def count_flips(valid_frames, obstacle_frames):
+    valid_flips = np.count_nonzero(np.diff(np.array(valid_frames), axis=0))
+    obstacle_flips = np.count_nonzero(np.diff(np.array(obstacle_frames), axis=0))
+    return valid_flips, obstacle_flips
+
+def test_tof_filter():
+    rng = np.random.default_rng(0)
+    zone_filter = ToFZoneFilter(1, NUM_ZONES)
+
+    raw_valid, raw_near, filtered_valid, filtered_near = [], [], [], []
+    raw_error, filtered_error = [], []
+    for distance, status, sigma, signal in synthetic_frames(rng):
+        valid = status == 5
+        raw_valid.append(valid)
+        raw_near.append(valid & (distance < 1000.0))
+        raw_error.append(np.abs(distance[valid] - 1200.0).mean())
+
+        ranges, f_valid = zone_filter.update(0, distance, status, sigma, signal)
+        filtered_valid.append(f_valid)
+        filtered_near.append(f_valid & (ranges < 1000.0))
+        filtered_error.append(np.abs(ranges[f_valid & (ranges > 1000.0)] - 1200.0).mean())
+
+    raw_flips = count_flips(raw_valid, raw_near)
+    filtered_flips = count_flips(filtered_valid, filtered_near)
+    print(f"Validity flips:      raw {raw_flips[0]:5d}, filtered {filtered_flips[0]:5d}")
+    print(f"Near-obstacle flips: raw {raw_flips[1]:5d}, filtered {filtered_flips[1]:5d}")
+    print(f"Mean range error:    raw {np.mean(raw_error):6.1f} mm, filtered {np.mean(filtered_error):6.1f} mm")
+    if filtered_flips[0] >= raw_flips[0] or filtered_flips[1] >= raw_flips[1]:
+        print("Error: filter did not reduce flips")
+        return False
+
+    # A real step must be followed once confirmed, not averaged away
+    zone_filter.reset()
+    status = np.full(NUM_ZONES, 5)
+    for _ in range(4):
+        zone_filter.update(0, np.full(NUM_ZONES, 1200.0), status, np.full(NUM_ZONES, 10.0), np.full(NUM_ZONES, 40.0))
+    for _ in range(zone_filter.min_valid):
+        ranges, valid = zone_filter.update(0, np.full(NUM_ZONES, 400.0), status,
+                                           np.full(NUM_ZONES, 10.0), np.full(NUM_ZONES, 40.0))
+    if not (valid.all() and np.allclose(ranges, 400.0)):
+        print("Error: filter did not follow a step change")
+        return False
+    print(f"Step change followed after {zone_filter.min_valid} frames.")
+    return True
+
+if __name__ == "__main__":
+    success = test_tof_filter()
+    sys.exit(0 if success else 1)
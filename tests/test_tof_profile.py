@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# Adds the lib directory to the Python path
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from lib.tof_profile import RangingProfile, AdaptiveRangingController
+from lib.pose_history import PoseHistory
+
+DENSE = RangingProfile("dense", 64, 15)
+FAST = RangingProfile("fast", 16, 30)
+DT = 0.2  # robot/odometry arrives at 5 Hz
+
+def drive(controller, speeds, rng):
+    """Feed a speed profile (with odometry noise) through PoseHistory; return the profile per step."""
+    history = PoseHistory()
+    x, profiles = 0.0, []
+    for step, speed in enumerate(speeds):
+        now = step * DT
+        x += speed * DT
+        history.add(now, x + rng.normal(0.0, 0.005), 0.0, 0.0)
+        measured_speed, turn_rate = history.velocity(0.5)
+        controller.update(measured_speed, turn_rate, now)
+        profiles.append(controller.profile.name)
+    return profiles
+
+def test_tof_profile():
+    rng = np.random.default_rng(0)
+
+    # Stopped, accelerate to 0.4 m/s, cruise, stop again
+    speeds = [0.0] * 10 + list(np.linspace(0.0, 0.4, 10)) + [0.4] * 20 + [0.0] * 20
+    controller = AdaptiveRangingController(DENSE, FAST, settle_time=1.0)
+    profiles = drive(controller, speeds, rng)
+    print(f"Accelerate/cruise/stop: {controller.switches} switches, "
+          f"fast from step {profiles.index('fast')}, dense again from step {profiles.index('dense', 20)}")
+    if controller.switches != 2 or profiles[-1] != "dense" or "fast" not in profiles[20:40]:
+        print("Error: expected one switch to the fast profile and one back")
+        return False
+
+    # Hovering around the switching speed must not flap between resolutions
+    speeds = list(0.2 + 0.08 * np.sin(np.arange(100) * 0.7))
+    controller = AdaptiveRangingController(DENSE, FAST, settle_time=1.0)
+    drive(controller, speeds, rng)
+    print(f"Speed oscillating around 0.2 m/s: {controller.switches} switches in {len(speeds)} updates")
+    if controller.switches > 2:
+        print("Error: controller flaps between profiles")
+        return False
+    return True
+
+if __name__ == "__main__":
+    success = test_tof_profile()
+    sys.exit(0 if success else 1)
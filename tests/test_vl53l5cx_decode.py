@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# Adds the lib directory to the Python path
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import struct
+import time
+import numpy as np
+from lib.vl53l5cx_lib.vl53l5cx import VL53L5CX
+from lib.vl53l5cx_lib.api import VL53L5CX_RESOLUTION_4X4, VL53L5CX_RESOLUTION_8X8
+
+def synthetic_frame(sensor, resolution, rng):
+    """Fill sensor.temp_buffer with a decoded-order (already byte-swapped) frame of random results."""
+    blocks = [
+        (None, sensor.VL53L5CX_METADATA_BH, rng.integers(0, 256, 12, dtype=np.uint8)),
+        (None, sensor.VL53L5CX_COMMONDATA_BH, rng.integers(0, 256, 4, dtype=np.uint8)),
+        ("ambient_per_spad", sensor.VL53L5CX_AMBIENT_RATE_BH, rng.integers(0, 1 << 20, resolution, dtype=np.uint32)),
+        ("nb_spads_enabled", sensor.VL53L5CX_SPAD_COUNT_BH, rng.integers(0, 1 << 16, resolution, dtype=np.uint32)),
+        ("nb_target_detected", sensor.VL53L5CX_NB_TARGET_DETECTED_BH, rng.integers(0, 2, resolution, dtype=np.uint8)),
+        ("signal_per_spad", sensor.VL53L5CX_SIGNAL_RATE_BH, rng.integers(0, 1 << 20, resolution, dtype=np.uint32)),
+        ("range_sigma_mm", sensor.VL53L5CX_RANGE_SIGMA_MM_BH, rng.integers(0, 1 << 13, resolution, dtype=np.uint16)),
+        ("distance_mm", sensor.VL53L5CX_DISTANCE_BH, rng.integers(-200, 16000, resolution, dtype=np.int16)),
+        ("reflectance_percent", sensor.VL53L5CX_REFLECTANCE_BH, rng.integers(0, 100, resolution, dtype=np.uint8)),
+        ("target_status", sensor.VL53L5CX_TARGET_STATUS_BH, rng.choice([5, 6, 9, 10, 255], resolution).astype(np.uint8)),
+        ("motion_indicator", sensor.VL53L5CX_MOTION_DETECT_BH, rng.integers(0, 256, 140, dtype=np.uint8)),
+    ]
+    # Disabled outputs are left out of the frame, as the sensor does
+    blocks = [(bh, values) for name, bh, values in blocks
+              if name is None or not getattr(sensor, "disable_" + name)]
+    frame = bytearray(16)
+    for bh, values in blocks:
+        bh_type = bh & 0x0f
+        if 0x1 <= bh_type < 0x0d:
+            bh = bh & 0xffff000f | (len(values) << 4) & 0xfff0
+        frame += struct.pack("<I", bh) + values.tobytes()
+    frame += bytes(8)
+
+    if len(frame) != sensor._output_config(resolution)[2]:
+        raise AssertionError(f"synthetic frame is {len(frame)} bytes, sensor expects "
+                             f"{sensor._output_config(resolution)[2]}")
+    sensor.data_read_size = len(frame)
+    sensor.temp_buffer[:len(frame)] = frame
+
+def results_equal(list_results, array_results):
+    for name, value in vars(list_results).items():
+        if not np.array_equal(np.asarray(value), np.asarray(getattr(array_results, name))):
+            print(f"Error: field '{name}' differs")
+            return False
+    return True
+
+def time_decode(decode, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        decode()
+    return (time.perf_counter() - start) / repeats * 1e6
+
+def test_vl53l5cx_decode():
+    rng = np.random.default_rng(0)
+    sensor = VL53L5CX(i2c_bus=object(), use_numpy_results=True)
+
+    for resolution in (VL53L5CX_RESOLUTION_4X4, VL53L5CX_RESOLUTION_8X8):
+        for use_raw_format in (False, True):
+            sensor.use_raw_format = use_raw_format
+            for _ in range(20):
+                synthetic_frame(sensor, resolution, rng)
+                if not results_equal(sensor._decode_ranging_data(), sensor._decode_ranging_data_numpy()):
+                    print(f"(resolution={resolution}, use_raw_format={use_raw_format})")
+                    return False
+    print("NumPy decoder matches the list decoder.")
+
+    for profile in ("quality", "mapping-minimal"):
+        profile_sensor = VL53L5CX(i2c_bus=object(), use_numpy_results=True, output_profile=profile)
+        for resolution in (VL53L5CX_RESOLUTION_4X4, VL53L5CX_RESOLUTION_8X8):
+            synthetic_frame(profile_sensor, resolution, rng)
+            if not results_equal(profile_sensor._decode_ranging_data(),
+                                 profile_sensor._decode_ranging_data_numpy()):
+                print(f"(output_profile={profile}, resolution={resolution})")
+                return False
+        print(f"Output profile {profile:16s}: {profile_sensor.data_read_size:5d} bytes per 8x8 frame "
+              f"({sensor.data_read_size} with every output)")
+
+    sensor.use_raw_format = False
+    synthetic_frame(sensor, VL53L5CX_RESOLUTION_8X8, rng)
+    results = sensor._decode_ranging_data_numpy()
+    list_us = time_decode(sensor._decode_ranging_data, 200)
+    numpy_us = time_decode(sensor._decode_ranging_data_numpy, 2000)
+    reuse_us = time_decode(lambda: sensor._decode_ranging_data_numpy(results), 2000)
+    print(f"8x8 frame decode: list {list_us:8.1f} us, numpy {numpy_us:8.1f} us, "
+          f"numpy into preallocated results {reuse_us:8.1f} us")
+    return True
+
+if __name__ == "__main__":
+    success = test_vl53l5cx_decode()
+    sys.exit(0 if success else 1)
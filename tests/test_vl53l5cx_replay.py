@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# Adds the lib directory to the Python path
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import tempfile
+import time
+import numpy as np
+from lib.vl53l5cx_lib.vl53l5cx import VL53L5CX
+from lib.vl53l5cx_lib.api import VL53L5CX_RESOLUTION_8X8
+from lib.vl53l5cx_lib.replay import ReplayI2CBus, RecordingI2CBus, load_recording
+from lib.vl53l5cx_lib.batch import VL53L5CXBatch, MAX_COMBINED_FAILURES, COMBINED_RETRY_TRANSFERS
+from lib.tof_projection import ToFProjector
+from lib.occupancy import mark_obstacles, inflate_obstacles
+from test_vl53l5cx_decode import synthetic_frame
+
+# Runs the VL53L5CX driver against ReplayI2CBus, so the frame path can be profiled on
+# a laptop with no sensors attached. Set TOF_RECORDING to a file written by
+# examples/capture_tof_frames.py to benchmark real frames instead of synthetic ones.
+TOF_RECORDING = os.environ.get("TOF_RECORDING")
+ADDRESSES = [0x52, 0x54, 0x56]
+OUTPUT_PROFILE = "quality"
+NUM_FRAMES = 200
+
+# Same grid as core/node_map.py
+GRID_MIN = -2.0
+GRID_SIZE = 80
+GRID_RESOLUTION = 0.05
+OBSTACLE_HEIGHT_THRESHOLD = 0.1
+ROBOT_RADIUS = 0.2
+
+def synthetic_recording(rng, count=8):
+    """Raw frames as they come off the bus (32-bit words still big-endian), plus their decoded distances."""
+    sensor = VL53L5CX(i2c_bus=object(), use_numpy_results=True, output_profile=OUTPUT_PROFILE)
+    frames, distances = [], []
+    for _ in range(count):
+        synthetic_frame(sensor, VL53L5CX_RESOLUTION_8X8, rng)
+        distances.append(sensor._decode_ranging_data_numpy().distance_mm[:VL53L5CX_RESOLUTION_8X8].copy())
+        raw = bytearray(sensor.temp_buffer[:sensor.data_read_size])
+        sensor.swap_buffer(raw, len(raw))
+        frames.append(bytes(raw))
+    return frames, distances
+
+def bring_up(bus, address):
+    sensor = VL53L5CX(i2c_bus=bus, i2c_address=address, use_numpy_results=True, output_profile=OUTPUT_PROFILE)
+    sensor.init()
+    sensor.set_resolution(VL53L5CX_RESOLUTION_8X8)
+    sensor.start_ranging()
+    return sensor
+
+def read_frame(sensor):
+    while not sensor.check_data_ready():
+        pass
+    return sensor.get_ranging_data()
+
+def check_record_replay(rng):
+    """Frames recorded through RecordingI2CBus must replay and decode identically."""
+    frames, distances = synthetic_recording(rng)
+    recorder = RecordingI2CBus(ReplayI2CBus(frames, frame_rate_hz=None, addresses=[ADDRESSES[0]]))
+    sensor = bring_up(recorder, ADDRESSES[0])
+    live = [read_frame(sensor).distance_mm[:VL53L5CX_RESOLUTION_8X8].copy() for _ in range(len(frames))]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "tof.npz")
+        recorder.save(path)
+        recorded, nvm = load_recording(path)
+
+    sensor = bring_up(ReplayI2CBus(recorded, frame_rate_hz=None, nvm=nvm), ADDRESSES[0])
+    replayed = [read_frame(sensor).distance_mm[:VL53L5CX_RESOLUTION_8X8] for _ in range(len(frames))]
+
+    # Frame order only depends on how many status polls came first, compare as sets
+    expected = {d.tobytes() for d in distances}
+    if {d.tobytes() for d in live} != expected or {d.tobytes() for d in replayed} != expected:
+        print("Error: replayed frames do not decode to the recorded distances")
+        return False
+    print(f"Record/replay round trip: {len(frames)} frames, {len(recorded[ADDRESSES[0]][0])} bytes each")
+    return True
+
+class GlitchingBus(ReplayI2CBus):
+    """ReplayI2CBus whose transfers of more than two messages fail while `glitch` is set."""
+
+    glitch = False
+
+    def i2c_rdwr(self, *msgs) -> None:
+        if self.glitch and len(msgs) > 2:
+            raise OSError(121, "Remote I/O error")
+        super().i2c_rdwr(*msgs)
+
+def read_batch(batch):
+    ready = [False]
+    while not any(ready):
+        ready = batch.check_data_ready()
+    return batch.read_frames(ready)
+
+def check_batch_fallback(rng):
+    """A batch must ride out a short glitch in combined mode, and come back to it after a long one."""
+    bus = GlitchingBus({address: synthetic_recording(rng, 2)[0] for address in ADDRESSES}, frame_rate_hz=None)
+    batch = VL53L5CXBatch([bring_up(bus, address) for address in ADDRESSES])
+
+    bus.glitch = True
+    for _ in range(MAX_COMBINED_FAILURES - 1):
+        batch.check_data_ready()
+    bus.glitch = False
+    if not batch.combined or len(read_batch(batch)) == 0:
+        print("Error: batch left combined mode after a short glitch")
+        return False
+
+    bus.glitch = True
+    for _ in range(MAX_COMBINED_FAILURES):
+        batch.check_data_ready()
+    bus.glitch = False
+    if batch.combined:
+        print("Error: batch stayed in combined mode after repeated failures")
+        return False
+    transfers = 0
+    while not batch.combined and transfers <= COMBINED_RETRY_TRANSFERS:
+        read_batch(batch)
+        transfers += 1
+    if not batch.combined:
+        print("Error: batch never went back to combined mode")
+        return False
+    print(f"Batch fallback: {batch.fallbacks} failed combined transfers, "
+          f"back in combined mode after {transfers} per-sensor cycles")
+    return True
+
+def benchmark(rng):
+    if TOF_RECORDING:
+        frames, nvm = load_recording(TOF_RECORDING)
+        frames = {address: frames[sorted(frames)[i % len(frames)]] for i, address in enumerate(ADDRESSES)}
+    else:
+        frames, nvm = {address: synthetic_recording(rng)[0] for address in ADDRESSES}, None
+    bus = ReplayI2CBus(frames, frame_rate_hz=None, nvm=nvm)
+
+    start = time.perf_counter()
+    sensors = [bring_up(bus, address) for address in ADDRESSES]
+    bring_up_s = time.perf_counter() - start
+
+    projector = ToFProjector(VL53L5CX_RESOLUTION_8X8)
+    read_s = project_s = grid_s = 0.0
+    for _ in range(NUM_FRAMES):
+        t0 = time.perf_counter()
+        results = [read_frame(sensor) for sensor in sensors]
+        t1 = time.perf_counter()
+        distances = np.array([r.distance_mm[:VL53L5CX_RESOLUTION_8X8] for r in results], dtype=np.float64)
+        valid = np.array([r.target_status[:VL53L5CX_RESOLUTION_8X8] == 5 for r in results])
+        points = projector.project(distances)
+        t2 = time.perf_counter()
+        grid = np.ones((GRID_SIZE, GRID_SIZE), dtype=np.uint8)
+        for s_idx in range(len(sensors)):
+            mark_obstacles(grid, points[s_idx][valid[s_idx]], GRID_MIN, GRID_MIN,
+                           GRID_RESOLUTION, OBSTACLE_HEIGHT_THRESHOLD)
+        inflate_obstacles(grid, ROBOT_RADIUS, GRID_RESOLUTION)
+        t3 = time.perf_counter()
+        read_s += t1 - t0
+        project_s += t2 - t1
+        grid_s += t3 - t2
+
+    per_cycle = lambda seconds: seconds / NUM_FRAMES * 1e6
+    print(f"Bring-up of {len(sensors)} sensors: {bring_up_s:.2f} s "
+          f"({bus.transactions} I2C transactions, {bus.bytes_transferred} bytes)")
+    print(f"Per cycle of {len(sensors)} frames ({sensors[0].data_read_size} bytes each): "
+          f"read + decode {per_cycle(read_s):8.1f} us, project {per_cycle(project_s):8.1f} us, "
+          f"occupancy grid {per_cycle(grid_s):8.1f} us")
+    return True
+
+def test_vl53l5cx_replay():
+    rng = np.random.default_rng(0)
+    return check_record_replay(rng) and check_batch_fallback(rng) and benchmark(rng)
+
+if __name__ == "__main__":
+    success = test_vl53l5cx_replay()
+    sys.exit(0 if success else 1)